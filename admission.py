@@ -0,0 +1,246 @@
+"""
+Admission control for inbound webhooks.
+
+Without a bound, a flood of submissions is all accepted at once: every
+request buffers its body, competes for the same Tasso budget and slows
+down together until Jotform's own timeout fires. `AdmissionMiddleware`
+bounds each configured path instead:
+
+- at most `max_in_flight` requests run at a time;
+- up to `max_queued` more wait (FIFO) for up to `queue_timeout` seconds;
+  past that high-water mark, or after the wait, the request is refused at
+  once with `status` (503 by default, or 429) and a Retry-After header.
+  Jotform retries, so a refused submission arrives again later;
+- the body may not exceed `max_body` bytes: a larger Content-Length is
+  refused with 413 before anything is read, and a chunked body is cut off
+  with 413 as soon as it passes the limit.
+
+Requests waiting for admission have not had their body read, so memory
+is bounded by `max_in_flight * max_body` per path. Paths without limits
+(admin, /ready, /metrics) are never refused. Limits are per process.
+"""
+import asyncio
+import json
+from collections import deque
+from dataclasses import dataclass, fields, replace
+from typing import Deque, Dict, Optional
+
+from fastapi import HTTPException
+
+from config import ConfigError
+from logs import get_logger
+from metrics import ADMISSION_IN_FLIGHT, ADMISSION_QUEUED, ADMISSION_REJECTED
+
+log = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class AdmissionLimit:
+    max_in_flight: int = 64
+    max_queued: int = 128
+    queue_timeout: float = 2.0
+    max_body: int = 1024 * 1024
+    retry_after: int = 5
+    status: int = 503
+
+
+def parse_limits(spec: str, paths, default: AdmissionLimit) -> Dict[str, AdmissionLimit]:
+    """
+    Limits per path: `default` for each of `paths`, with the overrides in
+    `spec`, a JSON object such as {"/webhooks/tasso/events": {"max_in_flight": 16}}.
+    A path mapped to null is not limited. Raises ConfigError.
+    """
+    limits = {path: default for path in paths}
+    try:
+        overrides = json.loads(spec) if spec.strip() else {}
+        if not isinstance(overrides, dict):
+            raise ValueError("expected an object of path -> limits")
+        known = {f.name for f in fields(AdmissionLimit)}
+        for path, entry in overrides.items():
+            if entry is None:
+                limits.pop(path, None)
+                continue
+            if not isinstance(entry, dict) or not set(entry) <= known:
+                raise ValueError(f"{path}: expected an object with keys from {sorted(known)}")
+            limits[path] = replace(limits.get(path, default), **entry)
+        for path, limit in limits.items():
+            _check(path, limit)
+    except (TypeError, ValueError) as e:
+        raise ConfigError(f"ADMISSION_ROUTES: {e}") from None
+    return limits
+
+
+def _check(path: str, limit: AdmissionLimit) -> None:
+    if limit.max_in_flight < 1 or limit.max_body < 1:
+        raise ValueError(f"{path}: max_in_flight and max_body must be at least 1")
+    if limit.max_queued < 0 or limit.queue_timeout < 0 or limit.retry_after < 0:
+        raise ValueError(f"{path}: max_queued, queue_timeout and retry_after must not be negative")
+    if limit.status not in (429, 503):
+        raise ValueError(f"{path}: status must be 429 or 503")
+
+
+class BodyTooLarge(HTTPException):
+    """Raised from `receive` when a streamed body passes the limit."""
+
+    def __init__(self, max_body: int):
+        super().__init__(status_code=413, detail=f"Request body exceeds {max_body} bytes")
+
+
+class Gate:
+    """In-flight slots and the FIFO queue in front of them, for one path."""
+
+    def __init__(self, path: str, limit: AdmissionLimit):
+        self.path = path
+        self.limit = limit
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._in_flight_gauge = ADMISSION_IN_FLIGHT.labels(path)
+        self._queued_gauge = ADMISSION_QUEUED.labels(path)
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    def _take(self) -> None:
+        self.in_flight += 1
+        self._in_flight_gauge.set(self.in_flight)
+
+    async def enter(self) -> Optional[str]:
+        """Take a slot. Returns None once admitted, or why the request is refused."""
+        if self.in_flight < self.limit.max_in_flight and not self._waiters:
+            self._take()
+            return None
+        if len(self._waiters) >= self.limit.max_queued:
+            return "queue_full"
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._queued_gauge.set(len(self._waiters))
+        try:
+            await asyncio.wait_for(waiter, self.limit.queue_timeout)
+        except asyncio.TimeoutError:
+            return "queue_timeout"
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.leave()
+            raise
+        finally:
+            if not waiter.done():
+                waiter.cancel()
+            self._prune()
+        return None
+
+    def leave(self) -> None:
+        self.in_flight -= 1
+        self._prune()
+        while self._waiters and self.in_flight < self.limit.max_in_flight:
+            # The slot passes straight to the next waiter
+            self._take()
+            self._waiters.popleft().set_result(None)
+        self._in_flight_gauge.set(self.in_flight)
+        self._queued_gauge.set(len(self._waiters))
+
+    def _prune(self) -> None:
+        # Waiters that timed out or went away
+        if any(waiter.done() for waiter in self._waiters):
+            self._waiters = deque(waiter for waiter in self._waiters if not waiter.done())
+        self._queued_gauge.set(len(self._waiters))
+
+    def snapshot(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_in_flight": self.limit.max_in_flight,
+            "max_queued": self.limit.max_queued,
+            "max_body": self.limit.max_body,
+        }
+
+
+class AdmissionControl:
+    """The gates for all limited paths; shared by the middleware and /admin/status."""
+
+    def __init__(self, limits: Dict[str, AdmissionLimit], enabled: bool = True):
+        self.enabled = enabled
+        self.gates = {path: Gate(path, limit) for path, limit in limits.items()}
+
+    def gate(self, path: str) -> Optional[Gate]:
+        return self.gates.get(path) if self.enabled else None
+
+    def snapshot(self) -> dict:
+        return {path: gate.snapshot() for path, gate in self.gates.items()} if self.enabled else {}
+
+
+class AdmissionMiddleware:
+    """Applies `control`'s limits to requests for the paths it covers."""
+
+    def __init__(self, app, control: AdmissionControl):
+        self.app = app
+        self.control = control
+
+    async def __call__(self, scope, receive, send):
+        gate = self.control.gate(scope["path"]) if scope["type"] == "http" else None
+        if gate is None:
+            return await self.app(scope, receive, send)
+        limit = gate.limit
+
+        length = _content_length(scope)
+        if length is not None and length > limit.max_body:
+            return await self._refuse(send, gate, "body_too_large", 413, f"Request body exceeds {limit.max_body} bytes")
+
+        refused = await gate.enter()
+        if refused is not None:
+            log.warning("webhook refused by admission control", path=gate.path, reason=refused,
+                        in_flight=gate.in_flight, queued=gate.queued)
+            return await self._refuse(send, gate, refused, limit.status, "Too busy, retry later",
+                                      retry_after=limit.retry_after)
+
+        received = 0
+        started = False
+
+        async def bounded_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit.max_body:
+                    raise BodyTooLarge(limit.max_body)
+            return message
+
+        async def tracking_send(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, bounded_receive, tracking_send)
+        except BodyTooLarge as e:
+            if started:
+                raise
+            await self._refuse(send, gate, "body_too_large", 413, e.detail)
+        finally:
+            gate.leave()
+
+    @staticmethod
+    async def _refuse(send, gate: Gate, reason: str, status: int, detail: str,
+                      retry_after: Optional[int] = None) -> None:
+        ADMISSION_REJECTED.labels(gate.path, reason).inc()
+        body = json.dumps({"detail": detail}).encode()
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        if retry_after is not None:
+            headers.append((b"retry-after", str(retry_after).encode()))
+        if status == 413:
+            # The rest of the body is not read; don't keep the connection
+            headers.append((b"connection", b"close"))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+def _content_length(scope) -> Optional[int]:
+    for name, value in scope["headers"]:
+        if name == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
@@ -0,0 +1,265 @@
+"""
+Bulk backfill of historical Jotform submissions.
+
+The `/admin/backfill` endpoint spools a JSONL or CSV upload to a temporary
+file rather than memory, stream-parses it, runs every record
+through the same flow as the webhook (`process_submission`) with a bounded
+number in flight, and streams one NDJSON result line per record back while
+the job is still running.
+
+Each JSONL line (or CSV row) is either the rawRequest object itself or an
+object with a `rawRequest` field holding it (as a JSON string or object).
+CSV rows without a `rawRequest` column are treated as the rawRequest
+fields, with JSON-looking cells decoded.
+
+CLI usage (streams the file to a running service and prints the results):
+
+    python backfill.py exports.jsonl --url http://localhost:8004 --concurrency 8
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+import sys
+import tempfile
+from typing import AsyncIterator, Awaitable, Callable, Tuple, Union
+
+from logs import correlation_id, correlation_scope, new_correlation_id
+
+MAX_RECORD_BYTES = 1_000_000
+CHUNK_SIZE = 64 * 1024
+SPOOL_MEMORY_BYTES = 1_000_000
+
+Record = Tuple[int, Union[dict, Exception]]
+
+
+# -------------------------------
+# Upload spooling
+# -------------------------------
+async def spool(chunks: AsyncIterator[bytes]) -> tempfile.SpooledTemporaryFile:
+    """
+    Copy an upload to a temporary file (in memory only while it is small).
+
+    The request body has to be fully received before a streaming response
+    starts: the response listens on the same ASGI channel for disconnects.
+    """
+    f = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+    async for chunk in chunks:
+        f.write(chunk)
+    f.seek(0)
+    return f
+
+
+async def iter_file(f) -> AsyncIterator[bytes]:
+    try:
+        while chunk := await asyncio.to_thread(f.read, CHUNK_SIZE):
+            yield chunk
+    finally:
+        f.close()
+
+
+# -------------------------------
+# Streaming parsers
+# -------------------------------
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a byte stream into lines without holding more than one line in memory."""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        while True:
+            newline = buffer.find(b"\n")
+            if newline < 0:
+                break
+            line, buffer = buffer[:newline], buffer[newline + 1:]
+            yield line.decode("utf-8-sig").rstrip("\r")
+        if len(buffer) > MAX_RECORD_BYTES:
+            raise ValueError(f"Record exceeds {MAX_RECORD_BYTES} bytes")
+    if buffer:
+        yield buffer.decode("utf-8-sig").rstrip("\r")
+
+
+def submission_from_record(record: dict) -> dict:
+    if not isinstance(record, dict):
+        raise ValueError("Record is not an object")
+    raw = record.get("rawRequest", record)
+    if isinstance(raw, str):
+        raw = json.loads(raw)
+    if not isinstance(raw, dict):
+        raise ValueError("rawRequest is not an object")
+    return raw
+
+
+async def parse_jsonl(lines: AsyncIterator[str]) -> AsyncIterator[Record]:
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        if not line.strip():
+            continue
+        try:
+            yield line_no, submission_from_record(json.loads(line))
+        except ValueError as e:
+            yield line_no, e
+
+
+def _decode_cell(value: str):
+    if value[:1] in ("{", "["):
+        try:
+            return json.loads(value)
+        except ValueError:
+            pass
+    return value
+
+
+async def parse_csv(lines: AsyncIterator[str]) -> AsyncIterator[Record]:
+    header = None
+    row_no = 0
+    pending = ""
+    async for line in lines:
+        # Quoted cells may span lines: wait until the quotes balance
+        pending = f"{pending}\n{line}" if pending else line
+        if pending.count('"') % 2:
+            if len(pending) > MAX_RECORD_BYTES:
+                raise ValueError(f"Record exceeds {MAX_RECORD_BYTES} bytes")
+            continue
+        text, pending = pending, ""
+        if not text.strip():
+            continue
+
+        row = next(csv.reader(io.StringIO(text)))
+        if header is None:
+            header = row
+            continue
+
+        row_no += 1
+        try:
+            record = {key: _decode_cell(value) for key, value in zip(header, row)}
+            yield row_no, submission_from_record(record)
+        except ValueError as e:
+            yield row_no, e
+
+    if pending:
+        yield row_no + 1, ValueError("Unterminated quoted field at end of upload")
+
+
+def parse_records(chunks: AsyncIterator[bytes], fmt: str) -> AsyncIterator[Record]:
+    if fmt == "csv":
+        return parse_csv(iter_lines(chunks))
+    if fmt == "jsonl":
+        return parse_jsonl(iter_lines(chunks))
+    raise ValueError(f"Unsupported backfill format: {fmt}")
+
+
+# -------------------------------
+# Bounded-concurrency runner
+# -------------------------------
+async def run_backfill(
+    records: AsyncIterator[Record],
+    process: Callable[[dict], Awaitable[dict]],
+    concurrency: int,
+) -> AsyncIterator[dict]:
+    """
+    Yield one result per record, in completion order, with at most
+    `concurrency` records being processed at a time. Records are only pulled
+    from the stream when a slot frees up.
+    """
+
+    batch_id = correlation_id.get() or new_correlation_id()
+
+    async def handle(record: Record) -> dict:
+        ref, submission = record
+        if isinstance(submission, Exception):
+            return {"record": ref, "status": "error", "error": str(submission)}
+        event_id = submission.get("event_id")
+        try:
+            with correlation_scope(f"{batch_id}-{ref}"):
+                result = await process(submission)
+        except Exception as e:
+            return {"record": ref, "event_id": event_id, "status": "error", "error": str(e)}
+        return {"record": ref, "event_id": event_id, "status": "success", "result": result}
+
+    records = records.__aiter__()
+    pending: set = set()
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(pending) < concurrency:
+                try:
+                    record = await records.__anext__()
+                except StopAsyncIteration:
+                    exhausted = True
+                    break
+                except ValueError as e:
+                    # The stream itself is unreadable past this point
+                    exhausted = True
+                    yield {"record": None, "status": "error", "error": str(e)}
+                    break
+                pending.add(asyncio.ensure_future(handle(record)))
+
+            if not pending:
+                break
+
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        # Client went away: don't leave orphaned work behind
+        for task in pending:
+            task.cancel()
+
+
+async def ndjson(results: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    async for result in results:
+        yield (json.dumps(result) + "\n").encode()
+
+
+# -------------------------------
+# CLI
+# -------------------------------
+def _detect_format(path: str) -> str:
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def _upload(args) -> int:
+    import httpx
+
+    def file_chunks():
+        with open(args.file, "rb") as f:
+            while chunk := f.read(CHUNK_SIZE):
+                yield chunk
+
+    params = {"format": args.format or _detect_format(args.file), "concurrency": args.concurrency}
+    headers = {"X-Admin-Key": args.admin_key or ""}
+    failures = 0
+    timeout = httpx.Timeout(None, connect=10)
+    with httpx.Client(base_url=args.url, timeout=timeout) as client:
+        with client.stream(
+            "POST", "/admin/backfill", params=params, headers=headers, content=file_chunks()
+        ) as response:
+            if response.status_code != 200:
+                response.read()
+                print(f"Backfill rejected: {response.status_code} - {response.text}", file=sys.stderr)
+                return 2
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                print(line, flush=True)
+                if json.loads(line).get("status") != "success":
+                    failures += 1
+    return 1 if failures else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Backfill Jotform submissions into Tasso")
+    parser.add_argument("file", help="JSONL or CSV export")
+    parser.add_argument("--url", default="http://localhost:8000", help="Base URL of this service")
+    parser.add_argument("--format", choices=("jsonl", "csv"), help="Defaults to the file extension")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--admin-key", default=os.getenv("ADMIN_API_KEY"))
+    args = parser.parse_args()
+    return _upload(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""
+CPU per webhook for decoding the Jotform body and encoding Tasso payloads:
+Starlette's form parser + stdlib json against `form_fields.extract_field`
++ `fast_json` (orjson when installed).
+
+Run from the repository root, over captured traffic (see capture.py) or,
+without files, over generated submissions:
+
+    python -m benchmarks.bench_decode data/capture/*.jsonl.gz
+    python -m benchmarks.bench_decode --count 5000
+"""
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+from typing import List, Tuple
+
+from starlette.requests import Request
+
+from benchmarks.common import jotform_body, make_submissions
+from capture import read_capture, record_body
+from fast_json import BACKEND, dumps, loads
+from form_fields import extract_field
+from normalizer import build_order_payload, normalize
+
+
+def load_bodies(paths: List[str], count: int) -> List[Tuple[bytes, str]]:
+    if paths:
+        return [
+            (record_body(record), record.get("content_type", ""))
+            for record in read_capture(paths)
+            if record.get("path") == "/webhooks/jotform/tasso"
+        ]
+    return [jotform_body(submission) for submission in make_submissions(count)]
+
+
+async def form_parser(body: bytes, content_type: str):
+    """What the webhook did before: the full form parse, then json.loads."""
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    scope = {"type": "http", "method": "POST", "headers": [(b"content-type", content_type.encode())]}
+    form = await Request(scope, receive).form()
+    return json.loads(form["rawRequest"])
+
+
+async def fast_path(body: bytes, content_type: str):
+    return loads(extract_field(body, content_type, "rawRequest"))
+
+
+def measure(label: str, bodies, decode, repeat: int) -> float:
+    async def run():
+        for body, content_type in bodies:
+            await decode(body, content_type)
+
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.process_time()
+        asyncio.run(run())
+        best = min(best, time.process_time() - started)
+
+    tracemalloc.start()
+    asyncio.run(run())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    per_request = best / len(bodies) * 1e6
+    print(f"{label:<34} {per_request:>8.1f} us CPU/request   peak {peak / 1024:>8.0f} KiB")
+    return per_request
+
+
+def measure_encode(label: str, payloads, encode, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.process_time()
+        for payload in payloads:
+            encode(payload)
+        best = min(best, time.process_time() - started)
+    per_request = best / len(payloads) * 1e6
+    print(f"{label:<34} {per_request:>8.1f} us CPU/request")
+    return per_request
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("captures", nargs="*", help="capture segments (default: generated submissions)")
+    parser.add_argument("--count", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    bodies = load_bodies(args.captures, args.count)
+    if not bodies:
+        raise SystemExit("no webhook requests in the captures")
+    print(f"{len(bodies)} webhook bodies, JSON backend: {BACKEND}\n")
+
+    before = measure("form parser + json.loads", bodies, form_parser, args.repeat)
+    after = measure(f"extract_field + {BACKEND}.loads", bodies, fast_path, args.repeat)
+    print(f"{'decode speed-up':<34} {before / after:>8.1f}x\n")
+
+    payloads = []
+    for body, content_type in bodies:
+        data = loads(extract_field(body, content_type, "rawRequest"))
+        try:
+            payloads.append(normalize(data))
+            payloads.append(build_order_payload("patient-id", data))
+        except ValueError:
+            continue  # unroutable form: nothing would be sent
+    if payloads:
+        before = measure_encode("json.dumps (httpx json=)", payloads, json.dumps, args.repeat)
+        after = measure_encode(f"{BACKEND} dumps", payloads, dumps, args.repeat)
+        print(f"{'encode speed-up':<34} {before / after:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Micro-benchmark for the Jotform -> Tasso normalizer.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_normalizer --count 50000
+"""
+import argparse
+import time
+
+from benchmarks.common import make_submissions
+from normalizer import normalize, normalize_many
+
+def best_of(repeat: int, fn) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+        del result
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    submissions = make_submissions(args.count)
+
+    def one_by_one():
+        return [normalize(data) for data in submissions]
+
+    def batched():
+        return normalize_many(submissions)
+
+    for label, fn in (("normalize()", one_by_one), ("normalize_many()", batched)):
+        elapsed = best_of(args.repeat, fn)
+        print(
+            f"{label:<18} {args.count / elapsed:>12,.0f} submissions/s"
+            f"  ({elapsed / args.count * 1e6:.2f} us/submission)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Shared helpers for the benchmark and load-test scripts.
+"""
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from typing import Iterable, List, Optional, Tuple
+
+import httpx
+
+from normalizer import US_STATE_CODES
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PATHS = ["/submit/242116255933151", "/submit/242115439242147", "/submit/unknown"]
+STATES = list(US_STATE_CODES) + list(US_STATE_CODES.values()) + ["", "Ontario"]
+
+
+def make_submissions(count: int, seed: int = 7) -> list:
+    """Realistic, varied Jotform rawRequest payloads with unique event IDs."""
+    rng = random.Random(seed)
+    submissions = []
+    for i in range(count):
+        submissions.append({
+            "event_id": f"{1700000000 + i}_{rng.randint(0, 999999)}",
+            "path": rng.choice(PATHS),
+            "q3_name": {"first": f"First{i}", "last": f"Last{i}"},
+            "q4_email": f"patient{i}@example.com",
+            "q5_shippingAddress": {
+                "addr_line1": f"{rng.randint(1, 9999)} Main St",
+                "addr_line2": rng.choice(["", "Apt 2"]),
+                "city": "Springfield",
+                "state": rng.choice(STATES),
+                "postal": f"{rng.randint(0, 99999):05d}",
+            },
+            "q6_phoneNumber": {"area": f"({rng.randint(200, 999)})", "phone": f"555-{rng.randint(0, 9999):04d}"},
+            "q15_gender": rng.choice(["Male", "Female", "Other"]),
+            "q16_dateOf": {"year": str(rng.randint(1940, 2005)), "month": str(rng.randint(1, 12)), "day": str(rng.randint(1, 28))},
+            "q17_race": "Prefer not to say",
+        })
+    return submissions
+
+
+def encode_multipart(fields: Iterable[Tuple[str, str]]) -> Tuple[bytes, str]:
+    """Encode form fields as multipart/form-data, the way Jotform posts webhooks."""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields:
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+        )
+    parts.append(f"--{boundary}--\r\n")
+    return "".join(parts).encode(), f"multipart/form-data; boundary={boundary}"
+
+
+def jotform_body(submission: dict) -> Tuple[bytes, str]:
+    """Webhook body for one submission: the form fields Jotform sends plus rawRequest."""
+    return encode_multipart([
+        ("formID", submission.get("path", "").rsplit("/", 1)[-1]),
+        ("submissionID", submission.get("event_id", "")),
+        ("rawRequest", json.dumps(submission)),
+    ])
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def latency_summary(latencies: List[float]) -> str:
+    values = sorted(latencies)
+    return (
+        f"p50={percentile(values, 50) * 1000:.1f}ms "
+        f"p95={percentile(values, 95) * 1000:.1f}ms "
+        f"p99={percentile(values, 99) * 1000:.1f}ms "
+        f"max={(values[-1] if values else 0) * 1000:.1f}ms"
+    )
+
+
+# -------------------------------
+# Local processes
+# -------------------------------
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def spawn(args: List[str], env: Optional[dict] = None) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, *args],
+        cwd=ROOT,
+        env={**os.environ, **(env or {})},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_until_up(url: str, timeout: float = 15.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
@@ -0,0 +1,156 @@
+"""
+Offline load test for the Jotform webhook.
+
+Starts the local Tasso stub and this service (pointed at the stub) as
+subprocesses, fires realistic Jotform webhook posts at
+/webhooks/jotform/tasso, and reports throughput, latency percentiles and
+the upstream calls the stub received.
+
+Run from the repository root:
+
+    python -m benchmarks.loadtest --requests 2000 --concurrency 50 --stub-latency lognormal:40:0.5
+
+Pass --target to load an already running service instead; upstream counts
+are then read from --stub if given.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+
+import httpx
+
+from benchmarks.common import (
+    free_port,
+    jotform_body,
+    latency_summary,
+    make_submissions,
+    spawn,
+    wait_until_up,
+)
+
+WEBHOOK_PATH = "/webhooks/jotform/tasso"
+
+
+async def fire(target: str, bodies: list, concurrency: int) -> tuple:
+    latencies = []
+    statuses: Counter = Counter()
+    queue: asyncio.Queue = asyncio.Queue()
+    for body in bodies:
+        queue.put_nowait(body)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=target, limits=limits, timeout=60) as client:
+
+        async def worker():
+            while True:
+                try:
+                    content, content_type = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                started = time.perf_counter()
+                try:
+                    response = await client.post(
+                        WEBHOOK_PATH, content=content, headers={"Content-Type": content_type}
+                    )
+                    statuses[response.status_code] += 1
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+
+    return elapsed, latencies, statuses
+
+
+def stub_calls(stub: str) -> Counter:
+    return Counter(httpx.get(f"{stub}/_stub/stats", timeout=5).json()["calls"])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test the Jotform webhook against the Tasso stub")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duplicate-rate", type=float, default=0.0,
+                        help="Fraction of posts that resend an earlier submission")
+    parser.add_argument("--target", help="Base URL of a running service (default: start one)")
+    parser.add_argument("--stub", help="Base URL of a running Tasso stub (default: start one)")
+    parser.add_argument("--stub-latency", default="lognormal:40:0.5")
+    parser.add_argument("--stub-error-rate", type=float, default=0.0)
+    parser.add_argument("--stub-throttle-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the service")
+    parser.add_argument("--keep-rate-limits", action="store_true",
+                        help="Keep the outbound Tasso rate limits instead of disabling them")
+    parser.add_argument("--env", action="append", default=[],
+                        help="Extra KEY=VALUE for the spawned service (repeatable)")
+    args = parser.parse_args()
+
+    processes = []
+    try:
+        stub = args.stub
+        if stub is None and args.target is None:
+            port = free_port()
+            stub = f"http://127.0.0.1:{port}"
+            processes.append(spawn([
+                "tasso_stub.py", "--port", str(port),
+                "--latency", args.stub_latency,
+                "--error-rate", str(args.stub_error_rate),
+                "--throttle-rate", str(args.stub_throttle_rate),
+            ]))
+            wait_until_up(f"{stub}/_stub/stats")
+
+        target = args.target
+        if target is None:
+            port = free_port()
+            target = f"http://127.0.0.1:{port}"
+            env = {
+                "TASSO_BASE_URL": stub,
+                "TASSO_USERNAME": "loadtest",
+                "TASSO_SECRET": "loadtest",
+                "DATA_DIR": tempfile.mkdtemp(prefix="tasso-loadtest-"),
+            }
+            if not args.keep_rate_limits:
+                env.update({name: "0" for name in (
+                    "TASSO_RATE_LIMIT", "TASSO_RATE_LIMIT_AUTH",
+                    "TASSO_RATE_LIMIT_PATIENTS", "TASSO_RATE_LIMIT_ORDERS",
+                )})
+            env.update(dict(item.split("=", 1) for item in args.env))
+            processes.append(spawn([
+                "-m", "uvicorn", "main:app", "--port", str(port),
+                "--workers", str(args.workers), "--log-level", "warning",
+            ], env=env))
+            wait_until_up(f"{target}/docs")
+
+        submissions = make_submissions(args.requests, seed=int(time.time()))
+        rng = random.Random(0)
+        for i in range(1, len(submissions)):
+            if rng.random() < args.duplicate_rate:
+                submissions[i] = submissions[rng.randrange(i)]
+        bodies = [jotform_body(s) for s in submissions]
+
+        before = stub_calls(stub) if stub else Counter()
+        elapsed, latencies, statuses = asyncio.run(fire(target, bodies, args.concurrency))
+        upstream = stub_calls(stub) - before if stub else Counter()
+
+        print(f"requests     {len(bodies)} in {elapsed:.2f}s "
+              f"({len(bodies) / elapsed:.1f} req/s, concurrency {args.concurrency})")
+        print(f"latency      {latency_summary(latencies)}")
+        print(f"status       {dict(sorted(statuses.items(), key=str))}")
+        if stub:
+            print(f"upstream     {sum(upstream.values())} calls")
+            for call, count in sorted(upstream.items()):
+                print(f"  {call:<24} {count}")
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Replay captured webhook traffic (see capture.py) against a running service.
+
+Run from the repository root:
+
+    python -m benchmarks.replay data/capture/*.jsonl.gz --target http://127.0.0.1:8000 --speed 1
+
+--speed 1 keeps the original arrival times, --speed 10 compresses them
+tenfold, and --speed 0 sends as fast as --concurrency allows. Timed replays
+are open-loop, like real traffic: a request goes out at its scheduled time
+whether or not earlier ones have answered.
+
+Replayed submissions carry the event IDs they were captured with, so a
+service that already processed them answers from its idempotency store;
+--fresh-ids gives every replayed submission a new event ID instead. Point
+the service at the Tasso stub (tasso_stub.py) unless you mean to create
+real patients.
+"""
+import argparse
+import asyncio
+import json
+import re
+import time
+import uuid
+from collections import Counter
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+import httpx
+
+from benchmarks.common import latency_summary
+from capture import read_capture, record_body
+
+EVENT_ID = re.compile(rb'("event_id"\s*:\s*")([^"]*)(")')
+
+
+def fresh_event_ids(body: bytes, content_type: str, suffix: str) -> bytes:
+    """Append `suffix` to the event_id inside rawRequest."""
+    if content_type.startswith("application/x-www-form-urlencoded"):
+        fields = []
+        for name, value in parse_qsl(body.decode(), keep_blank_values=True):
+            if name == "rawRequest":
+                try:
+                    raw = json.loads(value)
+                    raw["event_id"] = f"{raw.get('event_id', '')}{suffix}"
+                    value = json.dumps(raw)
+                except ValueError:
+                    pass
+            fields.append((name, value))
+        return urlencode(fields).encode()
+    # multipart/form-data: rawRequest is embedded verbatim
+    return EVENT_ID.sub(lambda m: m.group(1) + m.group(2) + suffix.encode() + m.group(3), body)
+
+
+def load(paths: List[str], fresh_ids: bool) -> List[Tuple[float, str, str, bytes]]:
+    """(offset seconds, path, content type, body) per request, in arrival order."""
+    records = sorted(read_capture(paths), key=lambda r: r["t"])
+    if not records:
+        return []
+    run = uuid.uuid4().hex[:8]
+    start = records[0]["t"]
+    requests = []
+    for i, record in enumerate(records):
+        body = record_body(record)
+        if fresh_ids:
+            body = fresh_event_ids(body, record.get("content_type", ""), f"-replay-{run}-{i}")
+        requests.append((record["t"] - start, record["path"], record.get("content_type", ""), body))
+    return requests
+
+
+async def replay(target: str, requests: list, speed: float, concurrency: int) -> tuple:
+    latencies: List[float] = []
+    lags: List[float] = []
+    statuses: Counter = Counter()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    gate = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(base_url=target, limits=limits, timeout=60) as client:
+
+        async def send(path: str, content_type: str, body: bytes, due: Optional[float]):
+            async with gate:
+                started = time.perf_counter()
+                if due is not None:
+                    lags.append(max(started - due, 0.0))
+                try:
+                    response = await client.post(path, content=body, headers={"Content-Type": content_type})
+                    statuses[response.status_code] += 1
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+                latencies.append(time.perf_counter() - started)
+
+        began = time.perf_counter()
+        tasks = []
+        for offset, path, content_type, body in requests:
+            due = None
+            if speed > 0:
+                due = began + offset / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(path, content_type, body, due)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - began
+
+    return elapsed, latencies, lags, statuses
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay captured webhook traffic against a service")
+    parser.add_argument("capture", nargs="+", help="Capture segments (.jsonl.gz or .jsonl)")
+    parser.add_argument("--target", required=True, help="Base URL of the service to replay against")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Time compression: 1 = original timing, 0 = as fast as possible")
+    parser.add_argument("--concurrency", type=int, default=50, help="Most requests in flight at once")
+    parser.add_argument("--fresh-ids", action="store_true",
+                        help="Give each replayed submission a new event ID")
+    parser.add_argument("--limit", type=int, help="Replay only the first N requests")
+    args = parser.parse_args()
+
+    requests = load(args.capture, args.fresh_ids)[:args.limit]
+    if not requests:
+        parser.error("no captured requests found")
+
+    elapsed, latencies, lags, statuses = asyncio.run(
+        replay(args.target, requests, args.speed, args.concurrency)
+    )
+    span = requests[-1][0]
+    print(f"requests     {len(requests)} captured over {span:.1f}s, replayed in {elapsed:.2f}s "
+          f"({len(requests) / elapsed:.1f} req/s, speed {args.speed or 'max'})")
+    print(f"latency      {latency_summary(latencies)}")
+    if lags:
+        print(f"send lag     {latency_summary(lags)}")
+    print(f"status       {dict(sorted(statuses.items(), key=str))}")
+
+
+if __name__ == "__main__":
+    main()
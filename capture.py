@@ -0,0 +1,178 @@
+"""
+Recorder for inbound webhook traffic, for replaying real traffic shapes
+(see benchmarks/replay.py).
+
+`CaptureMiddleware` copies the body of each request to a captured path as
+the app reads it and hands it to `CaptureWriter`, which appends it with its
+arrival time to gzip-compressed JSONL segments from a background thread.
+The request never waits on disk: when the writer falls behind, records are
+dropped and counted. Segments rotate by size and age.
+
+Captures contain full submissions, i.e. PHI: keep CAPTURE_DIR as private as
+the databases next to it.
+"""
+import base64
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+from typing import Iterable, Iterator, Optional
+
+from logs import correlation_id, get_logger
+from metrics import CAPTURE_RECORDS
+
+log = get_logger(__name__)
+
+_STOP = object()
+
+
+class CaptureWriter:
+    """
+    Appends records to `<directory>/capture-<start time>-<pid>.jsonl.gz`.
+    A segment is closed once it holds `segment_bytes` of JSON or has been
+    open `segment_seconds`; the compressor is flushed whenever the queue
+    runs dry, so a crash loses at most the records still queued.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = 64 * 1024 * 1024,
+                 segment_seconds: float = 3600, queue_size: int = 10000):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._file = None
+        self._opened_at = 0.0
+        self._written = 0
+        self.path: Optional[str] = None
+        self.dropped = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        if self._thread is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name="capture-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Write out everything queued and close the segment."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    def submit(self, record: dict) -> None:
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            CAPTURE_RECORDS.labels("dropped").inc()
+
+    def _run(self) -> None:
+        while True:
+            record = self._queue.get()
+            if record is _STOP:
+                break
+            try:
+                self._write(record)
+                CAPTURE_RECORDS.labels("written").inc()
+            except Exception as e:
+                CAPTURE_RECORDS.labels("error").inc()
+                log.warning("capture write failed", error=str(e))
+            if self._queue.empty() and self._file is not None:
+                self._file.flush()
+        self._close()
+
+    def _write(self, record: dict) -> None:
+        now = time.time()
+        if self._file is not None and (
+            self._written >= self.segment_bytes or now - self._opened_at >= self.segment_seconds
+        ):
+            self._close()
+        if self._file is None:
+            stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(now))
+            self.path = os.path.join(self.directory, f"capture-{stamp}-{os.getpid()}.jsonl.gz")
+            self._file = gzip.open(self.path, "ab")
+            self._opened_at = now
+            self._written = 0
+        line = json.dumps(record, separators=(",", ":")).encode() + b"\n"
+        self._file.write(line)
+        self._written += len(line)
+
+    def _close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class CaptureMiddleware:
+    """Records the bodies of requests to `paths` while `writer` is running."""
+
+    def __init__(self, app, writer: CaptureWriter, paths: Iterable[str] = ("/webhooks/jotform/tasso",),
+                 max_body: int = 1024 * 1024):
+        self.app = app
+        self.writer = writer
+        self.paths = frozenset(paths)
+        self.max_body = max_body
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.writer.running or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+
+        arrived = time.time()
+        chunks = []
+        size = 0
+
+        async def capturing_receive():
+            nonlocal size
+            message = await receive()
+            if message["type"] == "http.request" and size <= self.max_body:
+                chunk = message.get("body", b"")
+                chunks.append(chunk)
+                size += len(chunk)
+                if not message.get("more_body") and size <= self.max_body:
+                    self.writer.submit(self._record(scope, arrived, b"".join(chunks)))
+            return message
+
+        await self.app(scope, capturing_receive, send)
+
+    @staticmethod
+    def _record(scope, arrived: float, body: bytes) -> dict:
+        headers = dict(scope["headers"])
+        record = {
+            "t": arrived,
+            "method": scope["method"],
+            "path": scope["path"],
+            "content_type": headers.get(b"content-type", b"").decode("latin-1"),
+            "correlation_id": correlation_id.get(),
+        }
+        try:
+            record["body"] = body.decode()
+        except UnicodeDecodeError:
+            record["body_b64"] = base64.b64encode(body).decode()
+        return record
+
+
+def read_capture(paths: Iterable[str]) -> Iterator[dict]:
+    """Records from capture segments, in file order. A truncated segment (crash) ends early."""
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rb") as f:
+            try:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+            except (EOFError, gzip.BadGzipFile, json.JSONDecodeError):
+                log.warning("capture segment is truncated", path=path)
+
+
+def record_body(record: dict) -> bytes:
+    if "body_b64" in record:
+        return base64.b64decode(record["body_b64"])
+    return record.get("body", "").encode()
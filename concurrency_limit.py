@@ -0,0 +1,185 @@
+"""
+Adaptive concurrency limit for outbound Tasso calls.
+
+A fixed cap on in-flight requests is either too low when Tasso is fast or
+too high when it degrades, and then requests queue up inside Tasso until
+they hit the HTTP timeout. `AdaptiveLimiter` finds the cap from what Tasso
+does (AIMD, as in Netflix's concurrency-limits):
+
+- each call that completes at normal latency while the limit is actually
+  in use raises the limit by 1/limit (about +1 per round of calls);
+- a call that fails as an outage (timeout, 429, 5xx), or completes while
+  recent latency is more than `tolerance` times the baseline, multiplies it
+  by `backoff`. Only calls started after the previous decrease can cause
+  another one, so a burst of failures from the same slowdown counts once.
+
+Recent latency and the baseline are moving averages of successful calls'
+RTT, over about 5 and about `window` samples. Comparing averages rather
+than single calls keeps ordinary jitter from looking like overload, and
+the slow baseline follows a lasting shift in Tasso's latency.
+
+Calls over the limit wait in FIFO order within their lane (see `lanes`).
+Bulk calls hold at most `bulk_share` of the limit, so the rest is always
+available to live calls; when both lanes are waiting, freed slots go to
+them in the ratio of `weights`. With `max_wait`, a call that cannot get a
+slot in time raises TassoUnavailable (retryable) instead of queueing
+behind a degraded Tasso. The limit is per worker process.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from lanes import BULK, LANES, LIVE
+from metrics import TASSO_CONCURRENCY_LIMIT
+from resilience import TassoUnavailable
+
+
+class AdaptiveLimiter:
+
+    def __init__(
+        self,
+        name: str,
+        initial: float = 10,
+        min_limit: float = 1,
+        max_limit: float = 50,
+        backoff: float = 0.9,
+        tolerance: float = 2.0,
+        window: int = 100,
+        max_wait: Optional[float] = None,
+        bulk_share: float = 0.5,
+        weights: Optional[Dict[str, int]] = None,
+    ):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = min(max(initial, min_limit), max_limit)
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.window = window
+        self.max_wait = max_wait
+        self.bulk_share = bulk_share
+        self.weights = weights or {LIVE: 4, BULK: 1}
+        self._credits = dict(self.weights)
+        self.in_flight = 0
+        self.lane_in_flight = {lane: 0 for lane in LANES}
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {lane: deque() for lane in LANES}
+        self.rtt_recent: Optional[float] = None
+        self.rtt_baseline: Optional[float] = None
+        self._decreased_at = 0.0
+        self.increases = 0
+        self.decreases = 0
+        self.rejected = 0
+        self._gauge = TASSO_CONCURRENCY_LIMIT.labels(name)
+        self._gauge.set(self.limit)
+
+    def _has_room(self, lane: str) -> bool:
+        if self.in_flight >= max(int(self.limit), 1):
+            return False
+        return lane != BULK or self.lane_in_flight[BULK] < max(int(self.limit * self.bulk_share), 1)
+
+    def _take(self, lane: str) -> None:
+        self.in_flight += 1
+        self.lane_in_flight[lane] += 1
+
+    async def acquire(self, lane: str = LIVE) -> float:
+        """Take a slot, waiting if the limit is reached. Returns the seconds waited."""
+        if self._has_room(lane) and not self._pending(lane):
+            self._take(lane)
+            return 0.0
+
+        started = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[lane].append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.max_wait)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise TassoUnavailable(
+                f"Tasso {self.name} concurrency limit reached ({int(self.limit)} in flight)",
+                retryable=True,
+                retry_after=1.0,
+            ) from None
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as we were cancelled: hand the slot on
+                self.release(lane=lane)
+            raise
+        finally:
+            if not waiter.done():
+                waiter.cancel()
+        return time.monotonic() - started
+
+    def release(self, started: Optional[float] = None, dropped: bool = False, lane: str = LIVE) -> None:
+        """
+        Give back a slot taken in `lane`. `started` (time.monotonic() when
+        the call was sent) makes the call a sample; `dropped` marks it as an
+        overload failure.
+        """
+        if started is not None:
+            self._sample(started, time.monotonic() - started, dropped)
+        self.in_flight -= 1
+        self.lane_in_flight[lane] -= 1
+        self._wake()
+
+    def _sample(self, started: float, rtt: float, dropped: bool) -> None:
+        if not dropped:
+            if self.rtt_baseline is None:
+                self.rtt_recent = self.rtt_baseline = rtt
+            else:
+                self.rtt_recent += (rtt - self.rtt_recent) * 0.2
+                self.rtt_baseline += (rtt - self.rtt_baseline) / self.window
+            dropped = self.rtt_recent > self.tolerance * self.rtt_baseline
+
+        if dropped:
+            if started >= self._decreased_at:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._decreased_at = time.monotonic()
+                self.decreases += 1
+                self._gauge.set(self.limit)
+        elif self.in_flight >= self.limit / 2:
+            # Only grow while the limit is what holds calls back
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self.increases += 1
+            self._gauge.set(self.limit)
+
+    def _pending(self, lane: str) -> bool:
+        waiters = self._waiters[lane]
+        while waiters and waiters[0].done():
+            # Timed out or cancelled while waiting
+            waiters.popleft()
+        return bool(waiters)
+
+    def _pick(self, lanes: List[str]) -> str:
+        """Weighted round robin between lanes that have waiters and room."""
+        if len(lanes) == 1:
+            return lanes[0]
+        if all(self._credits[lane] <= 0 for lane in lanes):
+            self._credits = dict(self.weights)
+        lane = next(lane for lane in lanes if self._credits[lane] > 0)
+        self._credits[lane] -= 1
+        return lane
+
+    def _wake(self) -> None:
+        while True:
+            ready = [lane for lane in LANES if self._pending(lane) and self._has_room(lane)]
+            if not ready:
+                return
+            lane = self._pick(ready)
+            self._take(lane)
+            self._waiters[lane].popleft().set_result(None)
+
+    def waiting(self, lane: str) -> int:
+        return sum(1 for waiter in self._waiters[lane] if not waiter.done())
+
+    def snapshot(self) -> dict:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": dict(self.lane_in_flight),
+            "waiting": {lane: self.waiting(lane) for lane in LANES},
+            "rtt_recent": round(self.rtt_recent, 4) if self.rtt_recent is not None else None,
+            "rtt_baseline": round(self.rtt_baseline, 4) if self.rtt_baseline is not None else None,
+            "increases": self.increases,
+            "decreases": self.decreases,
+            "rejected": self.rejected,
+        }
@@ -1,13 +1,364 @@
+import logging
 import os
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+from urllib.parse import urlparse
+
 from dotenv import load_dotenv
 
 load_dotenv()
 
 
-TASSO_BASE_URL = os.getenv("TASSO_BASE_URL")  # sandbox or prod
+class ConfigError(ValueError):
+    """Invalid or missing configuration; the message lists every problem found."""
+
+
+def env_flag(name: str, default: str = "false") -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+def env_int(name: str, default: str) -> int:
+    value = os.getenv(name, default)
+    try:
+        return int(value)
+    except ValueError:
+        raise ConfigError(f"{name} must be an integer, got {value!r}") from None
+
+
+def env_float(name: str, default: str) -> float:
+    value = os.getenv(name, default)
+    try:
+        return float(value)
+    except ValueError:
+        raise ConfigError(f"{name} must be a number, got {value!r}") from None
+
+
 JOTFORM_WEBHOOK_SECRET = os.getenv("JOTFORM_WEBHOOK_SECRET")
-TASSO_USERNAME = os.getenv("TASSO_USERNAME")
-TASSO_SECRET = os.getenv("TASSO_SECRET")
 GLP1_PROJECT_ID = os.getenv("GLP1_PROJECT_ID")
 TESTOSTRONE_PROJECT_ID = os.getenv("TESTOSTRONE_PROJECT_ID")
 
+# How the service reaches Tasso (base URL, credentials, token refresh, the
+# connection pool, retries, circuit breaker, rate and concurrency limits) is
+# read into `Settings` by `load_settings()` below; see `_read_settings()`
+# for the variables and their defaults.
+
+# Local state (SQLite files) lives here
+DATA_DIR = os.getenv("DATA_DIR", "data")
+
+# "sync": process the submission inside the webhook request (default)
+# "queue": store it in the durable intake queue, answer 202, process in the background
+INTAKE_MODE = os.getenv("INTAKE_MODE", "sync").strip().lower()
+INTAKE_DB_PATH = os.getenv("INTAKE_DB_PATH", os.path.join(DATA_DIR, "intake.db"))
+INTAKE_WORKERS = env_int("INTAKE_WORKERS", "4")
+INTAKE_MAX_ATTEMPTS = env_int("INTAKE_MAX_ATTEMPTS", "5")
+# A running job is requeued if its worker stops renewing it for this long
+INTAKE_JOB_LEASE = env_float("INTAKE_JOB_LEASE", "300")
+
+# Processed submissions, keyed on subjectId, so retries don't create duplicates
+IDEMPOTENCY_DB_PATH = os.getenv("IDEMPOTENCY_DB_PATH", os.path.join(DATA_DIR, "idempotency.db"))
+IDEMPOTENCY_TTL = env_float("IDEMPOTENCY_TTL", str(7 * 86400))
+IDEMPOTENCY_CACHE_SIZE = env_int("IDEMPOTENCY_CACHE_SIZE", "10000")
+# With shared state: how long another process's in-flight claim on a key is honored
+IDEMPOTENCY_CLAIM_LEASE = env_float("IDEMPOTENCY_CLAIM_LEASE", "120")
+
+# Required in the X-Admin-Key header for /admin endpoints (disabled when unset)
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+
+# Bulk backfill
+BACKFILL_CONCURRENCY = env_int("BACKFILL_CONCURRENCY", "4")
+BACKFILL_MAX_CONCURRENCY = env_int("BACKFILL_MAX_CONCURRENCY", "32")
+
+# Admission control for the webhook endpoints (per worker process): requests
+# beyond MAX_IN_FLIGHT wait, and beyond MAX_QUEUED more (or after QUEUE_TIMEOUT
+# seconds) are refused with 503 and Retry-After; bodies over MAX_BODY get 413
+ADMISSION_ENABLED = env_flag("ADMISSION_ENABLED", "true")
+ADMISSION_PATHS = [p.strip() for p in os.getenv(
+    "ADMISSION_PATHS", "/webhooks/jotform/tasso,/webhooks/tasso/events").split(",") if p.strip()]
+ADMISSION_MAX_IN_FLIGHT = env_int("ADMISSION_MAX_IN_FLIGHT", "64")
+ADMISSION_MAX_QUEUED = env_int("ADMISSION_MAX_QUEUED", "128")
+ADMISSION_QUEUE_TIMEOUT = env_float("ADMISSION_QUEUE_TIMEOUT", "2")
+ADMISSION_MAX_BODY = env_int("ADMISSION_MAX_BODY", str(1024 * 1024))
+ADMISSION_RETRY_AFTER = env_int("ADMISSION_RETRY_AFTER", "5")
+# Per-path overrides as JSON, e.g. {"/webhooks/tasso/events": {"max_in_flight": 16, "status": 429}}
+ADMISSION_ROUTES = os.getenv("ADMISSION_ROUTES", "")
+
+# Logging: JSON lines on stdout, written from a background thread
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Share of requests whose DEBUG lines are kept when LOG_LEVEL=DEBUG
+LOG_DEBUG_SAMPLE_RATE = env_float("LOG_DEBUG_SAMPLE_RATE", "0.01")
+# Key for hashing PHI fields in logs; set it, or low-entropy values (DOBs) can be brute-forced
+LOG_HASH_KEY = os.getenv("LOG_HASH_KEY", "")
+# Records beyond this many waiting to be written are dropped, not waited on
+LOG_QUEUE_SIZE = env_int("LOG_QUEUE_SIZE", "10000")
+
+# Tracing: recent traces kept in memory, and how many of the slowest to keep
+TRACE_BUFFER_SIZE = env_int("TRACE_BUFFER_SIZE", "1000")
+TRACE_SLOWEST = env_int("TRACE_SLOWEST", "50")
+# cProfile 1 in N requests (0 = off); can be changed at runtime via /admin/profiler
+PROFILE_SAMPLE_EVERY = env_int("PROFILE_SAMPLE_EVERY", "0")
+
+# Known Tasso patients by identity (subjectId, email + DOB + project), so
+# returning patients skip the create call
+PATIENT_REGISTRY_ENABLED = env_flag("PATIENT_REGISTRY_ENABLED", "true")
+PATIENT_REGISTRY_DB_PATH = os.getenv("PATIENT_REGISTRY_DB_PATH", os.path.join(DATA_DIR, "patients.db"))
+PATIENT_REGISTRY_TTL = env_float("PATIENT_REGISTRY_TTL", str(30 * 86400))
+PATIENT_REGISTRY_CACHE_SIZE = env_int("PATIENT_REGISTRY_CACHE_SIZE", "50000")
+# Page through Tasso's patient list at startup to fill the registry
+PATIENT_REGISTRY_WARM_ON_START = env_flag("PATIENT_REGISTRY_WARM_ON_START")
+PATIENT_REGISTRY_WARM_PAGE_SIZE = env_int("PATIENT_REGISTRY_WARM_PAGE_SIZE", "100")
+
+# Project metadata cache: revalidated in the background after this many seconds
+PROJECT_CACHE_TTL = env_float("PROJECT_CACHE_TTL", "300")
+# Projects to cache besides the routed ones (comma-separated)
+EXTRA_PROJECT_IDS = [p.strip() for p in os.getenv("EXTRA_PROJECT_IDS", "").split(",") if p.strip()]
+
+# Form routing table (JSON, see form_routes.py); the built-in routes are used when unset
+FORM_ROUTES_PATH = os.getenv("FORM_ROUTES_PATH", "")
+# Seconds between checks of the routes file for changes (0 = load once)
+FORM_ROUTES_RELOAD_INTERVAL = env_float("FORM_ROUTES_RELOAD_INTERVAL", "5")
+
+# Local mirror of Tasso patients and orders, for lookups without calling Tasso
+ORDER_MIRROR_ENABLED = env_flag("ORDER_MIRROR_ENABLED", "true")
+ORDER_MIRROR_DB_PATH = os.getenv("ORDER_MIRROR_DB_PATH", os.path.join(DATA_DIR, "orders.db"))
+# Seconds between incremental syncs from Tasso (0 = only record our own creates)
+ORDER_MIRROR_SYNC_INTERVAL = env_float("ORDER_MIRROR_SYNC_INTERVAL", "300")
+ORDER_MIRROR_PAGE_SIZE = env_int("ORDER_MIRROR_PAGE_SIZE", "100")
+
+# Tasso status events: shared secret for the X-Tasso-Signature HMAC (receiver disabled when unset)
+TASSO_EVENTS_SECRET = os.getenv("TASSO_EVENTS_SECRET")
+# Events arriving within this many seconds are committed together
+TASSO_EVENTS_BATCH_WINDOW = env_float("TASSO_EVENTS_BATCH_WINDOW", "0.02")
+TASSO_EVENTS_MAX_BATCH = env_int("TASSO_EVENTS_MAX_BATCH", "500")
+
+# Record inbound webhook bodies for replay (benchmarks/replay.py). The files contain PHI.
+CAPTURE_ENABLED = env_flag("CAPTURE_ENABLED")
+CAPTURE_DIR = os.getenv("CAPTURE_DIR", os.path.join(DATA_DIR, "capture"))
+CAPTURE_PATHS = [p.strip() for p in os.getenv("CAPTURE_PATHS", "/webhooks/jotform/tasso").split(",") if p.strip()]
+# A segment is rotated after this many (uncompressed) bytes or seconds
+CAPTURE_SEGMENT_BYTES = env_int("CAPTURE_SEGMENT_BYTES", str(64 * 1024 * 1024))
+CAPTURE_SEGMENT_SECONDS = env_float("CAPTURE_SEGMENT_SECONDS", "3600")
+# Records beyond this many waiting to be written are dropped, not waited on
+CAPTURE_QUEUE_SIZE = env_int("CAPTURE_QUEUE_SIZE", "10000")
+
+# Submissions that failed (kept with the failing stage for inspection and reprocessing)
+DEAD_LETTER_ENABLED = env_flag("DEAD_LETTER_ENABLED", "true")
+DEAD_LETTER_DB_PATH = os.getenv("DEAD_LETTER_DB_PATH", os.path.join(DATA_DIR, "dead_letters.db"))
+
+# Startup waits at most this long for the token, connections and project
+# metadata before serving; /ready answers 503 until warming has finished
+STARTUP_PREWARM_TIMEOUT = env_float(
+    "STARTUP_PREWARM_TIMEOUT", os.getenv("PROJECT_CACHE_PREWARM_TIMEOUT", "10")
+)
+
+# Uvicorn worker processes (read by the container entry point)
+WEB_CONCURRENCY = env_int("WEB_CONCURRENCY", "1")
+# Share the Tasso token, rate limits and in-flight idempotency claims between
+# worker processes; on by default when there is more than one
+SHARED_STATE = env_flag("SHARED_STATE", "true" if WEB_CONCURRENCY > 1 else "false")
+SHARED_STATE_DB_PATH = os.getenv("SHARED_STATE_DB_PATH", os.path.join(DATA_DIR, "shared.db"))
+
+
+# -------------------------------
+# Validated settings
+# -------------------------------
+@dataclass(frozen=True)
+class Settings:
+    """
+    How the service reaches Tasso, checked once at startup and passed to the
+    Tasso client, its limiters and the token manager.
+    """
+    tasso_base_url: str
+    tasso_username: str
+    tasso_secret: str = field(repr=False)
+    project_ids: Tuple[str, ...]
+    form_routes_path: str
+    intake_mode: str
+    data_dir: str
+    web_concurrency: int
+    shared_state: bool
+    # Tasso auth token: refreshed this many seconds before its `exp` claim;
+    # the lifetime assumed when it carries no readable `exp`
+    token_refresh_margin: float
+    token_default_ttl: float
+    # Connection pool for outbound Tasso calls
+    http_max_connections: int
+    http_max_keepalive: int
+    http_keepalive_expiry: float
+    http_connect_timeout: float
+    http_timeout: float
+    # Retries (capped exponential backoff with jitter); Retry-After longer
+    # than retry_after_max is not waited out inline
+    retry_max_attempts: int
+    retry_base_delay: float
+    retry_max_delay: float
+    retry_after_max: float
+    # Circuit breaker: open after N consecutive failures, probe again after the timeout
+    breaker_failure_threshold: int
+    breaker_reset_timeout: float
+    # Outbound rate limits (requests/second, burst; 0 disables a bucket):
+    # global, and (endpoint, rate, burst) per endpoint
+    rate_limit: float
+    rate_burst: float
+    endpoint_rate_limits: Tuple[Tuple[str, float, float], ...]
+    # Adaptive limit on concurrent calls per endpoint (patients, orders), per
+    # worker. max_wait 0 waits for a slot as long as needed
+    concurrency_adaptive: bool
+    concurrency_initial: float
+    concurrency_min: float
+    concurrency_max: float
+    concurrency_latency_tolerance: float
+    concurrency_max_wait: float
+    # Priority lanes: bulk work gets at most these shares of the rate and
+    # concurrency budget; waiting lanes get freed slots in the ratio of the weights
+    bulk_rate_share: float
+    bulk_concurrency_share: float
+    lane_weight_live: int
+    lane_weight_bulk: int
+
+    def summary(self) -> dict:
+        """Safe to log or print: no secrets."""
+        return {
+            "tasso_base_url": self.tasso_base_url,
+            "tasso_username": self.tasso_username,
+            "project_ids": list(self.project_ids),
+            "form_routes": self.form_routes_path or "built-in",
+            "intake_mode": self.intake_mode,
+            "data_dir": self.data_dir,
+            "web_concurrency": self.web_concurrency,
+            "shared_state": self.shared_state,
+        }
+
+
+def _read_settings() -> Settings:
+    """Settings from the environment, not yet validated."""
+    max_connections = env_int("TASSO_HTTP_MAX_CONNECTIONS", "20")
+    return Settings(
+        tasso_base_url=(os.getenv("TASSO_BASE_URL") or "").strip().rstrip("/"),  # sandbox or prod
+        tasso_username=(os.getenv("TASSO_USERNAME") or "").strip(),
+        tasso_secret=os.getenv("TASSO_SECRET") or "",
+        project_ids=tuple(dict.fromkeys(
+            p.strip() for p in (GLP1_PROJECT_ID, TESTOSTRONE_PROJECT_ID, *EXTRA_PROJECT_IDS) if p
+        )),
+        form_routes_path=FORM_ROUTES_PATH,
+        intake_mode=INTAKE_MODE,
+        data_dir=DATA_DIR,
+        web_concurrency=WEB_CONCURRENCY,
+        shared_state=SHARED_STATE,
+        token_refresh_margin=env_float("TASSO_TOKEN_REFRESH_MARGIN", "300"),
+        token_default_ttl=env_float("TASSO_TOKEN_DEFAULT_TTL", "3600"),
+        http_max_connections=max_connections,
+        http_max_keepalive=env_int("TASSO_HTTP_MAX_KEEPALIVE", "10"),
+        http_keepalive_expiry=env_float("TASSO_HTTP_KEEPALIVE_EXPIRY", "30"),
+        http_connect_timeout=env_float("TASSO_HTTP_CONNECT_TIMEOUT", "5"),
+        http_timeout=env_float("TASSO_HTTP_TIMEOUT", "10"),
+        retry_max_attempts=env_int("TASSO_RETRY_MAX_ATTEMPTS", "3"),
+        retry_base_delay=env_float("TASSO_RETRY_BASE_DELAY", "0.5"),
+        retry_max_delay=env_float("TASSO_RETRY_MAX_DELAY", "8"),
+        retry_after_max=env_float("TASSO_RETRY_AFTER_MAX", "30"),
+        breaker_failure_threshold=env_int("TASSO_BREAKER_FAILURE_THRESHOLD", "5"),
+        breaker_reset_timeout=env_float("TASSO_BREAKER_RESET_TIMEOUT", "30"),
+        rate_limit=env_float("TASSO_RATE_LIMIT", "10"),
+        rate_burst=env_float("TASSO_RATE_BURST", "20"),
+        endpoint_rate_limits=(
+            ("/authTokens", env_float("TASSO_RATE_LIMIT_AUTH", "1"), env_float("TASSO_RATE_BURST_AUTH", "2")),
+            ("/patients", env_float("TASSO_RATE_LIMIT_PATIENTS", "5"), env_float("TASSO_RATE_BURST_PATIENTS", "10")),
+            ("/orders", env_float("TASSO_RATE_LIMIT_ORDERS", "5"), env_float("TASSO_RATE_BURST_ORDERS", "10")),
+        ),
+        concurrency_adaptive=env_flag("TASSO_CONCURRENCY_ADAPTIVE", "true"),
+        concurrency_initial=env_float("TASSO_CONCURRENCY_INITIAL", "10"),
+        concurrency_min=env_float("TASSO_CONCURRENCY_MIN", "1"),
+        concurrency_max=env_float("TASSO_CONCURRENCY_MAX", str(max_connections)),
+        concurrency_latency_tolerance=env_float("TASSO_CONCURRENCY_LATENCY_TOLERANCE", "2.0"),
+        concurrency_max_wait=env_float("TASSO_CONCURRENCY_MAX_WAIT", "10"),
+        bulk_rate_share=env_float("TASSO_BULK_RATE_SHARE", "0.5"),
+        bulk_concurrency_share=env_float("TASSO_BULK_CONCURRENCY_SHARE", "0.5"),
+        lane_weight_live=env_int("TASSO_LANE_WEIGHT_LIVE", "4"),
+        lane_weight_bulk=env_int("TASSO_LANE_WEIGHT_BULK", "1"),
+    )
+
+
+def _problems(settings: Settings) -> List[str]:
+    problems = []
+    required = {"TASSO_BASE_URL": settings.tasso_base_url, "TASSO_USERNAME": settings.tasso_username,
+                "TASSO_SECRET": settings.tasso_secret}
+    if not FORM_ROUTES_PATH:
+        # The built-in routes point at these; a routes file names its own projects
+        required.update(GLP1_PROJECT_ID=GLP1_PROJECT_ID, TESTOSTRONE_PROJECT_ID=TESTOSTRONE_PROJECT_ID)
+    for name, value in required.items():
+        if not (value or "").strip():
+            problems.append(f"{name} is required")
+    url = urlparse(settings.tasso_base_url)
+    if settings.tasso_base_url and (url.scheme not in ("http", "https") or not url.netloc):
+        problems.append(f"TASSO_BASE_URL must be an http(s) URL, got {settings.tasso_base_url!r}")
+    if INTAKE_MODE not in ("sync", "queue"):
+        problems.append(f"INTAKE_MODE must be sync or queue, got {INTAKE_MODE!r}")
+    if logging.getLevelName(LOG_LEVEL.upper()) not in range(0, 51):
+        problems.append(f"LOG_LEVEL must be a logging level, got {LOG_LEVEL!r}")
+
+    at_least_one = {
+        "TASSO_HTTP_MAX_CONNECTIONS": settings.http_max_connections,
+        "TASSO_RETRY_MAX_ATTEMPTS": settings.retry_max_attempts,
+        "TASSO_BREAKER_FAILURE_THRESHOLD": settings.breaker_failure_threshold,
+        "TASSO_LANE_WEIGHT_LIVE": settings.lane_weight_live,
+        "TASSO_LANE_WEIGHT_BULK": settings.lane_weight_bulk,
+        **{name: globals()[name] for name in (
+            "INTAKE_WORKERS", "INTAKE_MAX_ATTEMPTS", "BACKFILL_CONCURRENCY", "ORDER_MIRROR_PAGE_SIZE",
+            "TASSO_EVENTS_MAX_BATCH", "WEB_CONCURRENCY", "ADMISSION_MAX_IN_FLIGHT", "ADMISSION_MAX_BODY")},
+    }
+    problems += [f"{name} must be at least 1" for name, value in at_least_one.items() if value < 1]
+    positive = {
+        "TASSO_HTTP_TIMEOUT": settings.http_timeout,
+        "TASSO_HTTP_CONNECT_TIMEOUT": settings.http_connect_timeout,
+        "TASSO_TOKEN_DEFAULT_TTL": settings.token_default_ttl,
+        **{name: globals()[name] for name in (
+            "INTAKE_JOB_LEASE", "IDEMPOTENCY_TTL", "PROJECT_CACHE_TTL", "STARTUP_PREWARM_TIMEOUT")},
+    }
+    problems += [f"{name} must be positive" for name, value in positive.items() if value <= 0]
+    rates = [settings.rate_limit, settings.rate_burst]
+    rates += [value for _, rate, burst in settings.endpoint_rate_limits for value in (rate, burst)]
+    if any(value < 0 for value in rates):
+        problems.append("TASSO_RATE_* limits and bursts must not be negative")
+    not_negative = ("ADMISSION_MAX_QUEUED", "ADMISSION_QUEUE_TIMEOUT", "ADMISSION_RETRY_AFTER")
+    problems += [f"{name} must not be negative" for name in not_negative if globals()[name] < 0]
+
+    if not 0 <= settings.http_max_keepalive <= settings.http_max_connections:
+        problems.append("TASSO_HTTP_MAX_KEEPALIVE must be between 0 and TASSO_HTTP_MAX_CONNECTIONS")
+    if BACKFILL_CONCURRENCY > BACKFILL_MAX_CONCURRENCY:
+        problems.append("BACKFILL_CONCURRENCY must not exceed BACKFILL_MAX_CONCURRENCY")
+    if settings.token_refresh_margin >= settings.token_default_ttl:
+        problems.append("TASSO_TOKEN_REFRESH_MARGIN must be below TASSO_TOKEN_DEFAULT_TTL")
+    if not 1 <= settings.concurrency_min <= settings.concurrency_initial <= settings.concurrency_max:
+        problems.append("TASSO_CONCURRENCY_MIN <= TASSO_CONCURRENCY_INITIAL <= TASSO_CONCURRENCY_MAX must hold (min >= 1)")
+    if settings.concurrency_latency_tolerance <= 1:
+        problems.append("TASSO_CONCURRENCY_LATENCY_TOLERANCE must be above 1")
+    for name, value in (("TASSO_BULK_RATE_SHARE", settings.bulk_rate_share),
+                        ("TASSO_BULK_CONCURRENCY_SHARE", settings.bulk_concurrency_share)):
+        if not 0 < value <= 1:
+            problems.append(f"{name} must be above 0 and at most 1")
+    if not 0 <= LOG_DEBUG_SAMPLE_RATE <= 1:
+        problems.append("LOG_DEBUG_SAMPLE_RATE must be between 0 and 1")
+    return problems
+
+
+_settings: Optional[Settings] = None
+
+
+def load_settings() -> Settings:
+    """
+    Check the configuration and return it as an immutable `Settings`, which
+    `get_settings()` hands out from then on. Raises ConfigError listing
+    everything that is wrong, so a bad deploy fails at startup instead of
+    on the first webhook.
+    """
+    global _settings
+    settings = _read_settings()
+    problems = _problems(settings)
+    if problems:
+        raise ConfigError("Invalid configuration:\n  " + "\n  ".join(problems))
+    _settings = settings
+    return settings
+
+
+def get_settings() -> Settings:
+    """The settings loaded at startup; before that (tests, scripts), as read from the environment."""
+    return _settings if _settings is not None else _read_settings()
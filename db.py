@@ -0,0 +1,16 @@
+"""
+SQLite helpers shared by the local state stores (intake queue, caches, ...).
+"""
+import os
+import sqlite3
+
+
+def connect(path: str, synchronous: str = "NORMAL") -> sqlite3.Connection:
+    """Open a SQLite connection in WAL mode, shared between worker threads."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={synchronous}")
+    return conn
@@ -0,0 +1,244 @@
+"""
+Dead-letter store for submissions that could not be turned into a Tasso
+patient and order.
+
+Each failure keeps the raw submission, the normalized patient payload (when
+normalization got that far), the stage that failed and the error. A patient
+that was created before the order failed is kept too, so reprocessing
+resumes at the order instead of creating the patient again. Repeated
+failures of the same submission (a Jotform retry, a reprocess that fails
+again) update one entry rather than adding new ones.
+
+States: `open` (waiting to be reprocessed), `resolved` (a reprocess
+succeeded; the result is kept) and `discarded` (given up by an admin).
+"""
+import asyncio
+import json
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import List, Optional
+
+from db import connect
+
+OPEN = "open"
+RESOLVED = "resolved"
+DISCARDED = "discarded"
+
+# Where a submission can fail, in flow order
+STAGES = ("normalize", "auth", "patient", "order", "unknown")
+
+
+@dataclass
+class DeadLetter:
+    id: int
+    key: str
+    event_id: Optional[str]
+    stage: str
+    error: str
+    status_code: Optional[int]
+    raw: Optional[dict]
+    patient_payload: Optional[dict]
+    patient_id: Optional[str]
+    state: str
+    attempts: int
+    result: Optional[dict]
+    created_at: float
+    updated_at: float
+
+    def summary(self) -> dict:
+        """Everything but the submission itself (PHI)."""
+        return {
+            "id": self.id,
+            "event_id": self.event_id,
+            "stage": self.stage,
+            "error": self.error,
+            "status_code": self.status_code,
+            "patient_id": self.patient_id,
+            "state": self.state,
+            "attempts": self.attempts,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+_COLUMNS = (
+    "id, key, event_id, stage, error, status_code, raw, patient_payload, patient_id,"
+    " state, attempts, result, created_at, updated_at"
+)
+
+
+def _from_row(row) -> DeadLetter:
+    return DeadLetter(
+        *row[:6],
+        json.loads(row[6]) if row[6] else None,
+        json.loads(row[7]) if row[7] else None,
+        *row[8:11],
+        json.loads(row[11]) if row[11] else None,
+        *row[12:],
+    )
+
+
+class DeadLetterStore:
+
+    def __init__(self, path: str):
+        self._conn = connect(path)
+        self._lock = threading.Lock()
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS dead_letters (
+                id              INTEGER PRIMARY KEY AUTOINCREMENT,
+                key             TEXT NOT NULL UNIQUE,
+                event_id        TEXT,
+                stage           TEXT NOT NULL,
+                error           TEXT NOT NULL,
+                status_code     INTEGER,
+                raw             TEXT,
+                patient_payload TEXT,
+                patient_id      TEXT,
+                state           TEXT NOT NULL,
+                attempts        INTEGER NOT NULL DEFAULT 1,
+                result          TEXT,
+                created_at      REAL NOT NULL,
+                updated_at      REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_dead_letters_state ON dead_letters (state, stage, id);
+            """
+        )
+
+    def _run(self, fn, *args):
+        with self._lock:
+            return fn(*args)
+
+    async def _call(self, fn, *args):
+        return await asyncio.to_thread(self._run, fn, *args)
+
+    async def record(
+        self,
+        raw: Optional[dict],
+        stage: str,
+        error: str,
+        *,
+        status_code: Optional[int] = None,
+        patient_payload: Optional[dict] = None,
+        patient_id: Optional[str] = None,
+        key: Optional[str] = None,
+    ) -> int:
+        """
+        Add a failure, or update the entry for the same submission (same
+        event ID, or the entry's `key`) and reopen it. Returns its ID.
+        """
+        event_id = (raw or {}).get("event_id")
+        if key is None:
+            key = f"event:{event_id}" if event_id else f"anon:{uuid.uuid4().hex}"
+        return await self._call(
+            self._record, key, event_id, stage, error, status_code,
+            json.dumps(raw) if raw is not None else None,
+            json.dumps(patient_payload) if patient_payload is not None else None,
+            patient_id,
+        )
+
+    def _record(self, key, event_id, stage, error, status_code, raw, patient_payload, patient_id) -> int:
+        now = time.time()
+        return self._conn.execute(
+            "INSERT INTO dead_letters (key, event_id, stage, error, status_code, raw, patient_payload,"
+            " patient_id, state, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (key) DO UPDATE SET"
+            " stage = excluded.stage, error = excluded.error, status_code = excluded.status_code,"
+            " raw = COALESCE(excluded.raw, raw),"
+            " patient_payload = COALESCE(excluded.patient_payload, patient_payload),"
+            # A patient created by an earlier attempt is still there
+            " patient_id = COALESCE(excluded.patient_id, patient_id),"
+            " state = excluded.state, attempts = attempts + 1, result = NULL,"
+            " updated_at = excluded.updated_at"
+            " RETURNING id",
+            (key, event_id, stage, error, status_code, raw, patient_payload, patient_id, OPEN, now, now),
+        ).fetchone()[0]
+
+    async def get(self, letter_id: int) -> Optional[DeadLetter]:
+        rows = await self._call(self._select, "WHERE id = ?", (letter_id,), 1)
+        return rows[0] if rows else None
+
+    async def list(
+        self,
+        *,
+        ids: Optional[List[int]] = None,
+        state: Optional[str] = OPEN,
+        stage: Optional[str] = None,
+        status_code: Optional[int] = None,
+        error: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        before_id: Optional[int] = None,
+        limit: int = 100,
+    ) -> List[DeadLetter]:
+        """Newest first. `before_id` pages (pass the last ID of the previous page)."""
+        where, params = [], []
+        for column, value in (("state", state), ("stage", stage), ("status_code", status_code)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if ids:
+            where.append(f"id IN ({','.join('?' * len(ids))})")
+            params.extend(ids)
+        if error:
+            where.append("instr(error, ?) > 0")
+            params.append(error)
+        if since is not None:
+            where.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("created_at < ?")
+            params.append(until)
+        if before_id is not None:
+            where.append("id < ?")
+            params.append(before_id)
+        clause = "WHERE " + " AND ".join(where) if where else ""
+        return await self._call(self._select, clause, tuple(params), limit)
+
+    def _select(self, clause: str, params: tuple, limit: int) -> List[DeadLetter]:
+        rows = self._conn.execute(
+            f"SELECT {_COLUMNS} FROM dead_letters {clause} ORDER BY id DESC LIMIT ?",
+            (*params, limit),
+        ).fetchall()
+        return [_from_row(row) for row in rows]
+
+    async def resolve(self, letter_id: int, result: dict) -> None:
+        await self._call(self._set_state, letter_id, RESOLVED, json.dumps(result))
+
+    async def resolve_event(self, event_id: str, result: dict) -> bool:
+        """Resolve the open entry for a submission that has since gone through (e.g. a Jotform retry)."""
+        return await self._call(self._resolve_event, f"event:{event_id}", json.dumps(result))
+
+    def _resolve_event(self, key: str, result: str) -> bool:
+        cur = self._conn.execute(
+            "UPDATE dead_letters SET state = ?, result = ?, updated_at = ? WHERE key = ? AND state = ?",
+            (RESOLVED, result, time.time(), key, OPEN),
+        )
+        return cur.rowcount > 0
+
+    async def discard(self, letter_id: int) -> bool:
+        return await self._call(self._set_state, letter_id, DISCARDED, None)
+
+    def _set_state(self, letter_id: int, state: str, result: Optional[str]) -> bool:
+        cur = self._conn.execute(
+            "UPDATE dead_letters SET state = ?, result = COALESCE(?, result), updated_at = ? WHERE id = ?",
+            (state, result, time.time(), letter_id),
+        )
+        return cur.rowcount > 0
+
+    async def counts(self) -> dict:
+        return await self._call(self._counts)
+
+    def _counts(self) -> dict:
+        counts: dict = {}
+        for state, stage, n in self._conn.execute(
+            "SELECT state, stage, COUNT(*) FROM dead_letters GROUP BY state, stage"
+        ):
+            counts.setdefault(state, {})[stage] = n
+        return counts
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
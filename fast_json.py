@@ -0,0 +1,33 @@
+"""
+JSON on the request path: orjson when it is installed, the standard
+library otherwise.
+
+orjson decodes and encodes several times faster than `json` and allocates
+less per call, which shows up as CPU per worker at webhook volume. Both
+paths behave the same for what the service sends and receives:
+
+- `loads` accepts str or bytes; malformed input raises ValueError
+  (orjson's JSONDecodeError is a json.JSONDecodeError);
+- `dumps` returns compact UTF-8 bytes, ready to send as a body.
+"""
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # optional: stdlib fallback
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+if orjson is not None:
+    loads = orjson.loads
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+else:
+    def loads(data: Union[str, bytes]) -> Any:
+        return json.loads(data)
+
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
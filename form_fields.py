@@ -0,0 +1,73 @@
+"""
+Read one field out of a form body without parsing the whole form.
+
+Jotform posts each submission as a multipart (or urlencoded) form in which
+the only field the service uses is `rawRequest`. Starlette's form parser
+builds every field, with callbacks per part and header, for each request;
+`extract_field` instead scans the body bytes for the part delimiters and
+copies only the one value asked for.
+
+It handles the forms Jotform sends. Anything it can't read the simple way
+(another content type, a file part, a transfer encoding, malformed
+framing) raises ValueError, and the caller falls back to the full parser.
+"""
+import re
+from typing import Optional
+from urllib.parse import unquote_plus
+
+_BOUNDARY = re.compile(rb'boundary=(?:"([^"]+)"|([^\s;]+))', re.IGNORECASE)
+_DISPOSITION = re.compile(rb'^content-disposition:([^\r\n]*)', re.IGNORECASE | re.MULTILINE)
+_NAME = re.compile(rb';\s*name="([^"]*)"')
+
+
+def extract_field(body: bytes, content_type: str, name: str) -> Optional[str]:
+    """The value of form field `name`, or None if the form has no such field."""
+    kind = content_type.split(";", 1)[0].strip().lower()
+    if kind == "multipart/form-data":
+        return _multipart_field(body, content_type.encode("latin-1"), name.encode())
+    if kind == "application/x-www-form-urlencoded":
+        return _urlencoded_field(body, name.encode())
+    raise ValueError(f"not a form: {content_type!r}")
+
+
+def _multipart_field(body: bytes, content_type: bytes, name: bytes) -> Optional[str]:
+    match = _BOUNDARY.search(content_type)
+    if not match:
+        raise ValueError("multipart body without a boundary")
+    delimiter = b"--" + (match.group(1) or match.group(2))
+    next_part = b"\r\n" + delimiter
+
+    pos = body.find(delimiter)
+    if pos == -1:
+        raise ValueError("multipart boundary not found")
+    while True:
+        headers_start = pos + len(delimiter)
+        if body.startswith(b"--", headers_start):
+            return None  # closing delimiter: no such field
+        headers_end = body.find(b"\r\n\r\n", headers_start)
+        end = body.find(next_part, headers_end + 4) if headers_end != -1 else -1
+        if end == -1:
+            raise ValueError("truncated multipart body")
+        headers = body[headers_start:headers_end]
+        disposition = _DISPOSITION.search(headers.strip())
+        field = _NAME.search(disposition.group(1)) if disposition else None
+        if field and field.group(1) == name:
+            if b"filename" in disposition.group(1) or b"transfer-encoding" in headers.lower():
+                raise ValueError("field is a file or encoded part")
+            return body[headers_end + 4:end].decode("utf-8")
+        pos = end + 2
+
+
+def _urlencoded_field(body: bytes, name: bytes) -> Optional[str]:
+    key = name + b"="
+    pos = 0
+    while True:
+        pos = body.find(key, pos)
+        if pos == -1:
+            return None
+        if pos == 0 or body[pos - 1] == ord("&"):
+            start = pos + len(key)
+            end = body.find(b"&", start)
+            value = body[start:] if end == -1 else body[start:end]
+            return unquote_plus(value.decode("utf-8"), errors="strict")
+        pos += 1
@@ -0,0 +1,133 @@
+"""
+Form routing table loaded from a JSON file (FORM_ROUTES_PATH), so a new
+Jotform form is a config change rather than a deploy.
+
+    {
+      "forms": {
+        "242116255933151": {"project": "${GLP1_PROJECT_ID}", "name": "GLP-1 intake"},
+        "242115439242147": {"project": "${TESTOSTRONE_PROJECT_ID}", "configuration": "fOsd_k9GQ3"},
+        "251000000000001": {"project": "...", "profile": "short_form"}
+      },
+      "profiles": {"short_form": {"name": "q1_name", "email": "q2_email", ...}},
+      "fallback": {"project": "${GLP1_PROJECT_ID}"}
+    }
+
+`project` and `configuration` may reference environment variables. A form
+without an entry uses `fallback`; with no fallback it is rejected (and
+dead-lettered) instead of being sent to the wrong project.
+
+`RouteReloader` polls the file and swaps in the new table once it has been
+parsed and compiled. A file that fails to load is logged and counted, and
+the previous table stays in place.
+"""
+import asyncio
+import json
+import os
+from typing import Callable, Optional, Tuple
+
+from config import ConfigError
+from logs import get_logger
+from metrics import FORM_ROUTE_RELOADS
+from normalizer import RoutingTable, set_routing_table
+
+log = get_logger(__name__)
+
+
+def _expand(entry):
+    """Substitute environment variables in the values of a route entry."""
+    if not isinstance(entry, dict):
+        return entry
+    return {k: os.path.expandvars(v) if isinstance(v, str) else v for k, v in entry.items()}
+
+
+def load_table(path: str) -> RoutingTable:
+    """Parse and compile a routes file. Raises ConfigError if it is unusable."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            spec = json.load(f)
+        if not isinstance(spec, dict) or not isinstance(spec.get("forms"), dict):
+            raise ValueError('expected an object with a "forms" object')
+        return RoutingTable.compile(
+            {form: _expand(entry) for form, entry in spec["forms"].items()},
+            fallback=_expand(spec.get("fallback")),
+            profiles=spec.get("profiles"),
+            source=path,
+        )
+    except (OSError, ValueError) as e:
+        raise ConfigError(f"Form routes {path}: {e}") from None
+
+
+def _signature(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+class RouteReloader:
+    """
+    Installs the table from `path`, then checks the file every `interval`
+    seconds and reloads it when it changes (write or atomic rename).
+    `on_change(table)` runs after each successful swap.
+    """
+
+    def __init__(self, path: str, interval: float = 5.0,
+                 on_change: Optional[Callable[[RoutingTable], None]] = None):
+        self.path = path
+        self.interval = interval
+        self.on_change = on_change
+        self._signature: Optional[Tuple[int, int, int]] = None
+        self._task: Optional[asyncio.Task] = None
+        self.last_error: Optional[str] = None
+
+    def load(self) -> RoutingTable:
+        """Initial load; raises ConfigError so a bad file stops startup."""
+        signature = _signature(self.path)
+        table = load_table(self.path)
+        self._install(table, signature)
+        return table
+
+    async def check(self) -> bool:
+        """Reload if the file changed. True if a new table was installed."""
+        signature = _signature(self.path)
+        if signature is None or signature == self._signature:
+            return False
+        try:
+            table = await asyncio.to_thread(load_table, self.path)
+        except ConfigError as e:
+            # Don't retry the same broken file every interval
+            self._signature = signature
+            self.last_error = str(e)
+            FORM_ROUTE_RELOADS.labels("error").inc()
+            log.error("form routes reload failed; keeping the previous table", error=str(e))
+            return False
+        self._install(table, signature)
+        FORM_ROUTE_RELOADS.labels("loaded").inc()
+        log.info("form routes reloaded", forms=len(table.routes), fallback=table.fallback is not None)
+        return True
+
+    def _install(self, table: RoutingTable, signature) -> None:
+        set_routing_table(table)
+        self._signature = signature
+        self.last_error = None
+        if self.on_change is not None:
+            self.on_change(table)
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception:
+                log.error("form routes check failed", exc_info=True)
+
+    def start(self) -> None:
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -0,0 +1,256 @@
+"""
+Idempotency for Jotform submissions.
+
+Results are keyed on the submission's subjectId ("AUTO-" + event_id). A
+bounded, TTL-evicted in-memory index sits in front of a SQLite table, so a
+Jotform retry or a resubmission returns the stored result instead of
+creating a second patient and order. Concurrent duplicates of the same key
+wait on the single execution already in flight.
+
+With `claim_lease` set (multi-worker deployments), an execution is also
+claimed in the `idempotency_claims` table, so a duplicate arriving at
+another worker process waits for the stored result too. A claim whose owner
+died is taken over once its lease runs out (or at once if its process is
+known to be gone). The claim is renewed every `claim_lease / 3` seconds
+while the execution runs, however long it takes.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional, Tuple
+
+from db import connect
+from logs import get_logger
+from shared_state import owner_id, owner_is_gone
+
+log = get_logger(__name__)
+
+
+class IdempotencyStore:
+
+    def __init__(self, path: str, ttl: float = 7 * 86400, max_entries: int = 10000,
+                 claim_lease: Optional[float] = None, claim_poll: float = 0.1):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.claim_lease = claim_lease
+        self.claim_poll = claim_poll
+        self.owner = owner_id()
+        self._conn = connect(path)
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._writes = 0
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS idempotency_keys (
+                key        TEXT PRIMARY KEY,
+                result     TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS idempotency_claims (
+                key        TEXT PRIMARY KEY,
+                owner      TEXT NOT NULL,
+                claimed_at REAL NOT NULL
+            )
+            """
+        )
+
+    def _run(self, fn, *args):
+        with self._lock:
+            return fn(*args)
+
+    async def _call(self, fn, *args):
+        return await asyncio.to_thread(self._run, fn, *args)
+
+    async def run(self, key: str, fn: Callable[[], Awaitable[dict]]) -> Tuple[dict, bool]:
+        """
+        Return `(result, replayed)`. `fn` is only called if no result is stored
+        for `key` and no other call for `key` is in flight.
+        """
+        cached = self._get_cached(key)
+        if cached is not None:
+            return cached, True
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight), True
+
+        # Registered before the first await so concurrent duplicates find it
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            stored = await self._call(self._load, key)
+            if stored is None and self.claim_lease is not None:
+                stored = await self._wait_for_claim(key)
+            if stored is not None:
+                self._remember(key, stored[0], stored[1])
+                future.set_result(stored[0])
+                return stored[0], True
+
+            # fn can outlive the lease (rate-limit waits, Retry-After sleeps);
+            # keep the claim fresh so no other worker takes the key over
+            renewal = asyncio.create_task(self._keep_claimed(key)) if self.claim_lease is not None else None
+            try:
+                result = await fn()
+            except BaseException:
+                if self.claim_lease is not None:
+                    await self._call(self._release, key)
+                raise
+            finally:
+                if renewal is not None:
+                    renewal.cancel()
+            created_at = time.time()
+            try:
+                await self._call(self._save, key, result, created_at)
+            except Exception:
+                # The patient and order exist in Tasso: report the result, not
+                # a failure that would be retried into duplicates
+                log.error("could not store submission result", key=key, exc_info=True)
+                await self._release_quietly(key)
+            self._remember(key, result, created_at)
+            future.set_result(result)
+            return result, False
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved: waiters (if any) re-raise it themselves
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _wait_for_claim(self, key: str) -> Optional[Tuple[dict, float]]:
+        """Claim `key` for this process, or wait for the owner's stored result."""
+        while True:
+            claimed, stored = await self._call(self._claim, key)
+            if claimed or stored is not None:
+                return stored
+            await asyncio.sleep(self.claim_poll)
+
+    async def _release_quietly(self, key: str) -> None:
+        if self.claim_lease is None:
+            return
+        try:
+            await self._call(self._release, key)
+        except Exception:
+            log.error("could not release idempotency claim", key=key, exc_info=True)
+
+    async def _keep_claimed(self, key: str) -> None:
+        while True:
+            await asyncio.sleep(self.claim_lease / 3)
+            try:
+                await self._call(self._renew, key)
+            except Exception:
+                log.warning("idempotency claim renewal failed", key=key, exc_info=True)
+
+    async def get(self, key: str) -> Optional[dict]:
+        cached = self._get_cached(key)
+        if cached is not None:
+            return cached
+        stored = await self._call(self._load, key)
+        return stored[0] if stored else None
+
+    # -------------------------------
+    # In-memory tier
+    # -------------------------------
+    def _get_cached(self, key: str) -> Optional[dict]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        result, created_at = entry
+        if time.time() - created_at > self.ttl:
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return result
+
+    def _remember(self, key: str, result: dict, created_at: float) -> None:
+        self._cache[key] = (result, created_at)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    # -------------------------------
+    # Persistent tier
+    # -------------------------------
+    def _load(self, key: str) -> Optional[Tuple[dict, float]]:
+        row = self._conn.execute(
+            "SELECT result, created_at FROM idempotency_keys WHERE key = ? AND created_at > ?",
+            (key, time.time() - self.ttl),
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def _save(self, key: str, result: dict, created_at: float) -> None:
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO idempotency_keys (key, result, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(result), created_at),
+            )
+            if self.claim_lease is not None:
+                self._conn.execute("DELETE FROM idempotency_claims WHERE key = ?", (key,))
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            self._conn.execute(
+                "DELETE FROM idempotency_keys WHERE created_at <= ?",
+                (time.time() - self.ttl,),
+            )
+
+    def _claim(self, key: str) -> Tuple[bool, Optional[Tuple[dict, float]]]:
+        """`(claimed, stored)`: the stored result if one appeared, else whether we hold the claim."""
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            stored = self._load(key)
+            if stored is not None:
+                self._conn.execute("COMMIT")
+                return False, stored
+            row = self._conn.execute(
+                "SELECT owner, claimed_at FROM idempotency_claims WHERE key = ?", (key,)
+            ).fetchone()
+            if (
+                row is not None
+                and row[0] != self.owner
+                and now - row[1] < self.claim_lease
+                and not owner_is_gone(row[0], self.owner)
+            ):
+                self._conn.execute("COMMIT")
+                return False, None
+            self._conn.execute(
+                "INSERT OR REPLACE INTO idempotency_claims (key, owner, claimed_at) VALUES (?, ?, ?)",
+                (key, self.owner, now),
+            )
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        return True, None
+
+    def _renew(self, key: str) -> None:
+        self._conn.execute(
+            "UPDATE idempotency_claims SET claimed_at = ? WHERE key = ? AND owner = ?",
+            (time.time(), key, self.owner),
+        )
+
+    def _release(self, key: str) -> None:
+        self._conn.execute(
+            "DELETE FROM idempotency_claims WHERE key = ? AND owner = ?", (key, self.owner)
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
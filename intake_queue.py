@@ -0,0 +1,360 @@
+"""
+Durable accept-then-process queue for Jotform submissions.
+
+The webhook stores the raw `rawRequest` in a SQLite (WAL) table and returns
+immediately; `IntakeWorkers` claim jobs from the table and run the normal
+patient + order flow. Jobs left `running` by a crash or restart are put back
+to `pending`, so nothing that was acknowledged is lost.
+
+Several worker processes can drain the same file. A claimed job carries its
+owner and a lease that the worker renews while the job runs; `recover()`
+only requeues jobs whose owner is gone or whose lease has run out, so a
+worker starting up never takes over jobs another live worker is running.
+"""
+import asyncio
+import json
+import threading
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+from db import connect
+from fast_json import loads
+from logs import correlation_scope, get_logger
+from metrics import INTAKE_JOBS, INTAKE_WORKERS_BUSY
+from shared_state import owner_id, owner_is_gone
+
+log = get_logger(__name__)
+
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+@dataclass
+class Job:
+    id: int
+    payload: str
+    state: str
+    attempts: int
+    last_error: Optional[str]
+    result: Optional[dict]
+
+
+class IntakeQueue:
+    """SQLite-backed job table. All methods are coroutines that run the query in a thread."""
+
+    def __init__(self, path: str, max_attempts: int = 5, lease: float = 300):
+        # FULL: a 202 to Jotform means the submission is on disk
+        self._conn = connect(path, synchronous="FULL")
+        self._lock = threading.Lock()
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self.owner = owner_id()
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS intake_jobs (
+                id           INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload      TEXT NOT NULL,
+                state        TEXT NOT NULL,
+                attempts     INTEGER NOT NULL DEFAULT 0,
+                last_error   TEXT,
+                result       TEXT,
+                available_at REAL NOT NULL,
+                created_at   REAL NOT NULL,
+                updated_at   REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_intake_jobs_ready ON intake_jobs (state, available_at)"
+        )
+        # Added for multi-process workers; older files get the columns here
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(intake_jobs)")}
+        for column in ("owner TEXT", "lease_until REAL"):
+            if column.split()[0] not in columns:
+                self._conn.execute(f"ALTER TABLE intake_jobs ADD COLUMN {column}")
+
+    def _run(self, fn, *args):
+        with self._lock:
+            return fn(*args)
+
+    async def _call(self, fn, *args):
+        return await asyncio.to_thread(self._run, fn, *args)
+
+    # -------------------------------
+    # Producer side
+    # -------------------------------
+    async def enqueue(self, payload: str) -> int:
+        return await self._call(self._enqueue, payload)
+
+    def _enqueue(self, payload: str) -> int:
+        now = time.time()
+        cur = self._conn.execute(
+            "INSERT INTO intake_jobs (payload, state, available_at, created_at, updated_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (payload, PENDING, now, now, now),
+        )
+        return cur.lastrowid
+
+    # -------------------------------
+    # Consumer side
+    # -------------------------------
+    async def claim(self) -> Optional[Job]:
+        return await self._call(self._claim)
+
+    def _claim(self) -> Optional[Job]:
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._conn.execute(
+                "SELECT id FROM intake_jobs WHERE state = ? AND available_at <= ?"
+                " ORDER BY available_at, id LIMIT 1",
+                (PENDING, now),
+            ).fetchone()
+            if row is None:
+                self._conn.execute("COMMIT")
+                return None
+            self._conn.execute(
+                "UPDATE intake_jobs SET state = ?, attempts = attempts + 1, owner = ?,"
+                " lease_until = ?, updated_at = ? WHERE id = ?",
+                (RUNNING, self.owner, now + self.lease, now, row[0]),
+            )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return self._get(row[0])
+
+    async def complete(self, job_id: int, result: dict) -> None:
+        await self._call(
+            self._update, job_id, DONE, None, json.dumps(result), None
+        )
+
+    async def fail(self, job_id: int, error: str, retry_in: Optional[float]) -> None:
+        """Record a failure; requeue after `retry_in` seconds, or give up if None."""
+        if retry_in is None:
+            await self._call(self._update, job_id, FAILED, error, None, None)
+        else:
+            await self._call(
+                self._update, job_id, PENDING, error, None, time.time() + retry_in
+            )
+
+    def _update(self, job_id, state, error, result, available_at) -> None:
+        self._conn.execute(
+            "UPDATE intake_jobs SET state = ?, last_error = ?, result = ?,"
+            " available_at = COALESCE(?, available_at), owner = NULL, lease_until = NULL,"
+            " updated_at = ? WHERE id = ?",
+            (state, error, result, available_at, time.time(), job_id),
+        )
+
+    async def renew(self, job_id: int) -> None:
+        """Extend the lease on a job this queue is running."""
+        await self._call(self._renew, job_id)
+
+    def _renew(self, job_id: int) -> None:
+        self._conn.execute(
+            "UPDATE intake_jobs SET lease_until = ? WHERE id = ? AND state = ? AND owner = ?",
+            (time.time() + self.lease, job_id, RUNNING, self.owner),
+        )
+
+    async def recover(self) -> int:
+        """Requeue running jobs whose worker is gone or whose lease ran out."""
+        return await self._call(self._recover)
+
+    def _recover(self) -> int:
+        now = time.time()
+        rows = self._conn.execute(
+            "SELECT id, owner, lease_until FROM intake_jobs WHERE state = ?", (RUNNING,)
+        ).fetchall()
+        stale = [
+            job_id for job_id, owner, lease_until in rows
+            if lease_until is None or lease_until <= now or owner_is_gone(owner, self.owner)
+        ]
+        # The state check keeps a job that finished meanwhile from being requeued
+        self._conn.executemany(
+            "UPDATE intake_jobs SET state = ?, owner = NULL, lease_until = NULL, updated_at = ?"
+            " WHERE id = ? AND state = ?",
+            [(PENDING, now, job_id, RUNNING) for job_id in stale],
+        )
+        return len(stale)
+
+    # -------------------------------
+    # Inspection
+    # -------------------------------
+    async def get(self, job_id: int) -> Optional[Job]:
+        return await self._call(self._get, job_id)
+
+    def _get(self, job_id: int) -> Optional[Job]:
+        row = self._conn.execute(
+            "SELECT id, payload, state, attempts, last_error, result FROM intake_jobs WHERE id = ?",
+            (job_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        return Job(
+            id=row[0],
+            payload=row[1],
+            state=row[2],
+            attempts=row[3],
+            last_error=row[4],
+            result=json.loads(row[5]) if row[5] else None,
+        )
+
+    async def counts(self) -> dict:
+        return await self._call(self._counts)
+
+    def _counts(self) -> dict:
+        rows = self._conn.execute(
+            "SELECT state, COUNT(*) FROM intake_jobs GROUP BY state"
+        ).fetchall()
+        return {state: n for state, n in rows}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class IntakeWorkers:
+    """
+    Pool of asyncio tasks that drain an `IntakeQueue`.
+
+    `handler` receives the parsed submission dict. A ValueError, or an
+    error flagged `retryable = False`, fails the job immediately; anything
+    else is retried with exponential backoff until the queue's
+    `max_attempts` is reached.
+
+    With a `breaker`, workers stop claiming jobs while it is open instead of
+    burning attempts on calls that would fail fast anyway.
+
+    Every `recover_interval` seconds the pool requeues jobs abandoned by
+    other worker processes (see `IntakeQueue.recover`).
+
+    `on_failure(job, error)` is awaited when a job fails for good.
+    """
+
+    def __init__(
+        self,
+        queue: IntakeQueue,
+        handler: Callable[[dict], Awaitable[dict]],
+        concurrency: int = 4,
+        poll_interval: float = 1.0,
+        retry_base: float = 2.0,
+        retry_cap: float = 300.0,
+        breaker=None,
+        recover_interval: float = 60.0,
+        on_failure: Optional[Callable[[Job, Exception], Awaitable[None]]] = None,
+    ):
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.retry_base = retry_base
+        self.retry_cap = retry_cap
+        self.breaker = breaker
+        self.recover_interval = recover_interval
+        self.on_failure = on_failure
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self) -> None:
+        recovered = await self.queue.recover()
+        if recovered:
+            log.info("intake queue resuming unfinished jobs", count=recovered)
+        self._tasks = [
+            asyncio.create_task(self._worker()) for _ in range(self.concurrency)
+        ]
+        self._tasks.append(asyncio.create_task(self._recover_loop()))
+
+    def notify(self) -> None:
+        """Wake idle workers after an enqueue."""
+        self._wakeup.set()
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _recover_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.recover_interval)
+            try:
+                recovered = await self.queue.recover()
+            except Exception:
+                log.error("intake queue recovery failed", exc_info=True)
+                continue
+            if recovered:
+                log.info("intake queue took over abandoned jobs", count=recovered)
+                self.notify()
+
+    async def _keep_leased(self, job: Job) -> None:
+        while True:
+            await asyncio.sleep(self.queue.lease / 3)
+            try:
+                await self.queue.renew(job.id)
+            except Exception:
+                log.warning("intake job lease renewal failed", job_id=job.id, exc_info=True)
+
+    async def _worker(self) -> None:
+        while True:
+            if self.breaker is not None:
+                await self.breaker.wait_until_closed()
+
+            # Cleared before claiming so an enqueue racing the claim still wakes us
+            self._wakeup.clear()
+            try:
+                job = await self.queue.claim()
+            except Exception:
+                log.error("intake queue claim failed", exc_info=True)
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            INTAKE_WORKERS_BUSY.inc()
+            lease = asyncio.create_task(self._keep_leased(job))
+            try:
+                with correlation_scope(f"job-{job.id}"):
+                    await self._run_job(job)
+            finally:
+                lease.cancel()
+                INTAKE_WORKERS_BUSY.dec()
+
+    async def _run_job(self, job: Job) -> None:
+        try:
+            result = await self.handler(loads(job.payload))
+        except asyncio.CancelledError:
+            raise
+        except ValueError as e:
+            await self._fail(job, e)
+        except Exception as e:
+            # Errors that say they are not retryable (e.g. a 4xx from Tasso) fail now
+            permanent = getattr(e, "retryable", True) is False
+            if permanent or job.attempts >= self.queue.max_attempts:
+                await self._fail(job, e)
+            else:
+                delay = min(self.retry_base * 2 ** (job.attempts - 1), self.retry_cap)
+                # Honor a Retry-After from Tasso (or the open breaker)
+                delay = max(delay, getattr(e, "retry_after", None) or 0)
+                await self.queue.fail(job.id, str(e), retry_in=delay)
+                INTAKE_JOBS.labels("retry").inc()
+            log.warning("intake job failed", job_id=job.id, attempt=job.attempts, error=str(e))
+        else:
+            await self.queue.complete(job.id, result)
+            INTAKE_JOBS.labels("done").inc()
+
+    async def _fail(self, job: Job, error: Exception) -> None:
+        await self.queue.fail(job.id, str(error), retry_in=None)
+        INTAKE_JOBS.labels("failed").inc()
+        if self.on_failure is not None:
+            try:
+                await self.on_failure(job, error)
+            except Exception:
+                log.error("intake failure hook failed", job_id=job.id, exc_info=True)
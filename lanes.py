@@ -0,0 +1,35 @@
+"""
+Priority lanes for Tasso calls.
+
+Every Tasso call belongs to a lane, taken from the context it runs in:
+`live` (webhooks and the intake queue: a patient is waiting) by default, or
+`bulk` inside `lane_scope(BULK)` (backfills, dead-letter reprocessing).
+The outbound rate limiter and the adaptive concurrency limiter use the lane
+to keep part of Tasso's budget for live work: bulk calls get a bounded
+share of both, and when live and bulk calls wait for the same slots they
+are served by weight.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+LIVE = "live"
+BULK = "bulk"
+LANES = (LIVE, BULK)
+
+_lane: ContextVar[str] = ContextVar("lane", default=LIVE)
+
+
+def current_lane() -> str:
+    return _lane.get()
+
+
+@contextmanager
+def lane_scope(lane: str):
+    """Run a block (and the tasks it starts) in `lane`."""
+    if lane not in LANES:
+        raise ValueError(f"Unknown lane {lane!r}")
+    token = _lane.set(lane)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
@@ -0,0 +1,279 @@
+"""
+Structured JSON logging that stays off the request path.
+
+Log calls only build a LogRecord and put it on an in-memory queue; a
+`QueueListener` thread does the formatting, PHI redaction and the write to
+stdout. If the queue is full the record is dropped and counted rather than
+blocking the event loop.
+
+    log = get_logger(__name__)
+    log.info("patient created", patient_id=patient_id)
+
+Keyword arguments become top-level JSON fields. Fields named in
+`PHI_FIELDS` (at any depth) are redacted or replaced by a keyed hash, so a
+payload can be logged without leaking it. Field values are formatted on the
+listener thread, so don't mutate them after logging.
+
+Every record carries the current correlation ID (`CorrelationIdMiddleware`
+sets one per request; workers set their own with `correlation_scope`).
+DEBUG records are sampled per correlation ID: a sampled request logs all of
+its debug lines, the rest log none.
+"""
+import contextlib
+import contextvars
+import hashlib
+import hmac
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+import uuid
+import zlib
+from typing import Optional
+
+REDACT = "redact"
+HASH = "hash"
+
+# Tasso payload keys -> how to log them
+PHI_FIELDS = {
+    "firstName": REDACT,
+    "lastName": REDACT,
+    "shippingAddress": REDACT,
+    "race": REDACT,
+    "email": HASH,
+    "phoneNumber": HASH,
+    "dateOfBirth": HASH,
+}
+
+CORRELATION_HEADER = "X-Correlation-ID"
+
+correlation_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "correlation_id", default=None
+)
+
+# Standard LogRecord attributes, so anything else passed via `extra` is a field
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message", "asctime", "fields", "correlation_id",
+}
+
+
+def new_correlation_id() -> str:
+    return uuid.uuid4().hex
+
+
+@contextlib.contextmanager
+def correlation_scope(cid: Optional[str] = None):
+    """Run a block (e.g. one queued job) under its own correlation ID."""
+    token = correlation_id.set(cid or new_correlation_id())
+    try:
+        yield correlation_id.get()
+    finally:
+        correlation_id.reset(token)
+
+
+# -------------------------------
+# Caller side (event loop)
+# -------------------------------
+class StructuredLogger(logging.LoggerAdapter):
+    """`log.info("msg", key=value)`: keyword arguments become JSON fields."""
+
+    _LOGGING_KWARGS = ("exc_info", "stack_info", "stacklevel", "extra")
+
+    def __init__(self, logger: logging.Logger):
+        super().__init__(logger, {})
+
+    def process(self, msg, kwargs):
+        fields = {k: kwargs.pop(k) for k in list(kwargs) if k not in self._LOGGING_KWARGS}
+        if fields:
+            kwargs["extra"] = {**kwargs.get("extra", {}), "fields": fields}
+        return msg, kwargs
+
+
+def get_logger(name: str) -> StructuredLogger:
+    return StructuredLogger(logging.getLogger(name))
+
+
+class ContextFilter(logging.Filter):
+    """
+    Stamps the correlation ID on the record (it must be read on the calling
+    task) and drops DEBUG records for correlation IDs outside the sample.
+    """
+
+    def __init__(self, debug_sample_rate: float = 1.0):
+        super().__init__()
+        self.threshold = int(max(0.0, min(debug_sample_rate, 1.0)) * 10_000)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        cid = correlation_id.get()
+        record.correlation_id = cid
+        if record.levelno <= logging.DEBUG and self.threshold < 10_000:
+            key = cid or f"{record.thread}-{record.created}"
+            return zlib.crc32(key.encode()) % 10_000 < self.threshold
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands the record to the listener untouched (the stock handler formats it
+    first, on the caller's thread) and never blocks on a full queue.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+# -------------------------------
+# Listener side (background thread)
+# -------------------------------
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with PHI fields redacted or hashed."""
+
+    def __init__(self, phi_fields: Optional[dict] = None, hash_key: str = ""):
+        super().__init__()
+        self.phi_fields = PHI_FIELDS if phi_fields is None else phi_fields
+        self.hash_key = hash_key.encode()
+
+    def hash_value(self, value) -> str:
+        if not isinstance(value, str):
+            value = json.dumps(value, sort_keys=True, default=str)
+        digest = hmac.new(self.hash_key, value.encode(), hashlib.sha256).hexdigest()
+        return "sha256:" + digest[:16]
+
+    def scrub(self, value):
+        if isinstance(value, dict):
+            out = {}
+            for key, item in value.items():
+                action = self.phi_fields.get(key)
+                if action is None or item is None:
+                    out[key] = self.scrub(item)
+                elif action == HASH:
+                    out[key] = self.hash_value(item)
+                else:
+                    out[key] = "[REDACTED]"
+            return out
+        if isinstance(value, (list, tuple)):
+            return [self.scrub(item) for item in value]
+        return value
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+            + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        cid = getattr(record, "correlation_id", None)
+        if cid:
+            entry["correlation_id"] = cid
+        fields = dict(getattr(record, "fields", None) or {})
+        fields.update((k, v) for k, v in vars(record).items() if k not in _RECORD_ATTRS)
+        if fields:
+            entry.update(self.scrub(fields))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+# -------------------------------
+# Setup
+# -------------------------------
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional[NonBlockingQueueHandler] = None
+
+
+def configure_logging(
+    level: str = "INFO",
+    *,
+    debug_sample_rate: float = 1.0,
+    hash_key: str = "",
+    queue_size: int = 10_000,
+    stream=None,
+    phi_fields: Optional[dict] = None,
+) -> None:
+    """Route the root logger through the queue. Calling it again is a no-op."""
+    global _listener, _handler
+    if _listener is not None:
+        return
+
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter(phi_fields, hash_key))
+
+    _handler = NonBlockingQueueHandler(log_queue)
+    _handler.addFilter(ContextFilter(debug_sample_rate))
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(level.upper())
+    # tasso_client logs the calls that matter; httpx would add a line per request
+    for name in ("httpx", "httpcore"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(log_queue, output)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener, _handler
+    if _listener is None:
+        return
+    logging.getLogger().removeHandler(_handler)
+    _listener.stop()
+    _listener = None
+    _handler = None
+
+
+def dropped_records() -> int:
+    return _handler.dropped if _handler is not None else 0
+
+
+# -------------------------------
+# ASGI middleware
+# -------------------------------
+class CorrelationIdMiddleware:
+    """
+    Takes the correlation ID from the request header (or makes one), binds
+    it for the request and echoes it on the response.
+    """
+
+    def __init__(self, app, header: str = CORRELATION_HEADER):
+        self.app = app
+        self.header = header.lower().encode()
+        self.response_header = header.encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        cid = None
+        for name, value in scope["headers"]:
+            if name == self.header:
+                cid = value.decode("latin-1")[:128]
+                break
+        cid = cid or new_correlation_id()
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((self.response_header, cid.encode("latin-1")))
+                message["headers"] = headers
+            await send(message)
+
+        token = correlation_id.set(cid)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            correlation_id.reset(token)
@@ -1,19 +1,280 @@
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-import requests
 from config import (
-    TASSO_BASE_URL,
+    Settings,
+    load_settings,
     JOTFORM_WEBHOOK_SECRET,
-    TASSO_USERNAME,
-    TASSO_SECRET,
-    GLP1_PROJECT_ID,
-    TESTOSTRONE_PROJECT_ID)
+    INTAKE_MODE,
+    INTAKE_DB_PATH,
+    INTAKE_WORKERS,
+    INTAKE_MAX_ATTEMPTS,
+    IDEMPOTENCY_DB_PATH,
+    IDEMPOTENCY_TTL,
+    IDEMPOTENCY_CACHE_SIZE,
+    IDEMPOTENCY_CLAIM_LEASE,
+    INTAKE_JOB_LEASE,
+    SHARED_STATE,
+    ADMIN_API_KEY,
+    BACKFILL_CONCURRENCY,
+    BACKFILL_MAX_CONCURRENCY,
+    LOG_LEVEL,
+    LOG_DEBUG_SAMPLE_RATE,
+    LOG_HASH_KEY,
+    LOG_QUEUE_SIZE,
+    TRACE_BUFFER_SIZE,
+    TRACE_SLOWEST,
+    PROFILE_SAMPLE_EVERY,
+    PATIENT_REGISTRY_ENABLED,
+    PATIENT_REGISTRY_DB_PATH,
+    PATIENT_REGISTRY_TTL,
+    PATIENT_REGISTRY_CACHE_SIZE,
+    PATIENT_REGISTRY_WARM_ON_START,
+    PATIENT_REGISTRY_WARM_PAGE_SIZE,
+    PROJECT_CACHE_TTL,
+    STARTUP_PREWARM_TIMEOUT,
+    FORM_ROUTES_PATH,
+    FORM_ROUTES_RELOAD_INTERVAL,
+    EXTRA_PROJECT_IDS,
+    ORDER_MIRROR_ENABLED,
+    ORDER_MIRROR_DB_PATH,
+    ORDER_MIRROR_SYNC_INTERVAL,
+    ORDER_MIRROR_PAGE_SIZE,
+    TASSO_EVENTS_SECRET,
+    TASSO_EVENTS_BATCH_WINDOW,
+    TASSO_EVENTS_MAX_BATCH,
+    CAPTURE_ENABLED,
+    CAPTURE_DIR,
+    CAPTURE_PATHS,
+    CAPTURE_SEGMENT_BYTES,
+    CAPTURE_SEGMENT_SECONDS,
+    CAPTURE_QUEUE_SIZE,
+    DEAD_LETTER_ENABLED,
+    DEAD_LETTER_DB_PATH,
+    ADMISSION_ENABLED,
+    ADMISSION_PATHS,
+    ADMISSION_MAX_IN_FLIGHT,
+    ADMISSION_MAX_QUEUED,
+    ADMISSION_QUEUE_TIMEOUT,
+    ADMISSION_MAX_BODY,
+    ADMISSION_RETRY_AFTER,
+    ADMISSION_ROUTES)
 
 from fastapi import Form
-import traceback
+from fastapi import Depends, Header, Query
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from contextlib import asynccontextmanager
+from typing import List, Optional
+import asyncio
+import hmac
+import os
+import time
 import json
 
-app = FastAPI()
+from token_manager import TokenManager
+from shared_state import close_shared_state, get_shared_state
+from tasso_client import get_client, close_client
+from resilience import OPEN, TassoError
+from intake_queue import IntakeQueue, IntakeWorkers, PENDING, RUNNING, DONE, FAILED
+from idempotency import IdempotencyStore
+from normalizer import normalize, build_order_payload, resolve_route, routing_table
+from form_routes import RouteReloader
+from lanes import BULK, LIVE, lane_scope
+from patient_registry import PatientRegistry, warm_from_tasso
+from project_cache import ProjectCache
+from order_mirror import OrderMirror, OrderSync
+from tasso_events import SIGNATURE_HEADER, EventBatcher, parse_events, verify_signature
+from admission import AdmissionControl, AdmissionLimit, AdmissionMiddleware, parse_limits
+from capture import CaptureMiddleware, CaptureWriter
+from fast_json import loads
+from form_fields import extract_field
+from dead_letters import DeadLetterStore, STAGES as DEAD_LETTER_STAGES
+from backfill import spool, iter_file, parse_records, run_backfill, ndjson
+from logs import (
+    CorrelationIdMiddleware,
+    configure_logging,
+    correlation_scope,
+    dropped_records,
+    get_logger,
+    shutdown_logging,
+)
+from metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    DEAD_LETTERS,
+    INTAKE_QUEUE_JOBS,
+    LOG_RECORDS_DROPPED,
+    PATIENT_REGISTRY_LOOKUPS,
+    PROJECT_CACHE_AGE_SECONDS,
+    REGISTRY,
+    TASSO_EVENTS,
+    TASSO_BREAKER_OPEN,
+    TASSO_RATE_LIMIT_WAITING,
+    WEBHOOK_FORM_DECODE,
+    WEBHOOK_STAGE_SECONDS,
+    MetricsMiddleware,
+)
+from tracing import SampledProfiler, TraceBuffer, TracingMiddleware, span
+
+log = get_logger(__name__)
+
+STAGE_FORM_PARSE = WEBHOOK_STAGE_SECONDS.labels("form_parse")
+STAGE_JSON_DECODE = WEBHOOK_STAGE_SECONDS.labels("json_decode")
+STAGE_NORMALIZE = WEBHOOK_STAGE_SECONDS.labels("normalize")
+STAGE_TOKEN = WEBHOOK_STAGE_SECONDS.labels("get_tasso_token")
+STAGE_CREATE_PATIENT = WEBHOOK_STAGE_SECONDS.labels("create_tasso_patient")
+STAGE_CREATE_ORDER = WEBHOOK_STAGE_SECONDS.labels("create_tasso_order")
+
+project_cache = ProjectCache(
+    fetch=lambda project_id, etag: with_token(fetch_tasso_project, project_id, etag),
+    project_ids=[*routing_table().project_ids(), *EXTRA_PROJECT_IDS],
+    ttl=PROJECT_CACHE_TTL,
+)
+
+traces = TraceBuffer(size=TRACE_BUFFER_SIZE, slowest=TRACE_SLOWEST)
+profiler = SampledProfiler(every=PROFILE_SAMPLE_EVERY)
+capture = CaptureWriter(
+    CAPTURE_DIR,
+    segment_bytes=CAPTURE_SEGMENT_BYTES,
+    segment_seconds=CAPTURE_SEGMENT_SECONDS,
+    queue_size=CAPTURE_QUEUE_SIZE,
+)
+admission = AdmissionControl(
+    parse_limits(ADMISSION_ROUTES, ADMISSION_PATHS, AdmissionLimit(
+        max_in_flight=ADMISSION_MAX_IN_FLIGHT,
+        max_queued=ADMISSION_MAX_QUEUED,
+        queue_timeout=ADMISSION_QUEUE_TIMEOUT,
+        max_body=ADMISSION_MAX_BODY,
+        retry_after=ADMISSION_RETRY_AFTER,
+    )),
+    enabled=ADMISSION_ENABLED,
+)
+
+
+# -------------------------------
+# Shared Tasso auth token
+# -------------------------------
+# Created at startup from the validated settings
+token_manager: Optional[TokenManager] = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global token_manager
+    # Raises ConfigError: a misconfigured replica never starts serving
+    settings = app.state.settings = load_settings()
+    configure_logging(
+        LOG_LEVEL,
+        debug_sample_rate=LOG_DEBUG_SAMPLE_RATE,
+        hash_key=LOG_HASH_KEY,
+        queue_size=LOG_QUEUE_SIZE,
+    )
+    log.info("configuration loaded", **app.state.settings.summary())
+    app.state.form_routes = None
+    if FORM_ROUTES_PATH:
+        # Projects of newly routed forms are fetched before their first submission
+        app.state.form_routes = RouteReloader(
+            FORM_ROUTES_PATH,
+            interval=FORM_ROUTES_RELOAD_INTERVAL,
+            on_change=lambda table: project_cache.track(table.project_ids()),
+        )
+        app.state.form_routes.load()
+        app.state.form_routes.start()
+    token_manager = TokenManager.from_settings(
+        lambda: get_tasso_token(settings), settings, store=get_shared_state()
+    )
+    get_client()
+    if CAPTURE_ENABLED:
+        capture.start()
+    app.state.ready = False
+    warming = asyncio.create_task(warm_until_ready(app))
+    try:
+        await asyncio.wait_for(asyncio.shield(warming), STARTUP_PREWARM_TIMEOUT)
+    except asyncio.TimeoutError:
+        log.warning("prewarm timed out; serving, /ready reports 503 until warm")
+    project_cache.start()
+    app.state.idempotency = IdempotencyStore(
+        IDEMPOTENCY_DB_PATH,
+        ttl=IDEMPOTENCY_TTL,
+        max_entries=IDEMPOTENCY_CACHE_SIZE,
+        claim_lease=IDEMPOTENCY_CLAIM_LEASE if SHARED_STATE else None,
+    )
+    app.state.patient_registry = None
+    warmup = None
+    if PATIENT_REGISTRY_ENABLED:
+        app.state.patient_registry = PatientRegistry(
+            PATIENT_REGISTRY_DB_PATH, ttl=PATIENT_REGISTRY_TTL, max_entries=PATIENT_REGISTRY_CACHE_SIZE
+        )
+        if PATIENT_REGISTRY_WARM_ON_START:
+            # In the background: webhooks are served (and fill the registry) meanwhile
+            warmup = asyncio.create_task(warm_patient_registry(app.state.patient_registry))
+
+    app.state.dead_letters = DeadLetterStore(DEAD_LETTER_DB_PATH) if DEAD_LETTER_ENABLED else None
+    app.state.order_mirror = None
+    app.state.order_sync = None
+    app.state.event_batcher = None
+    if ORDER_MIRROR_ENABLED:
+        app.state.order_mirror = OrderMirror(ORDER_MIRROR_DB_PATH)
+        app.state.order_sync = OrderSync(
+            app.state.order_mirror,
+            lambda resource, since, page: in_bulk_lane(list_tasso_updated, resource, since, page),
+            page_size=ORDER_MIRROR_PAGE_SIZE,
+            interval=ORDER_MIRROR_SYNC_INTERVAL,
+            # One syncing process is enough when there are several workers
+            lock_path=ORDER_MIRROR_DB_PATH + ".sync.lock",
+        )
+        if ORDER_MIRROR_SYNC_INTERVAL > 0:
+            app.state.order_sync.start()
+        app.state.event_batcher = EventBatcher(
+            app.state.order_mirror.apply_events,
+            window=TASSO_EVENTS_BATCH_WINDOW,
+            max_batch=TASSO_EVENTS_MAX_BATCH,
+        )
+        app.state.event_batcher.start()
+
+    if INTAKE_MODE == "queue":
+        app.state.intake_queue = IntakeQueue(
+            INTAKE_DB_PATH, max_attempts=INTAKE_MAX_ATTEMPTS, lease=INTAKE_JOB_LEASE
+        )
+        app.state.intake_workers = IntakeWorkers(
+            app.state.intake_queue,
+            process_queued_submission,
+            concurrency=INTAKE_WORKERS,
+            breaker=get_client().breaker,
+            on_failure=dead_letter_job,
+        )
+        await app.state.intake_workers.start()
+
+    yield
+
+    # Draining: take this replica out of rotation first
+    app.state.ready = False
+    warming.cancel()
+    await asyncio.gather(warming, return_exceptions=True)
+    if app.state.form_routes is not None:
+        await app.state.form_routes.close()
+    if INTAKE_MODE == "queue":
+        await app.state.intake_workers.stop()
+        app.state.intake_queue.close()
+    if warmup is not None:
+        warmup.cancel()
+        await asyncio.gather(warmup, return_exceptions=True)
+    if app.state.patient_registry is not None:
+        app.state.patient_registry.close()
+    if app.state.order_mirror is not None:
+        await app.state.event_batcher.close()
+        await app.state.order_sync.close()
+        app.state.order_mirror.close()
+    app.state.idempotency.close()
+    if app.state.dead_letters is not None:
+        app.state.dead_letters.close()
+    await project_cache.close()
+    await token_manager.close()
+    await close_client()
+    close_shared_state()
+    capture.stop()
+    shutdown_logging()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # -------------------------------
 # Enable CORS for all origins
@@ -24,72 +285,195 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Correlation-ID"],
 )
+app.add_middleware(CaptureMiddleware, writer=capture, paths=CAPTURE_PATHS)
+app.add_middleware(TracingMiddleware, buffer=traces, profiler=profiler)
+# Outside tracing so refused requests cost no trace; inside the correlation ID for their logs
+app.add_middleware(AdmissionMiddleware, control=admission)
+app.add_middleware(CorrelationIdMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 # -------------------------------
-# Helper: Authenticate with Tasso
+# Admin endpoints: shared-key check
 # -------------------------------
-def get_tasso_token() -> str:
-    url = f"{TASSO_BASE_URL}/authTokens"
+def require_admin(x_admin_key: Optional[str] = Header(default=None)) -> None:
+    if not ADMIN_API_KEY:
+        raise HTTPException(status_code=403, detail="Admin API is disabled (ADMIN_API_KEY not set)")
+    if not x_admin_key or not hmac.compare_digest(x_admin_key, ADMIN_API_KEY):
+        raise HTTPException(status_code=403, detail="Invalid admin key")
 
-    payload = {
-        "username": f"{TASSO_USERNAME}",
-        "secret":   f"{TASSO_SECRET}"
-    }
 
-    headers = {
-        "Content-Type": "application/json"
+# -------------------------------
+# Helper: Authenticate with Tasso
+# -------------------------------
+async def get_tasso_token(settings: Settings) -> str:
+    payload = {
+        "username": settings.tasso_username,
+        "secret":   settings.tasso_secret,
     }
 
-    response = requests.post(url, json=payload, headers=headers, timeout=10)
-    print('---------------')
-    print(response.text)
+    # Minting a token has no side effects, so it is safe to retry. Live
+    # calls share the token, so a refresh never waits in the bulk lane.
+    with lane_scope(LIVE):
+        response = await get_client().call("POST", "/authTokens", json=payload, idempotent=True)
 
-    # if response.status_code != 200:
-    #     raise Exception(f"Tasso auth failed: {response.text}")
-    
-    data = response.json()
+    data = loads(response.content)
     if "results" not in data or "idToken" not in data["results"]:
-        raise Exception(f"Unexpected response format: {response.text}")
+        raise Exception(f"Unexpected response format: {sorted(data)}")
+
+    log.info("Tasso token minted")
 
     return data["results"]["idToken"]
 
 # -------------------------------
 # Helper: Create Patient in Tasso
 # -------------------------------
-def create_tasso_patient(token: str, patient: dict) -> dict:
-    url = f"{TASSO_BASE_URL}/patients"
+async def create_tasso_patient(token: str, patient: dict) -> dict:
+    with span("create_tasso_patient", STAGE_CREATE_PATIENT):
+        response = await get_client().call("POST", "/patients", token=token, json=patient)
+        return loads(response.content)
 
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
 
-    response = requests.post(url, json=patient, headers=headers, timeout=10)
+# -------------------------------
+# Helper: Create Order in Tasso
+# -------------------------------
+async def create_tasso_order(token: str, order: dict) -> dict:
+    with span("create_tasso_order", STAGE_CREATE_ORDER):
+        response = await get_client().call("POST", "/orders", token=token, json=order)
+        return loads(response.content)
 
-    if response.status_code not in (200, 201):
-        raise Exception(response.text)
 
-    return response.json()
+# -------------------------------
+# Helper: Fetch Project Metadata (conditional GET)
+# -------------------------------
+async def fetch_tasso_project(token: str, project_id: str, etag: Optional[str]):
+    """Returns (status, etag, project); project is None when Tasso answers 304."""
+    response = await get_client().call(
+        "GET",
+        f"/projects/{project_id}",
+        token=token,
+        headers={"If-None-Match": etag} if etag else None,
+        accept=(304,),
+    )
+    if response.status_code == 304:
+        return 304, etag, None
+    return response.status_code, response.headers.get("etag"), loads(response.content).get("results") or {}
 
 
 # -------------------------------
-# Helper: Create Order in Tasso
+# Helper: List Patients in Tasso (one page)
 # -------------------------------
-def create_tasso_order(token: str, order: dict) -> dict:
-    url = f"{TASSO_BASE_URL}/orders"
+async def list_tasso_patients(token: str, project_id: str, page: int) -> list:
+    response = await get_client().call(
+        "GET",
+        "/patients",
+        token=token,
+        params={"projectId": project_id, "page": page, "limit": PATIENT_REGISTRY_WARM_PAGE_SIZE},
+    )
+    return loads(response.content).get("results") or []
 
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
 
-    response = requests.post(url, json=order, headers=headers, timeout=10)
+# -------------------------------
+# Helper: List Patients/Orders Changed Since a Timestamp (one page)
+# -------------------------------
+async def list_tasso_updated(token: str, resource: str, updated_since: Optional[str], page: int) -> list:
+    params = {"page": page, "limit": ORDER_MIRROR_PAGE_SIZE}
+    if updated_since:
+        params["updatedSince"] = updated_since
+    response = await get_client().call("GET", f"/{resource}", token=token, params=params)
+    return loads(response.content).get("results") or []
+
+
+async def prewarm() -> dict:
+    """
+    Get the Tasso token (which also opens a pooled connection) and fetch
+    every configured project, so the first webhook runs at steady-state
+    latency. Returns what is still missing.
+    """
+    missing = {}
+    try:
+        await token_manager.get_token()
+    except Exception as e:
+        missing["token"] = str(e)
+    else:
+        await project_cache.prewarm()
+        projects = [p for p in project_cache.project_ids if project_cache.get(p) is None]
+        if projects:
+            missing["projects"] = projects
+    return missing
+
+
+async def warm_until_ready(app: FastAPI, retry_base: float = 1.0, retry_cap: float = 30.0) -> None:
+    """Prewarm, retrying with backoff until nothing is missing, then mark the app ready."""
+    started = time.perf_counter()
+    delay = retry_base
+    while True:
+        missing = await prewarm()
+        if not missing:
+            break
+        app.state.warm_missing = missing
+        log.warning("prewarm incomplete, retrying", retry_in=delay, **missing)
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, retry_cap)
+    app.state.warm_missing = {}
+    app.state.ready = True
+    log.info(
+        "prewarmed",
+        seconds=round(time.perf_counter() - started, 3),
+        projects=len(project_cache.project_ids),
+    )
+
+
+async def warm_patient_registry(registry: PatientRegistry) -> int:
+    """Load every patient of the routed projects from Tasso into the registry."""
+    project_ids = routing_table().project_ids()
+    try:
+        loaded = await warm_from_tasso(
+            registry,
+            lambda project_id, page: in_bulk_lane(list_tasso_patients, project_id, page),
+            project_ids,
+            PATIENT_REGISTRY_WARM_PAGE_SIZE,
+        )
+    except Exception:
+        log.error("patient registry warm-up failed", exc_info=True)
+        raise
+    log.info("patient registry warmed", patients=loaded, projects=len(project_ids))
+    return loaded
+
+
+# -------------------------------
+# Helper: Call Tasso with the cached token
+# -------------------------------
+async def with_token(fn, *args):
+    """
+    Call `fn(token, *args)` with the shared token. A 401 means the cached
+    token was revoked or expired early: mint a new one and try once more.
+    """
+    token = await _token()
+    try:
+        return await fn(token, *args)
+    except TassoError as e:
+        if e.status_code != 401:
+            raise
+        token_manager.invalidate(token)
+        token = await _token()
+        return await fn(token, *args)
+
 
-    if response.status_code not in (200, 201):
-        raise Exception(f"Tasso order creation failed: {response.status_code} - {response.text}")
+async def in_bulk_lane(fn, *args):
+    """`with_token` for background paging (mirror sync, registry warm-up), behind live calls."""
+    with lane_scope(BULK):
+        return await with_token(fn, *args)
 
-    return response.json()
+
+async def _token() -> str:
+    with span("get_tasso_token", STAGE_TOKEN):
+        try:
+            return await token_manager.get_token()
+        except Exception as e:
+            mark_failed_stage(e, "auth")
+            raise
 
 
 # -----------------------------------------
@@ -345,6 +729,276 @@ def create_tasso_order(token: str, order: dict) -> dict:
 #         raise HTTPException(status_code=500, detail=str(e))
 
 
+# -----------------------------------------
+# Submission flow: Create Patient + Order
+# -----------------------------------------
+async def process_submission(data: dict, patient_id: Optional[str] = None) -> dict:
+    """
+    Create a patient from a parsed Jotform submission and immediately
+    create an order for them.
+
+    Used both by the webhook (inline) and by the intake queue workers.
+    `patient_id` resumes a submission whose patient was already created
+    (dead-letter reprocessing). A failure is raised with `stage` set on the
+    exception (see `mark_failed_stage`).
+    """
+
+    log.debug(
+        "submission received",
+        event_id=data.get("event_id"),
+        path=data.get("path"),
+        fields=sorted(data),
+    )
+
+    try:
+        with span("normalize", STAGE_NORMALIZE):
+            # Resolved once: a routing table reload mid-flight doesn't split the submission
+            route = resolve_route(data)
+            patient_payload = normalize(data, route)
+        validate_order_configuration(data, patient_payload["projectId"], route.configuration_id)
+    except Exception as e:
+        mark_failed_stage(e, "normalize")
+        raise
+
+    log.debug("patient payload", subject_id=patient_payload["subjectId"], payload=patient_payload)
+
+    # Jotform retries and resubmissions share the event_id (and so the
+    # subjectId); without one there is nothing to deduplicate on.
+    idempotency = getattr(app.state, "idempotency", None)
+    if idempotency is None or not data.get("event_id"):
+        return await create_patient_and_order(data, patient_payload, patient_id, route)
+
+    result, replayed = await idempotency.run(
+        patient_payload["subjectId"],
+        lambda: create_patient_and_order(data, patient_payload, patient_id, route),
+    )
+    if replayed:
+        log.info("duplicate submission, returning stored result", subject_id=patient_payload["subjectId"])
+    return result
+
+
+def validate_order_configuration(data: dict, project_id: Optional[str],
+                                 default_configuration: Optional[str] = None) -> None:
+    """Reject an order configuration the project doesn't offer (from the cache, no I/O)."""
+    configuration_id = data.get("configurationId") or default_configuration
+    if not configuration_id or not project_id:
+        return
+    allowed = project_cache.configuration_ids(project_id)
+    if allowed is None:
+        # Metadata not loaded yet, or it lists no configurations: let Tasso be the judge
+        return
+    if configuration_id not in allowed:
+        raise ValueError(f"Order configuration {configuration_id} is not available for project {project_id}")
+
+
+async def create_patient(patient_payload: dict, registry: Optional[PatientRegistry]) -> str:
+    tasso_patient = await with_token(create_tasso_patient, patient_payload)
+    patient_id = tasso_patient["results"]["id"]
+    log.info("patient created", subject_id=patient_payload["subjectId"], patient_id=patient_id)
+    if registry is not None:
+        # Recorded before the order: a failed order retried later won't create a second patient
+        await registry.remember(patient_payload, patient_id)
+    await mirror_records("patients", {**patient_payload, **tasso_patient["results"]})
+    return patient_id
+
+
+async def mirror_records(resource: str, record: dict) -> None:
+    """Add a record we just created to the order mirror. Never fails the submission."""
+    mirror = getattr(app.state, "order_mirror", None)
+    if mirror is None:
+        return
+    try:
+        if resource == "patients":
+            await mirror.upsert_patients([record])
+        else:
+            await mirror.upsert_orders([record])
+    except Exception as e:
+        log.warning("order mirror write failed", resource=resource, error=str(e))
+
+
+# -------------------------------
+# Dead letters
+# -------------------------------
+def mark_failed_stage(error: Exception, stage: str, **context) -> None:
+    """
+    Note on `error` where the flow failed, for the dead-letter store. The
+    innermost stage wins (an auth failure while creating the patient stays
+    "auth").
+    """
+    if getattr(error, "stage", None) is None:
+        error.stage = stage
+    for name, value in context.items():
+        if getattr(error, name, None) is None:
+            setattr(error, name, value)
+
+
+async def record_dead_letter(data: Optional[dict], error: Exception, key: Optional[str] = None) -> None:
+    store = getattr(app.state, "dead_letters", None)
+    if store is None:
+        return
+    stage = getattr(error, "stage", None) or "unknown"
+    try:
+        letter_id = await store.record(
+            data,
+            stage,
+            str(error) or type(error).__name__,
+            status_code=getattr(error, "status_code", None),
+            patient_payload=getattr(error, "patient_payload", None),
+            patient_id=getattr(error, "patient_id", None),
+            key=key,
+        )
+    except Exception:
+        log.error("could not record dead letter", exc_info=True)
+        return
+    DEAD_LETTERS.labels(stage).inc()
+    log.warning("submission dead-lettered", dead_letter_id=letter_id, stage=stage)
+
+
+async def process_bulk(data: dict) -> dict:
+    """Backfill entry point: the webhook flow in the bulk lane, behind live traffic."""
+    with lane_scope(BULK):
+        return await process_or_dead_letter(data)
+
+
+async def process_or_dead_letter(data: dict) -> dict:
+    """`process_submission`, keeping failures in the dead-letter store."""
+    try:
+        result = await process_submission(data)
+    except Exception as e:
+        await record_dead_letter(data, e)
+        raise
+    store = getattr(app.state, "dead_letters", None)
+    if store is not None and data.get("event_id"):
+        try:
+            await store.resolve_event(data["event_id"], result)
+        except Exception:
+            log.error("could not resolve dead letter", exc_info=True)
+    return result
+
+
+async def dead_letter_job(job, error: Exception) -> None:
+    """Intake queue hook: a job that failed for good becomes a dead letter."""
+    try:
+        data = json.loads(job.payload)
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        mark_failed_stage(error, "normalize")
+        data = {"unparsed": job.payload}
+    await record_dead_letter(data, error)
+
+
+async def reprocess_dead_letter(letter) -> dict:
+    """
+    Run a dead letter through the flow again. A letter whose patient was
+    already created (failed at the order, or at auth before it) resumes at
+    the order.
+    """
+    if letter.raw is None:
+        return {"id": letter.id, "status": "error", "error": "No submission stored"}
+    resume = letter.patient_id
+    try:
+        with correlation_scope(f"dead-letter-{letter.id}"):
+            result = await process_submission(letter.raw, patient_id=resume)
+    except Exception as e:
+        await record_dead_letter(letter.raw, e, key=letter.key)
+        return {"id": letter.id, "status": "error", "stage": getattr(e, "stage", None), "error": str(e)}
+    await app.state.dead_letters.resolve(letter.id, result)
+    return {"id": letter.id, "status": "success", "resumed_at": "order" if resume else None,
+            "result": result}
+
+
+async def process_queued_submission(data: dict) -> dict:
+    """Intake worker entry point: the same flow, traced like a request."""
+    with traces.trace("intake job"):
+        return await process_submission(data)
+
+
+async def create_patient_and_order(data: dict, patient_payload: dict,
+                                   patient_id: Optional[str] = None, route=None) -> dict:
+    registry = getattr(app.state, "patient_registry", None)
+
+    try:
+        if patient_id is None:
+            # Returning patient with unchanged details: go straight to the order
+            patient_id = await registry.lookup(patient_payload) if registry is not None else None
+            if registry is not None:
+                PATIENT_REGISTRY_LOOKUPS.labels("miss" if patient_id is None else "hit").inc()
+        reused = patient_id is not None
+
+        if reused:
+            log.info(
+                "known patient, skipping create",
+                subject_id=patient_payload["subjectId"],
+                patient_id=patient_id,
+            )
+        else:
+            patient_id = await create_patient(patient_payload, registry)
+    except Exception as e:
+        mark_failed_stage(e, "patient", patient_payload=patient_payload)
+        raise
+
+    # Now create order for the patient
+    order_payload = build_order_payload(patient_id, data, route)
+    log.debug("order payload", payload=order_payload)
+
+    # Create the order
+    try:
+        try:
+            tasso_order = await with_token(create_tasso_order, order_payload)
+        except TassoError as e:
+            if not reused or e.status_code != 404:
+                raise
+            # The stored patient ID points at a patient Tasso no longer has
+            PATIENT_REGISTRY_LOOKUPS.labels("stale").inc()
+            log.warning("known patient not found in Tasso, recreating", patient_id=patient_id)
+            if registry is not None:
+                await registry.forget(patient_payload)
+            reused = False
+            patient_id = None
+            patient_id = await create_patient(patient_payload, registry)
+            order_payload = build_order_payload(patient_id, data, route)
+            tasso_order = await with_token(create_tasso_order, order_payload)
+    except Exception as e:
+        if patient_id is None:
+            mark_failed_stage(e, "patient", patient_payload=patient_payload)
+        else:
+            mark_failed_stage(e, "order", patient_payload=patient_payload, patient_id=patient_id)
+        raise
+    order_id = (tasso_order.get("results") or {}).get("id")
+    log.info("order created", patient_id=patient_id, order_id=order_id)
+    await mirror_records(
+        "orders",
+        {**order_payload, "projectId": patient_payload["projectId"], **(tasso_order.get("results") or {})},
+    )
+
+    return {
+        "status": "success",
+        "tasso_patient_id": patient_id,
+        "tasso_order_id": order_id,
+        "tasso_patient_reused": reused,
+        # "order_details": tasso_order.get("results", tasso_order)
+    }
+
+
+async def raw_request(request: Request) -> Optional[str]:
+    """
+    The rawRequest field of a Jotform webhook. Read straight from the body
+    bytes; the full form parser only runs for bodies `extract_field` can't
+    read.
+    """
+    body = await request.body()
+    try:
+        raw = extract_field(body, request.headers.get("content-type", ""), "rawRequest")
+    except ValueError:
+        WEBHOOK_FORM_DECODE.labels("form_parser").inc()
+        form = await request.form()
+        raw = form.get("rawRequest")
+        return raw if isinstance(raw, str) else None
+    WEBHOOK_FORM_DECODE.labels("fast").inc()
+    return raw
+
+
 # -----------------------------------------
 # Combined Endpoint: Create Patient + Order
 # -----------------------------------------
@@ -353,6 +1007,10 @@ async def jotform_webhook_with_order(request: Request):
     """
     Create a patient and immediately create an order for them.
     This combines both operations in one webhook call.
+
+    With INTAKE_MODE=queue the raw submission is stored in the durable
+    intake queue and acknowledged with 202; a background worker runs the
+    same flow.
     
     Requires additional fields in the Jotform:
     - configurationId
@@ -360,165 +1018,419 @@ async def jotform_webhook_with_order(request: Request):
     - containerIdentifier (optional)
     - shipByDate (optional)
     """
-    
-    US_STATE_CODES = {
-        "Alabama": "AL", "Alaska": "AK", "Arizona": "AZ", "Arkansas": "AR",
-        "California": "CA", "Colorado": "CO", "Connecticut": "CT", "Delaware": "DE",
-        "Florida": "FL", "Georgia": "GA", "Hawaii": "HI", "Idaho": "ID",
-        "Illinois": "IL", "Indiana": "IN", "Iowa": "IA", "Kansas": "KS",
-        "Kentucky": "KY", "Louisiana": "LA", "Maine": "ME", "Maryland": "MD",
-        "Massachusetts": "MA", "Michigan": "MI", "Minnesota": "MN", "Mississippi": "MS",
-        "Missouri": "MO", "Montana": "MT", "Nebraska": "NE", "Nevada": "NV",
-        "New Hampshire": "NH", "New Jersey": "NJ", "New Mexico": "NM", "New York": "NY",
-        "North Carolina": "NC", "North Dakota": "ND", "Ohio": "OH", "Oklahoma": "OK",
-        "Oregon": "OR", "Pennsylvania": "PA", "Rhode Island": "RI", "South Carolina": "SC",
-        "South Dakota": "SD", "Tennessee": "TN", "Texas": "TX", "Utah": "UT",
-        "Vermont": "VT", "Virginia": "VA", "Washington": "WA", "West Virginia": "WV",
-        "Wisconsin": "WI", "Wyoming": "WY", "District of Columbia": "DC"
+    try:
+        with span("form_parse", STAGE_FORM_PARSE):
+            raw = await raw_request(request)
+
+        if INTAKE_MODE == "queue":
+            if not raw:
+                raise HTTPException(status_code=400, detail="rawRequest is required")
+            job_id = await request.app.state.intake_queue.enqueue(raw)
+            request.app.state.intake_workers.notify()
+            log.info("submission queued", job_id=job_id)
+            return JSONResponse(
+                status_code=202,
+                content={"status": "accepted", "job_id": job_id},
+            )
+
+        with span("json_decode", STAGE_JSON_DECODE):
+            try:
+                data = loads(raw)
+            except (TypeError, ValueError) as e:
+                mark_failed_stage(e, "normalize")
+                await record_dead_letter({"unparsed": raw}, e)
+                raise
+        return await process_or_dead_letter(data)
+
+    except HTTPException:
+        raise
+    except TassoError as e:
+        log.error("webhook failed", exc_info=True, status_code=e.status_code, retryable=e.retryable)
+        if not e.retryable:
+            raise HTTPException(status_code=500, detail=str(e))
+        # Tasso is throttling or down: ask Jotform to retry later
+        retry_after = int(e.retry_after or get_client().breaker.retry_after() or 30)
+        raise HTTPException(
+            status_code=503, detail=str(e), headers={"Retry-After": str(max(retry_after, 1))}
+        )
+    except Exception as e:
+        log.error("webhook failed", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# -----------------------------------------
+# Tasso Status Events (order shipped, specimen received, ...)
+# -----------------------------------------
+@app.post("/webhooks/tasso/events")
+async def tasso_events_webhook(request: Request):
+    """
+    Receive Tasso's event notifications and apply them to the order mirror.
+    Answers once the batch holding the events is committed; duplicates and
+    out-of-order events are acknowledged but change nothing.
+    """
+    if not TASSO_EVENTS_SECRET:
+        raise HTTPException(status_code=403, detail="Tasso events are disabled (TASSO_EVENTS_SECRET not set)")
+    body = await request.body()
+    if not verify_signature(TASSO_EVENTS_SECRET, body, request.headers.get(SIGNATURE_HEADER)):
+        TASSO_EVENTS.labels("bad_signature").inc()
+        raise HTTPException(status_code=401, detail="Invalid signature")
+    if request.app.state.order_mirror is None:
+        raise HTTPException(status_code=503, detail="Order mirror is disabled")
+    try:
+        events = parse_events(loads(body))
+    except ValueError as e:
+        # json.JSONDecodeError is a ValueError too
+        TASSO_EVENTS.labels("invalid").inc()
+        raise HTTPException(status_code=400, detail=str(e))
+
+    outcomes = await request.app.state.event_batcher.submit(events)
+    for outcome in outcomes:
+        TASSO_EVENTS.labels(outcome).inc()
+    return {"received": len(events), "applied": outcomes.count("applied")}
+
+
+# -----------------------------------------
+# Intake Queue: Job Status
+# -----------------------------------------
+@app.get("/intake/jobs/{job_id}")
+async def intake_job_status(job_id: int, request: Request):
+    queue = getattr(request.app.state, "intake_queue", None)
+    job = await queue.get(job_id) if queue else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return {
+        "job_id": job.id,
+        "state": job.state,
+        "attempts": job.attempts,
+        "last_error": job.last_error,
+        "result": job.result,
+    }
+
+
+# -----------------------------------------
+# Admin: Bulk Backfill (JSONL / CSV upload)
+# -----------------------------------------
+@app.post("/admin/backfill", dependencies=[Depends(require_admin)])
+async def backfill_submissions(
+    request: Request,
+    format: Optional[str] = None,
+    concurrency: int = BACKFILL_CONCURRENCY,
+):
+    """
+    Stream a JSONL or CSV export of Jotform submissions through the
+    patient + order flow. Results are streamed back as NDJSON, one line per
+    record, in completion order.
+    """
+    fmt = format or ("csv" if "csv" in request.headers.get("content-type", "") else "jsonl")
+    if fmt not in ("jsonl", "csv"):
+        raise HTTPException(status_code=400, detail="format must be jsonl or csv")
+    concurrency = max(1, min(concurrency, BACKFILL_MAX_CONCURRENCY))
+
+    upload = await spool(request.stream())
+    records = parse_records(iter_file(upload), fmt)
+    results = run_backfill(records, process_bulk, concurrency)
+    return StreamingResponse(ndjson(results), media_type="application/x-ndjson")
+
+
+# -----------------------------------------
+# Readiness
+# -----------------------------------------
+@app.get("/ready", include_in_schema=False)
+async def ready(request: Request):
+    """
+    Readiness probe: 200 once configuration is valid and the token,
+    connection pool and project metadata are warm; 503 before that and
+    while shutting down.
+    """
+    if getattr(request.app.state, "ready", False):
+        return {"ready": True}
+    return JSONResponse(
+        status_code=503,
+        content={"ready": False, "missing": getattr(request.app.state, "warm_missing", {})},
+    )
+
+
+# -----------------------------------------
+# Admin: Service Status
+# -----------------------------------------
+@app.get("/admin/status", dependencies=[Depends(require_admin)])
+async def service_status(request: Request):
+    client = get_client()
+    routes = routing_table()
+    status = {
+        # Per process: with several workers each answers for itself
+        "worker_pid": os.getpid(),
+        "tasso_breaker": client.breaker.snapshot(),
+        "tasso_rate_limits": client.limiter.snapshot(),
+        "tasso_concurrency": {endpoint: limiter.snapshot() for endpoint, limiter in client.concurrency.items()},
+        "projects": project_cache.snapshot(),
+        "log_records_dropped": dropped_records(),
+        "admission": admission.snapshot(),
+        "capture": {"segment": capture.path, "dropped": capture.dropped} if capture.running else None,
+        "form_routes": {
+            "source": routes.source,
+            "forms": len(routes.routes),
+            "fallback": routes.fallback is not None,
+            "reload_error": request.app.state.form_routes.last_error if request.app.state.form_routes else None,
+        },
     }
+    queue = getattr(request.app.state, "intake_queue", None)
+    if queue is not None:
+        status["intake_queue"] = await queue.counts()
+    return status
 
+
+# -----------------------------------------
+# Admin: Order Mirror
+# -----------------------------------------
+def require_order_mirror(request: Request) -> OrderMirror:
+    mirror = request.app.state.order_mirror
+    if mirror is None:
+        raise HTTPException(status_code=404, detail="Order mirror is disabled")
+    return mirror
+
+
+@app.get("/admin/orders", dependencies=[Depends(require_admin)])
+async def list_mirrored_orders(
+    request: Request,
+    patientId: Optional[str] = None,
+    subjectId: Optional[str] = None,
+    email: Optional[str] = None,
+    createdAfter: Optional[str] = None,
+    createdBefore: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+):
+    """
+    Orders from the local mirror, newest first. Pass `next_cursor` back as
+    `cursor` for the next page. Never calls Tasso.
+    """
+    mirror = require_order_mirror(request)
     try:
-        form = await request.form()
-        raw = form.get("rawRequest")
-        data = json.loads(raw)
+        orders, next_cursor = await mirror.orders(
+            patient_id=patientId,
+            subject_id=subjectId,
+            email=email,
+            created_after=createdAfter,
+            created_before=createdBefore,
+            limit=limit,
+            cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"orders": orders, "next_cursor": next_cursor}
+
+
+@app.get("/admin/orders/{order_id}", dependencies=[Depends(require_admin)])
+async def get_mirrored_order(order_id: str, request: Request):
+    order = await require_order_mirror(request).order(order_id)
+    if order is None:
+        raise HTTPException(status_code=404, detail="Order not found in the mirror")
+    return order
+
+
+@app.get("/admin/mirror", dependencies=[Depends(require_admin)])
+async def order_mirror_status(request: Request):
+    mirror = require_order_mirror(request)
+    return {**await mirror.counts(), "last_sync": request.app.state.order_sync.last_run}
+
+
+@app.post("/admin/mirror/sync", dependencies=[Depends(require_admin)])
+async def sync_order_mirror(request: Request):
+    """Run an incremental sync from Tasso now."""
+    require_order_mirror(request)
+    try:
+        synced = await request.app.state.order_sync.sync_once()
+    except TassoError as e:
+        raise HTTPException(status_code=502, detail=f"Order mirror sync failed: {e}")
+    if synced is None:
+        raise HTTPException(status_code=409, detail="Another worker is syncing")
+    return {"synced": synced}
 
-        print("PARSED RAW:", data)
-        
-        # Extract patient information (same as original webhook)
-        name = data.get("q3_name", {})
-        dob = data.get("q16_dateOf", {})
-        phone = data.get("q6_phoneNumber", {})
-        digits = f"{phone.get('area','')}{phone.get('phone','')}"
-        digits = "".join([c for c in digits if c.isdigit()])
-
-        path = data.get("path", "")
-        if path == "/submit/242116255933151":
-            project_id = GLP1_PROJECT_ID
-        elif path == "/submit/242115439242147":
-            project_id = TESTOSTRONE_PROJECT_ID
-        else:
-            project_id = GLP1_PROJECT_ID
 
-        if len(digits) == 10:
-            formatted_phone = "1" + digits
-        elif len(digits) == 11 and digits.startswith("1"):
-            formatted_phone = digits
-        else:
-            formatted_phone = None
+# -----------------------------------------
+# Admin: Dead Letters
+# -----------------------------------------
+def require_dead_letters(request: Request) -> DeadLetterStore:
+    store = request.app.state.dead_letters
+    if store is None:
+        raise HTTPException(status_code=404, detail="Dead-letter store is disabled")
+    return store
+
+
+def dead_letter_filters(
+    state: Optional[str] = "open",
+    stage: Optional[str] = None,
+    statusCode: Optional[int] = None,
+    error: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+) -> dict:
+    """Query filters shared by listing and bulk reprocessing. `state=all` matches any state."""
+    if stage is not None and stage not in DEAD_LETTER_STAGES:
+        raise HTTPException(status_code=400, detail=f"stage must be one of {', '.join(DEAD_LETTER_STAGES)}")
+    return {
+        "state": None if state == "all" else state,
+        "stage": stage,
+        "status_code": statusCode,
+        "error": error,
+        "since": since,
+        "until": until,
+    }
 
-        if formatted_phone:
-            contact = {
-                "email": data.get("q4_email"),
-                "phoneNumber": formatted_phone,
-            }
-        else:
-            contact = {
-                "email": data.get("q4_email"),
-            }
-
-        addr = data.get("q5_shippingAddress", {})
-        raw_id = data.get("event_id", "unknown")
-        safe_id = raw_id.replace("_", "-")
-        jot_gender = data.get("q15_gender", "").lower()
-
-        gender_map = {
-            "male": "cisMale",
-            "female": "cisFemale",
-        }
-        tasso_gender = gender_map.get(jot_gender, "unspecified")
-
-        sex_map = {
-            "male": "male",
-            "female": "female"
-        }
-        tasso_sex = sex_map.get(jot_gender, "unknown")
-
-        address1 = addr.get("addr_line1") or "Unknown"
-        address2 = addr.get("addr_line2") if addr.get("addr_line2") != '' else "Unknown"
-        city = addr.get("city") or "Unknown"
-        state = addr.get("state") or "Unknown"
-        postal = addr.get("postal") or "00000"
-        
-        if len(state) == 2:
-            state_code = state
-        else:
-            state_code = US_STATE_CODES.get(state, "Unknown")
-
-        normalized_address = {
-            "address1": address1,
-            "address2": address2,
-            "city": city,
-            "district1": state_code,
-            "postalCode": postal,
-            "country": "US"
-        }
-
-        dob_year = dob.get("year", "")
-        dob_month = dob.get("month", "")
-        dob_day = dob.get("day", "")
-
-        if not (dob_year and dob_month and dob_day):
-             # You might want to handle this more gracefully or default/fail
-             # For now, let's raise so we don't send garbage to Tasso
-             raise ValueError("Date of Birth is incomplete in the form submission")
-
-        # Ensure 2 digits for month/day
-        dob_month = dob_month.zfill(2)
-        dob_day = dob_day.zfill(2)
-
-        patient_payload = {
-            "projectId": project_id,
-            "subjectId": "AUTO-" + safe_id,
-            "firstName": name.get("first"),
-            "lastName": name.get("last"),
-            "shippingAddress": normalized_address,
-            "contactInformation": contact,
-            "dateOfBirth": f"{dob_year}-{dob_month}-{dob_day}",
-            "gender": tasso_gender,
-            "assignedSex": tasso_sex,
-            "race": data.get("q17_race"),
-            "smsConsent": False
-        }
-
-        print("PATIENT PAYLOAD:", patient_payload)
-
-        if not patient_payload["firstName"] or not patient_payload["lastName"]:
-            raise ValueError("Missing patient name")
-
-        # Create patient
-        token = get_tasso_token()
-        tasso_patient = create_tasso_patient(token, patient_payload)
-        patient_id = tasso_patient["results"]["id"]
-        
-        print(f"Patient created with ID: {patient_id}")
-        print(f"iam here 2222222222222222222222222222222222")
-        
-        # Now create order for the patient
-        # You'll need to add these fields to your Jotform
-        configuration_id = data.get("configurationId")  # Add this field to Jotform
-        npi_data = data.get("npi", {})  # Add this field to Jotform
-        
-        # if npi_data.get("id"):
-        order_payload = {
-            "patientId": patient_id
-        }
-        print(f"iam here 3333333333333333333333333333333333")
-        
-        print("ORDER PAYLOAD:", order_payload)
-        
-        # Create the order
-        tasso_order = create_tasso_order(token, order_payload)
-        print("ORDER RESPONSE:", tasso_order)
-        
-        return {
-            "status": "success",
-            "tasso_patient_id": patient_id,
-            # "tasso_order_id": tasso_order["results"]["id"],
-            # "order_details": tasso_order.get("results", tasso_order)
-        }
 
+@app.get("/admin/dead-letters", dependencies=[Depends(require_admin)])
+async def list_dead_letters(
+    request: Request,
+    filters: dict = Depends(dead_letter_filters),
+    beforeId: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """
+    Failed submissions, newest first, without the submissions themselves.
+    Pass `next_before_id` back as `beforeId` for the next page.
+    """
+    store = require_dead_letters(request)
+    letters = await store.list(**filters, before_id=beforeId, limit=limit)
+    return {
+        "dead_letters": [letter.summary() for letter in letters],
+        "next_before_id": letters[-1].id if len(letters) == limit else None,
+        "counts": await store.counts(),
+    }
 
-    except Exception as e:
-        print("ERROR STACKTRACE:")
-        print(traceback.format_exc())
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+
+@app.get("/admin/dead-letters/{letter_id}", dependencies=[Depends(require_admin)])
+async def get_dead_letter(letter_id: int, request: Request):
+    """One dead letter, including the stored submission and patient payload."""
+    letter = await require_dead_letters(request).get(letter_id)
+    if letter is None:
+        raise HTTPException(status_code=404, detail="Dead letter not found")
+    return {**letter.summary(), "raw": letter.raw, "patient_payload": letter.patient_payload,
+            "result": letter.result}
+
+
+@app.post("/admin/dead-letters/reprocess", dependencies=[Depends(require_admin)])
+async def reprocess_dead_letters(
+    request: Request,
+    ids: Optional[List[int]] = Query(None),
+    filters: dict = Depends(dead_letter_filters),
+    limit: int = Query(100, ge=1, le=1000),
+    concurrency: int = BACKFILL_CONCURRENCY,
+):
+    """
+    Run dead letters through the flow again: the given `ids`, or everything
+    matching the filters (open letters by default). Each resumes at the
+    stage it failed at; results are streamed back as NDJSON in completion
+    order. Letters that fail again stay open with the new error.
+    """
+    store = require_dead_letters(request)
+    concurrency = max(1, min(concurrency, BACKFILL_MAX_CONCURRENCY))
+    if ids:
+        letters = await store.list(ids=ids, state=None, limit=len(ids))
+    else:
+        letters = await store.list(**filters, limit=limit)
+    letters = [letter for letter in letters if letter.state != "resolved"]
+
+    async def results():
+        gate = asyncio.Semaphore(concurrency)
+
+        async def one(letter):
+            async with gate:
+                with lane_scope(BULK):
+                    return await reprocess_dead_letter(letter)
+
+        for done in asyncio.as_completed([one(letter) for letter in letters]):
+            yield await done
+
+    return StreamingResponse(ndjson(results()), media_type="application/x-ndjson")
+
+
+@app.delete("/admin/dead-letters/{letter_id}", dependencies=[Depends(require_admin)])
+async def discard_dead_letter(letter_id: int, request: Request):
+    """Give up on a dead letter; it is kept, marked discarded."""
+    if not await require_dead_letters(request).discard(letter_id):
+        raise HTTPException(status_code=404, detail="Dead letter not found")
+    return {"id": letter_id, "state": "discarded"}
+
+
+# -----------------------------------------
+# Admin: Patient Registry
+# -----------------------------------------
+@app.get("/admin/patients/registry", dependencies=[Depends(require_admin)])
+async def patient_registry_status(request: Request):
+    registry = request.app.state.patient_registry
+    if registry is None:
+        raise HTTPException(status_code=404, detail="Patient registry is disabled")
+    return {"patients": await registry.count()}
+
+
+@app.post("/admin/patients/registry/warm", dependencies=[Depends(require_admin)])
+async def warm_registry(request: Request):
+    """Page through Tasso's patient list and load it into the registry."""
+    registry = request.app.state.patient_registry
+    if registry is None:
+        raise HTTPException(status_code=404, detail="Patient registry is disabled")
+    try:
+        loaded = await warm_patient_registry(registry)
+    except TassoError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    return {"loaded": loaded, "patients": await registry.count()}
+
+
+# -----------------------------------------
+# Admin: Traces and Profiler
+# -----------------------------------------
+@app.get("/admin/traces", dependencies=[Depends(require_admin)])
+async def list_traces(sort: str = "slowest", limit: int = 20):
+    """Slowest traces since the last reset (`sort=slowest`) or the most recent ones."""
+    if sort not in ("slowest", "recent"):
+        raise HTTPException(status_code=400, detail="sort must be slowest or recent")
+    limit = max(1, min(limit, 500))
+    found = traces.slowest(limit) if sort == "slowest" else traces.latest(limit)
+    return {"traces": [t.to_dict() for t in found]}
+
+
+@app.delete("/admin/traces", dependencies=[Depends(require_admin)])
+async def reset_traces():
+    traces.reset()
+    return {"status": "ok"}
+
+
+@app.get("/admin/profiler", dependencies=[Depends(require_admin)])
+async def profiler_report(sort: str = "cumulative", limit: int = 50):
+    """Aggregated cProfile stats of the sampled requests, as pstats text."""
+    try:
+        report = profiler.report(sort, max(1, min(limit, 500)))
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Unknown sort key: {sort}")
+    return Response(report, media_type="text/plain")
+
+
+@app.post("/admin/profiler", dependencies=[Depends(require_admin)])
+async def configure_profiler(every: int, reset: bool = False):
+    """Profile 1 in `every` requests from now on (0 turns profiling off)."""
+    profiler.every = max(0, every)
+    if reset:
+        profiler.reset()
+    return {"every": profiler.every, "profiled": profiler.profiled}
+
+
+# -----------------------------------------
+# Prometheus metrics
+# -----------------------------------------
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    client = get_client()
+    TASSO_BREAKER_OPEN.set(1 if client.breaker.state == OPEN else 0)
+    for name, bucket in client.limiter.snapshot().items():
+        TASSO_RATE_LIMIT_WAITING.labels(name).set(bucket["waiting"])
+    LOG_RECORDS_DROPPED.set(dropped_records())
+    for project_id, entry in project_cache.snapshot().items():
+        PROJECT_CACHE_AGE_SECONDS.labels(project_id).set(entry["age"])
+    queue = getattr(request.app.state, "intake_queue", None)
+    if queue is not None:
+        counts = await queue.counts()
+        for state in (PENDING, RUNNING, DONE, FAILED):
+            INTAKE_QUEUE_JOBS.labels(state).set(counts.get(state, 0))
+    return Response(REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
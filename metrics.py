@@ -0,0 +1,369 @@
+"""
+In-process metrics in the Prometheus text format, served on /metrics.
+
+Counters, gauges and histograms are plain Python numbers updated from the
+event loop thread, so recording a sample is an attribute increment (plus a
+bisect for histograms) with no locks. Labelled children are created once
+and cached; look them up outside hot loops where it matters. Cumulative
+histogram buckets are only computed when /metrics is scraped.
+
+Each process has its own registry; with several workers, Prometheus sees
+one target per process.
+"""
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Seconds; webhook stages range from microseconds (normalize) to seconds (Tasso)
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_str(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            self._default = self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values) -> object:
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in list(self._children.items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+    def _render_child(self, key, child) -> List[str]:
+        return [f"{self.name}{_label_str(self.labelnames, key)} {_format_value(child.value)}"]
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float) -> None:
+        self._default.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._default.value -= amount
+
+
+class _Timer:
+    __slots__ = ("_child", "_started")
+
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._started)
+        return False
+
+
+class _HistogramChild:
+    __slots__ = ("upper_bounds", "counts", "sum")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self.upper_bounds = upper_bounds
+        # Per-bucket (not cumulative) counts; the last slot is +Inf
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+
+    def time(self) -> _Timer:
+        """`with histogram.labels("normalize").time(): ...`"""
+        return _Timer(self)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.upper_bounds = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.upper_bounds)
+
+    def observe(self, value: float) -> None:
+        self._default.observe(value)
+
+    def time(self) -> _Timer:
+        return _Timer(self._default)
+
+    def _render_child(self, key, child) -> List[str]:
+        lines = []
+        counts = list(child.counts)
+        cumulative = 0
+        for bound, count in zip(self.upper_bounds + (float("inf"),), counts):
+            cumulative += count
+            le = 'le="' + _format_value(bound) + '"'
+            lines.append(f"{self.name}_bucket{_label_str(self.labelnames, key, le)} {cumulative}")
+        labels = _label_str(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Duplicate metric {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collect: Callable[[], None]) -> None:
+        """Run `collect()` before each scrape, e.g. to copy a size into a gauge."""
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        for collect in self._collectors:
+            collect()
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def counter(name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, help, labelnames))
+
+
+def gauge(name: str, help: str, labelnames: Iterable[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, help, labelnames))
+
+
+def histogram(name: str, help: str, labelnames: Iterable[str] = (),
+              buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, help, labelnames, buckets))
+
+
+# -------------------------------
+# Service metrics
+# -------------------------------
+HTTP_REQUESTS = counter(
+    "http_requests_total", "HTTP requests handled, by route and status", ("method", "route", "status")
+)
+HTTP_REQUEST_SECONDS = histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route")
+)
+HTTP_IN_FLIGHT = gauge("http_requests_in_flight", "HTTP requests being handled")
+
+WEBHOOK_STAGE_SECONDS = histogram(
+    "webhook_stage_duration_seconds",
+    "Time spent in each stage of the Jotform -> Tasso flow",
+    ("stage",),
+)
+WEBHOOK_FORM_DECODE = counter(
+    "webhook_form_decode_total", "Webhook bodies decoded, by path (fast, form_parser)", ("path",)
+)
+
+TASSO_REQUESTS = counter(
+    "tasso_requests_total",
+    "Tasso API attempts by endpoint and outcome (HTTP status or error type)",
+    ("endpoint", "status"),
+)
+TASSO_REQUEST_SECONDS = histogram(
+    "tasso_request_duration_seconds", "Latency of single Tasso API attempts", ("endpoint",)
+)
+TASSO_IN_FLIGHT = gauge("tasso_requests_in_flight", "Tasso API requests awaiting a response")
+TASSO_RETRIES = counter("tasso_retries_total", "Tasso calls retried after a failure", ("endpoint",))
+TASSO_RATE_LIMIT_WAIT_SECONDS = histogram(
+    "tasso_rate_limit_wait_seconds", "Time spent waiting on the outbound rate limiter", ("endpoint",)
+)
+TASSO_RATE_LIMIT_WAITING = gauge(
+    "tasso_rate_limit_waiting", "Calls queued on each outbound rate-limit bucket", ("bucket",)
+)
+TASSO_CONCURRENCY_LIMIT = gauge(
+    "tasso_concurrency_limit", "Adaptive limit on in-flight Tasso calls, per endpoint", ("endpoint",)
+)
+TASSO_CONCURRENCY_WAIT_SECONDS = histogram(
+    "tasso_concurrency_wait_seconds", "Time spent waiting for a slot under the adaptive concurrency limit",
+    ("endpoint",),
+)
+TASSO_LANE_WAITING = gauge(
+    "tasso_lane_waiting", "Tasso calls waiting for rate or concurrency budget, by priority lane", ("lane",)
+)
+TASSO_LANE_WAIT_SECONDS = histogram(
+    "tasso_lane_wait_seconds", "Time Tasso calls waited for rate and concurrency budget, by priority lane",
+    ("lane",),
+)
+TASSO_BREAKER_OPEN = gauge("tasso_circuit_breaker_open", "1 while the Tasso circuit breaker is open")
+
+INTAKE_QUEUE_JOBS = gauge("intake_queue_jobs", "Intake queue jobs by state", ("state",))
+INTAKE_WORKERS_BUSY = gauge("intake_workers_busy", "Intake workers currently running a job")
+INTAKE_JOBS = counter("intake_jobs_total", "Intake job attempts, by outcome", ("outcome",))
+
+PATIENT_REGISTRY_LOOKUPS = counter(
+    "patient_registry_lookups_total", "Patient registry lookups: hit, miss or stale (Tasso 404)", ("result",)
+)
+
+PROJECT_CACHE_REFRESHES = counter(
+    "project_cache_refreshes_total", "Project metadata revalidations by result", ("result",)
+)
+PROJECT_CACHE_AGE_SECONDS = gauge(
+    "project_cache_age_seconds", "Seconds since each project's metadata was last validated", ("project",)
+)
+
+ORDER_MIRROR_SYNCED = counter(
+    "order_mirror_synced_total", "Records fetched from Tasso by the order mirror sync", ("resource",)
+)
+ORDER_MIRROR_SYNC_ERRORS = counter("order_mirror_sync_errors_total", "Order mirror sync passes that failed")
+TASSO_EVENTS = counter(
+    "tasso_events_total", "Tasso status events received, by outcome", ("outcome",)
+)
+TASSO_EVENT_BATCH_SIZE = histogram(
+    "tasso_event_batch_size", "Tasso events applied per transaction",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500),
+)
+CAPTURE_RECORDS = counter(
+    "capture_records_total", "Captured webhook requests, by result (written, dropped, error)", ("result",)
+)
+FORM_ROUTES = counter(
+    "form_routes_total", "Submissions routed to a Tasso project, by result (hit, fallback, miss)", ("result",)
+)
+FORM_ROUTE_RELOADS = counter(
+    "form_route_reloads_total", "Routing table reloads from the routes file, by result", ("result",)
+)
+DEAD_LETTERS = counter(
+    "dead_letters_total", "Submissions recorded as dead letters, by failing stage", ("stage",)
+)
+ADMISSION_IN_FLIGHT = gauge(
+    "admission_in_flight", "Admitted webhook requests being handled, by path", ("path",)
+)
+ADMISSION_QUEUED = gauge(
+    "admission_queued", "Webhook requests waiting for admission, by path", ("path",)
+)
+ADMISSION_REJECTED = counter(
+    "admission_rejected_total",
+    "Webhook requests refused by admission control, by path and reason (queue_full, queue_timeout, body_too_large)",
+    ("path", "reason"),
+)
+
+LOG_RECORDS_DROPPED = gauge("log_records_dropped", "Log records dropped because the log queue was full")
+
+
+# -------------------------------
+# ASGI middleware
+# -------------------------------
+class MetricsMiddleware:
+    """Request counts, latency and in-flight requests, labelled by route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = "500"
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        started = time.perf_counter()
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # The router stores the matched route on the scope; keeps label values bounded
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            HTTP_REQUEST_SECONDS.labels(method, route_path).observe(time.perf_counter() - started)
+            HTTP_REQUESTS.labels(method, route_path, status).inc()
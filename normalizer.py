@@ -0,0 +1,298 @@
+"""
+Jotform submission -> Tasso patient payload.
+
+Lookup tables are built once at import. Each form's field mapping is
+declared as data in FIELD_MAPS and compiled once into a closure with the
+Jotform keys bound as constants, so normalizing a submission is a handful of
+dict lookups. `normalize_many()` converts a batch in one pass for backfill
+and replay tooling; `benchmarks/bench_normalizer.py` measures throughput.
+
+Which Tasso project, order configuration and field map a form uses comes
+from the active `RoutingTable`: one dict lookup by form ID. The table is
+built from PROJECT_ROUTES unless a routes file replaces it (form_routes.py);
+replacing it is a single reference swap, so a submission already being
+processed keeps the route it started with.
+"""
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Union
+
+from config import GLP1_PROJECT_ID, TESTOSTRONE_PROJECT_ID
+from metrics import FORM_ROUTES
+
+
+US_STATE_CODES = {
+    "Alabama": "AL", "Alaska": "AK", "Arizona": "AZ", "Arkansas": "AR",
+    "California": "CA", "Colorado": "CO", "Connecticut": "CT", "Delaware": "DE",
+    "Florida": "FL", "Georgia": "GA", "Hawaii": "HI", "Idaho": "ID",
+    "Illinois": "IL", "Indiana": "IN", "Iowa": "IA", "Kansas": "KS",
+    "Kentucky": "KY", "Louisiana": "LA", "Maine": "ME", "Maryland": "MD",
+    "Massachusetts": "MA", "Michigan": "MI", "Minnesota": "MN", "Mississippi": "MS",
+    "Missouri": "MO", "Montana": "MT", "Nebraska": "NE", "Nevada": "NV",
+    "New Hampshire": "NH", "New Jersey": "NJ", "New Mexico": "NM", "New York": "NY",
+    "North Carolina": "NC", "North Dakota": "ND", "Ohio": "OH", "Oklahoma": "OK",
+    "Oregon": "OR", "Pennsylvania": "PA", "Rhode Island": "RI", "South Carolina": "SC",
+    "South Dakota": "SD", "Tennessee": "TN", "Texas": "TX", "Utah": "UT",
+    "Vermont": "VT", "Virginia": "VA", "Washington": "WA", "West Virginia": "WV",
+    "Wisconsin": "WI", "Wyoming": "WY", "District of Columbia": "DC"
+}
+
+GENDER_MAP = {
+    "male": "cisMale",
+    "female": "cisFemale",
+}
+
+SEX_MAP = {
+    "male": "male",
+    "female": "female",
+}
+
+# Built-in routes, used without a routes file: Jotform submit path -> Tasso
+# project; anything else falls back to GLP1
+PROJECT_ROUTES = {
+    "/submit/242116255933151": GLP1_PROJECT_ID,
+    "/submit/242115439242147": TESTOSTRONE_PROJECT_ID,
+}
+DEFAULT_PROJECT_ID = GLP1_PROJECT_ID
+
+# Logical field -> Jotform question key, per form profile
+FIELD_MAPS = {
+    "default": {
+        "name": "q3_name",
+        "email": "q4_email",
+        "shipping_address": "q5_shippingAddress",
+        "phone": "q6_phoneNumber",
+        "gender": "q15_gender",
+        "date_of_birth": "q16_dateOf",
+        "race": "q17_race",
+        "event_id": "event_id",
+    },
+}
+REQUIRED_FIELDS = frozenset(FIELD_MAPS["default"])
+
+
+Normalizer = Callable[[dict, Optional[str]], dict]
+
+
+def compile_field_map(mapping: dict) -> Normalizer:
+    """
+    Build a normalizer for one form. The returned function takes a parsed
+    submission and the Tasso project ID and returns the patient payload, or
+    raises ValueError for unusable submissions.
+    """
+    missing = REQUIRED_FIELDS - mapping.keys()
+    if missing:
+        raise ValueError(f"Field map is missing: {', '.join(sorted(missing))}")
+
+    name_key = mapping["name"]
+    email_key = mapping["email"]
+    address_key = mapping["shipping_address"]
+    phone_key = mapping["phone"]
+    gender_key = mapping["gender"]
+    dob_key = mapping["date_of_birth"]
+    race_key = mapping["race"]
+    event_key = mapping["event_id"]
+    state_codes = US_STATE_CODES
+    gender_map = GENDER_MAP
+    sex_map = SEX_MAP
+
+    def normalize(data: dict, project_id: Optional[str]) -> dict:
+        name = data.get(name_key) or {}
+        dob = data.get(dob_key) or {}
+        phone = data.get(phone_key) or {}
+        addr = data.get(address_key) or {}
+
+        digits = "".join(filter(str.isdigit, f"{phone.get('area', '')}{phone.get('phone', '')}"))
+        if len(digits) == 10:
+            formatted_phone = "1" + digits
+        elif len(digits) == 11 and digits.startswith("1"):
+            formatted_phone = digits
+        else:
+            formatted_phone = None
+
+        contact = {"email": data.get(email_key)}
+        if formatted_phone:
+            contact["phoneNumber"] = formatted_phone
+
+        safe_id = data.get(event_key, "unknown").replace("_", "-")
+        jot_gender = (data.get(gender_key) or "").lower()
+
+        state = addr.get("state") or "Unknown"
+        normalized_address = {
+            "address1": addr.get("addr_line1") or "Unknown",
+            "address2": addr.get("addr_line2") if addr.get("addr_line2") != '' else "Unknown",
+            "city": addr.get("city") or "Unknown",
+            "district1": state if len(state) == 2 else state_codes.get(state, "Unknown"),
+            "postalCode": addr.get("postal") or "00000",
+            "country": "US",
+        }
+
+        dob_year = dob.get("year", "")
+        dob_month = dob.get("month", "")
+        dob_day = dob.get("day", "")
+        if not (dob_year and dob_month and dob_day):
+            # Don't send garbage to Tasso
+            raise ValueError("Date of Birth is incomplete in the form submission")
+
+        first_name = name.get("first")
+        last_name = name.get("last")
+        if not first_name or not last_name:
+            raise ValueError("Missing patient name")
+
+        return {
+            "projectId": project_id,
+            "subjectId": "AUTO-" + safe_id,
+            "firstName": first_name,
+            "lastName": last_name,
+            "shippingAddress": normalized_address,
+            "contactInformation": contact,
+            "dateOfBirth": f"{dob_year}-{dob_month.zfill(2)}-{dob_day.zfill(2)}",
+            "gender": gender_map.get(jot_gender, "unspecified"),
+            "assignedSex": sex_map.get(jot_gender, "unknown"),
+            "race": data.get(race_key),
+            "smsConsent": False,
+        }
+
+    return normalize
+
+
+COMPILED_FIELD_MAPS = {profile: compile_field_map(m) for profile, m in FIELD_MAPS.items()}
+
+
+# -------------------------------
+# Form routing
+# -------------------------------
+@dataclass(frozen=True)
+class Route:
+    form_id: str
+    project_id: str
+    configuration_id: Optional[str] = None
+    profile: str = "default"
+    name: Optional[str] = None
+    normalizer: Normalizer = field(default=COMPILED_FIELD_MAPS["default"], repr=False, compare=False)
+
+
+def form_id(data: dict) -> str:
+    """Jotform form ID of a submission: `formID`, else the last part of its submit path."""
+    return str(data.get("formID") or data.get("path", "").rstrip("/").rpartition("/")[2])
+
+
+class RoutingTable:
+    """
+    Form ID -> Route, compiled once. Submissions from forms that are not
+    in the table use `fallback`, or are rejected (ValueError) without one.
+    """
+
+    def __init__(self, routes: Iterable[Route], fallback: Optional[Route] = None, source: str = "built-in"):
+        self.routes: Dict[str, Route] = {route.form_id: route for route in routes}
+        self.fallback = fallback
+        self.source = source
+
+    @classmethod
+    def compile(cls, forms: Dict[str, dict], fallback: Optional[dict] = None,
+                profiles: Optional[Dict[str, dict]] = None, source: str = "built-in") -> "RoutingTable":
+        """
+        Build a table from plain data: {form ID: {"project", "configuration",
+        "profile", "name"}}. `profiles` adds field maps to FIELD_MAPS. Raises
+        ValueError naming the first bad entry.
+        """
+        compiled = dict(COMPILED_FIELD_MAPS)
+        for profile, mapping in (profiles or {}).items():
+            try:
+                compiled[profile] = compile_field_map(mapping)
+            except ValueError as e:
+                raise ValueError(f"Profile {profile!r}: {e}") from None
+
+        def route(form: str, entry: dict) -> Route:
+            if not isinstance(entry, dict) or not entry.get("project"):
+                raise ValueError(f"Form {form!r} needs a project")
+            profile = entry.get("profile", "default")
+            if profile not in compiled:
+                raise ValueError(f"Form {form!r} uses unknown profile {profile!r}")
+            return Route(
+                form_id=str(form),
+                project_id=entry["project"],
+                configuration_id=entry.get("configuration") or None,
+                profile=profile,
+                name=entry.get("name"),
+                normalizer=compiled[profile],
+            )
+
+        return cls(
+            [route(form, entry) for form, entry in forms.items()],
+            route("fallback", fallback) if fallback else None,
+            source,
+        )
+
+    @classmethod
+    def built_in(cls) -> "RoutingTable":
+        forms = {form_id({"path": path}): {"project": project} for path, project in PROJECT_ROUTES.items() if project}
+        fallback = {"project": DEFAULT_PROJECT_ID} if DEFAULT_PROJECT_ID else None
+        return cls.compile(forms, fallback)
+
+    def resolve(self, data: dict) -> Route:
+        route = self.routes.get(form_id(data))
+        if route is not None:
+            FORM_ROUTES.labels("hit").inc()
+            return route
+        if self.fallback is not None:
+            FORM_ROUTES.labels("fallback").inc()
+            return self.fallback
+        FORM_ROUTES.labels("miss").inc()
+        raise ValueError(f"No route for form {form_id(data) or '(none)'}")
+
+    def project_ids(self) -> List[str]:
+        routes = [*self.routes.values(), *([self.fallback] if self.fallback else [])]
+        return list(dict.fromkeys(route.project_id for route in routes))
+
+
+_routing = RoutingTable.built_in()
+
+
+def routing_table() -> RoutingTable:
+    return _routing
+
+
+def set_routing_table(table: RoutingTable) -> None:
+    global _routing
+    _routing = table
+
+
+def resolve_route(data: dict) -> Route:
+    return _routing.resolve(data)
+
+
+def normalize(data: dict, route: Optional[Route] = None) -> dict:
+    """Patient payload for one parsed Jotform submission."""
+    route = route or _routing.resolve(data)
+    return route.normalizer(data, route.project_id)
+
+
+def normalize_many(submissions: Iterable[dict]) -> List[Union[dict, Exception]]:
+    """
+    Normalize a batch in one pass. The result is aligned with the input:
+    each item is the patient payload, or the exception that submission
+    raised (usually a ValueError; a malformed field can raise others), so
+    one bad submission doesn't sink the batch.
+    """
+    resolve = _routing.resolve  # one table for the whole batch
+    results: List[Union[dict, Exception]] = []
+    append = results.append
+    for data in submissions:
+        try:
+            route = resolve(data)
+            append(route.normalizer(data, route.project_id))
+        except Exception as e:
+            append(e)
+    return results
+
+
+def build_order_payload(patient_id: str, data: dict, route: Optional[Route] = None) -> dict:
+    """
+    Order for a patient. The provider and, unless the form (`configurationId`)
+    or its route picked one, the kit configuration come from the project.
+    """
+    order = {"patientId": patient_id}
+    configuration_id = data.get("configurationId") or (route.configuration_id if route else None)
+    if configuration_id:
+        order["orderConfiguration"] = {"configurationId": configuration_id}
+    return order
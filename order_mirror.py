@@ -0,0 +1,423 @@
+"""
+Local mirror of Tasso patients and orders, for "did patient X's kit ship?".
+
+Orders are written here when we create them and kept current by
+`OrderSync`, which pages Tasso's patient and order lists with an
+`updatedSince` watermark, so each pass only fetches what changed since the
+last one. Lookups by patient ID, subjectId, email or creation date are
+served from indexed SQLite tables with keyset pagination and never call
+Tasso.
+
+Tasso's status events (see `tasso_events`) are applied with `apply_events`.
+
+Patients are stored without names or contact details; the email is kept
+only as a SHA-256 digest of its normalized form, which is enough to look it
+up.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Iterable, List, Optional, Tuple
+
+from db import connect
+from logs import get_logger
+from metrics import ORDER_MIRROR_SYNCED, ORDER_MIRROR_SYNC_ERRORS
+from shared_state import FileLock
+
+log = get_logger(__name__)
+
+RESOURCES = ("patients", "orders")
+
+
+def email_digest(email: Optional[str]) -> Optional[str]:
+    email = (email or "").strip().lower()
+    return hashlib.sha256(email.encode()).hexdigest() if email else None
+
+
+def utc_now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def encode_cursor(created_at: str, order_id: str) -> str:
+    return base64.urlsafe_b64encode(f"{created_at}|{order_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Raises ValueError on a cursor we did not issue."""
+    try:
+        created_at, order_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+    return created_at, order_id
+
+
+class OrderMirror:
+
+    def __init__(self, path: str, event_retention: float = 30 * 86400):
+        # FULL: an acknowledged Tasso event is on disk (events are committed in batches)
+        self._conn = connect(path, synchronous="FULL")
+        self._lock = threading.Lock()
+        self.event_retention = event_retention
+        self._event_batches = 0
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS mirror_patients (
+                id           TEXT PRIMARY KEY,
+                project_id   TEXT,
+                subject_id   TEXT,
+                email_digest TEXT,
+                created_at   TEXT NOT NULL,
+                updated_at   TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_mirror_patients_subject ON mirror_patients (subject_id);
+            CREATE INDEX IF NOT EXISTS idx_mirror_patients_email ON mirror_patients (email_digest);
+
+            CREATE TABLE IF NOT EXISTS mirror_orders (
+                id         TEXT PRIMARY KEY,
+                patient_id TEXT,
+                project_id TEXT,
+                status     TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                data       TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_mirror_orders_patient ON mirror_orders (patient_id, created_at, id);
+            CREATE INDEX IF NOT EXISTS idx_mirror_orders_created ON mirror_orders (created_at, id);
+
+            CREATE TABLE IF NOT EXISTS mirror_watermarks (
+                resource   TEXT PRIMARY KEY,
+                updated_at TEXT NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS mirror_events (
+                id          TEXT PRIMARY KEY,
+                type        TEXT NOT NULL,
+                order_id    TEXT NOT NULL,
+                occurred_at TEXT NOT NULL,
+                received_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_mirror_events_received ON mirror_events (received_at);
+            """
+        )
+
+    def _run(self, fn, *args):
+        with self._lock:
+            return fn(*args)
+
+    async def _call(self, fn, *args):
+        return await asyncio.to_thread(self._run, fn, *args)
+
+    # -------------------------------
+    # Writes
+    # -------------------------------
+    async def upsert_patients(self, patients: Iterable[dict]) -> int:
+        now = utc_now()
+        rows = [
+            (
+                p["id"],
+                p.get("projectId"),
+                p.get("subjectId"),
+                email_digest((p.get("contactInformation") or {}).get("email")),
+                p.get("createdAt") or now,
+                # Records without a Tasso timestamp (our own creates) never block a synced version
+                p.get("updatedAt") or "",
+            )
+            for p in patients
+            if p.get("id")
+        ]
+        await self._call(self._upsert, "patients", rows)
+        return len(rows)
+
+    async def upsert_orders(self, orders: Iterable[dict]) -> int:
+        now = utc_now()
+        rows = [
+            (
+                o["id"],
+                o.get("patientId"),
+                o.get("projectId"),
+                o.get("status"),
+                o.get("createdAt") or now,
+                o.get("updatedAt") or "",
+                json.dumps(o),
+            )
+            for o in orders
+            if o.get("id")
+        ]
+        await self._call(self._upsert, "orders", rows)
+        return len(rows)
+
+    def _upsert(self, resource: str, rows: list) -> None:
+        if not rows:
+            return
+        if resource == "patients":
+            sql = (
+                "INSERT INTO mirror_patients (id, project_id, subject_id, email_digest, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET"
+                " project_id = COALESCE(excluded.project_id, project_id),"
+                " subject_id = COALESCE(excluded.subject_id, subject_id),"
+                " email_digest = COALESCE(excluded.email_digest, email_digest),"
+                " updated_at = excluded.updated_at"
+                " WHERE excluded.updated_at >= mirror_patients.updated_at"
+            )
+        else:
+            sql = (
+                "INSERT INTO mirror_orders (id, patient_id, project_id, status, created_at, updated_at, data)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET"
+                " patient_id = excluded.patient_id, project_id = excluded.project_id,"
+                " status = excluded.status, updated_at = excluded.updated_at, data = excluded.data"
+                " WHERE excluded.updated_at >= mirror_orders.updated_at"
+            )
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.executemany(sql, rows)
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def apply_events(self, events: List[dict]) -> List[str]:
+        """
+        Apply parsed Tasso events (see `tasso_events.parse_events`) in one
+        transaction. Returns "applied", "duplicate" or "stale" per event.
+        Blocking; call from a thread.
+        """
+        now = time.time()
+        outcomes = []
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for event in events:
+                    outcomes.append(self._apply_event(event, now))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._event_batches += 1
+            if self._event_batches % 1000 == 0:
+                self._conn.execute(
+                    "DELETE FROM mirror_events WHERE received_at <= ?", (now - self.event_retention,)
+                )
+        return outcomes
+
+    def _apply_event(self, event: dict, now: float) -> str:
+        cur = self._conn.execute(
+            "INSERT OR IGNORE INTO mirror_events (id, type, order_id, occurred_at, received_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (event["id"], event["type"], event["order_id"], event["occurred_at"], now),
+        )
+        if cur.rowcount == 0:
+            return "duplicate"
+
+        patch = {k: v for k, v in event["data"].items() if k != "orderId"}
+        if event["status"]:
+            patch["status"] = event["status"]
+        patch["updatedAt"] = event["occurred_at"]
+        # Only an event newer than what we have moves the order forward
+        cur = self._conn.execute(
+            "UPDATE mirror_orders SET status = COALESCE(?, status), updated_at = ?,"
+            " data = json_patch(data, ?) WHERE id = ? AND updated_at < ?",
+            (event["status"], event["occurred_at"], json.dumps(patch), event["order_id"], event["occurred_at"]),
+        )
+        if cur.rowcount:
+            return "applied"
+        # An order we haven't synced yet: start it from the event
+        cur = self._conn.execute(
+            "INSERT OR IGNORE INTO mirror_orders (id, patient_id, project_id, status, created_at, updated_at, data)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                event["order_id"],
+                patch.get("patientId"),
+                patch.get("projectId"),
+                event["status"],
+                event["occurred_at"],
+                event["occurred_at"],
+                json.dumps({"id": event["order_id"], **patch}),
+            ),
+        )
+        return "applied" if cur.rowcount else "stale"
+
+    async def watermark(self, resource: str) -> Optional[str]:
+        return await self._call(self._watermark, resource)
+
+    def _watermark(self, resource: str) -> Optional[str]:
+        row = self._conn.execute(
+            "SELECT updated_at FROM mirror_watermarks WHERE resource = ?", (resource,)
+        ).fetchone()
+        return row[0] if row else None
+
+    async def set_watermark(self, resource: str, updated_at: str) -> None:
+        await self._call(
+            self._conn.execute,
+            "INSERT OR REPLACE INTO mirror_watermarks (resource, updated_at) VALUES (?, ?)",
+            (resource, updated_at),
+        )
+
+    # -------------------------------
+    # Reads
+    # -------------------------------
+    async def orders(
+        self,
+        *,
+        patient_id: Optional[str] = None,
+        subject_id: Optional[str] = None,
+        email: Optional[str] = None,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """
+        Orders newest first, with the cursor for the next page (None on the
+        last one). Raises ValueError on a bad cursor.
+        """
+        where, params = [], []
+        if patient_id:
+            where.append("o.patient_id = ?")
+            params.append(patient_id)
+        if subject_id or email:
+            patient_where, patient_params = [], []
+            if subject_id:
+                patient_where.append("subject_id = ?")
+                patient_params.append(subject_id)
+            if email:
+                patient_where.append("email_digest = ?")
+                patient_params.append(email_digest(email))
+            where.append(f"o.patient_id IN (SELECT id FROM mirror_patients WHERE {' AND '.join(patient_where)})")
+            params.extend(patient_params)
+        if created_after:
+            where.append("o.created_at >= ?")
+            params.append(created_after)
+        if created_before:
+            where.append("o.created_at < ?")
+            params.append(created_before)
+        if cursor:
+            where.append("(o.created_at, o.id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+
+        sql = (
+            "SELECT o.data, o.created_at, o.id, p.subject_id FROM mirror_orders o"
+            " LEFT JOIN mirror_patients p ON p.id = o.patient_id"
+            + (" WHERE " + " AND ".join(where) if where else "")
+            + " ORDER BY o.created_at DESC, o.id DESC LIMIT ?"
+        )
+        rows = await self._call(self._select, sql, (*params, limit + 1))
+        orders = [{**json.loads(data), "subjectId": subject} for data, _, _, subject in rows[:limit]]
+        next_cursor = encode_cursor(rows[limit - 1][1], rows[limit - 1][2]) if len(rows) > limit else None
+        return orders, next_cursor
+
+    async def order(self, order_id: str) -> Optional[dict]:
+        rows = await self._call(
+            self._select, "SELECT data FROM mirror_orders WHERE id = ?", (order_id,)
+        )
+        return json.loads(rows[0][0]) if rows else None
+
+    def _select(self, sql: str, params: tuple) -> list:
+        return self._conn.execute(sql, params).fetchall()
+
+    async def counts(self) -> dict:
+        return await self._call(self._counts)
+
+    def _counts(self) -> dict:
+        counts = {
+            resource: self._conn.execute(f"SELECT COUNT(*) FROM mirror_{resource}").fetchone()[0]
+            for resource in RESOURCES
+        }
+        counts["watermarks"] = dict(
+            self._conn.execute("SELECT resource, updated_at FROM mirror_watermarks").fetchall()
+        )
+        return counts
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# fetch_page(resource, updated_since, page) -> one page of Tasso results (pages start at 1)
+FetchPage = Callable[[str, Optional[str], int], Awaitable[List[dict]]]
+
+
+class OrderSync:
+    """
+    Keeps an `OrderMirror` current by fetching what changed in Tasso since
+    the stored watermark. The watermark is inclusive, so re-fetching a
+    boundary record is harmless. Tasso does not promise an order within the
+    listing, so the newest `updatedAt` seen is only stored once every page
+    of a pass is in: an interrupted pass starts over from the old watermark
+    rather than skipping records on the pages it never reached.
+
+    With `lock_path`, only one process at a time syncs; the others skip the
+    pass instead of fetching the same pages.
+    """
+
+    def __init__(
+        self,
+        mirror: OrderMirror,
+        fetch_page: FetchPage,
+        page_size: int = 100,
+        interval: float = 60,
+        lock_path: Optional[str] = None,
+    ):
+        self.mirror = mirror
+        self.fetch_page = fetch_page
+        self.page_size = page_size
+        self.interval = interval
+        self._lock = FileLock(lock_path) if lock_path else None
+        self._task: Optional[asyncio.Task] = None
+        self.last_run: Optional[float] = None
+
+    async def sync_once(self) -> Optional[dict]:
+        """One incremental pass. Returns records fetched per resource, or None if another process is syncing."""
+        if self._lock is not None and not self._lock.acquire_nowait():
+            return None
+        try:
+            synced = {resource: await self._sync(resource) for resource in RESOURCES}
+        finally:
+            if self._lock is not None:
+                self._lock.release()
+        self.last_run = time.time()
+        return synced
+
+    async def _sync(self, resource: str) -> int:
+        since = await self.mirror.watermark(resource)
+        upsert = self.mirror.upsert_patients if resource == "patients" else self.mirror.upsert_orders
+        newest = since
+        fetched = 0
+        page = 1
+        while True:
+            records = await self.fetch_page(resource, since, page)
+            await upsert(records)
+            fetched += len(records)
+            ORDER_MIRROR_SYNCED.labels(resource).inc(len(records))
+            stamps = [r["updatedAt"] for r in records if r.get("updatedAt")]
+            if stamps and (newest is None or max(stamps) > newest):
+                newest = max(stamps)
+            if len(records) < self.page_size:
+                break
+            page += 1
+        if newest is not None and newest != since:
+            await self.mirror.set_watermark(resource, newest)
+        return fetched
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                synced = await self.sync_once()
+                if synced and any(synced.values()):
+                    log.info("order mirror synced", **synced)
+            except Exception as e:
+                ORDER_MIRROR_SYNC_ERRORS.inc()
+                log.warning("order mirror sync failed", error=str(e))
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -0,0 +1,230 @@
+"""
+Local index of patients that already exist in Tasso.
+
+A patient payload is looked up by two identity keys: the submission's
+subjectId (a retry of the same submission) and email + date of birth
+within the project (the same person coming back through another form or a
+kit reorder). Keys are stored as SHA-256 digests, so the index holds no
+PHI. A hit only counts when the stored fingerprint of the patient's
+name, contact details and address matches the new payload; otherwise the
+patient is created again as before, so a changed address is never
+silently dropped in favour of the one Tasso has on file.
+
+Like `idempotency`, a bounded TTL-evicted in-memory tier sits in front of a
+SQLite table. The index is filled from our own creates and can be warmed
+by paging through Tasso's patient list.
+"""
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Iterable, List, Optional, Tuple
+
+from db import connect
+
+# Patient fields whose change means the stored Tasso patient is out of date
+# (plus email and phone number)
+FINGERPRINT_FIELDS = ("firstName", "lastName", "dateOfBirth")
+FINGERPRINT_ADDRESS = ("address1", "address2", "city", "district1", "postalCode", "country")
+
+
+def _digest(value: str) -> str:
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+def _normalize_email(email: Optional[str]) -> str:
+    return (email or "").strip().lower()
+
+
+def identity_keys(patient: dict) -> List[str]:
+    """Keys a patient can be found under, most specific first."""
+    project = patient.get("projectId") or ""
+    keys = []
+    if patient.get("subjectId"):
+        keys.append(_digest(f"subject|{project}|{patient['subjectId']}"))
+    email = _normalize_email((patient.get("contactInformation") or {}).get("email"))
+    dob = patient.get("dateOfBirth") or ""
+    if email and dob:
+        keys.append(_digest(f"person|{project}|{email}|{dob}"))
+    return keys
+
+
+def fingerprint(patient: dict) -> str:
+    contact = patient.get("contactInformation") or {}
+    address = patient.get("shippingAddress") or {}
+    fields = [patient.get(f) for f in FINGERPRINT_FIELDS]
+    fields += [_normalize_email(contact.get("email")), contact.get("phoneNumber")]
+    fields += [address.get(f) for f in FINGERPRINT_ADDRESS]
+    return _digest(json.dumps(fields))
+
+
+class PatientRegistry:
+
+    def __init__(self, path: str, ttl: float = 30 * 86400, max_entries: int = 50000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._conn = connect(path)
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, Tuple[str, str, float]]" = OrderedDict()
+        self._writes = 0
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS patient_registry (
+                key         TEXT PRIMARY KEY,
+                patient_id  TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                updated_at  REAL NOT NULL
+            )
+            """
+        )
+
+    def _run(self, fn, *args):
+        with self._lock:
+            return fn(*args)
+
+    async def _call(self, fn, *args):
+        return await asyncio.to_thread(self._run, fn, *args)
+
+    async def lookup(self, patient: dict) -> Optional[str]:
+        """Tasso patient ID for this payload, if the same patient is known and unchanged."""
+        keys = identity_keys(patient)
+        if not keys:
+            return None
+        current = fingerprint(patient)
+
+        missing = []
+        for key in keys:
+            entry = self._get_cached(key)
+            if entry is None:
+                missing.append(key)
+            elif entry[1] == current:
+                return entry[0]
+        if not missing:
+            return None
+
+        for key, entry in zip(missing, await self._call(self._load, missing)):
+            if entry is None:
+                continue
+            self._remember(key, *entry)
+            if entry[1] == current:
+                return entry[0]
+        return None
+
+    async def remember(self, patient: dict, patient_id: str) -> None:
+        entries = [(key, patient_id, fingerprint(patient), time.time()) for key in identity_keys(patient)]
+        await self._call(self._save, entries)
+        for entry in entries:
+            self._remember(*entry)
+
+    async def forget(self, patient: dict) -> None:
+        """Drop a patient Tasso no longer knows (e.g. an order for it came back 404)."""
+        keys = identity_keys(patient)
+        for key in keys:
+            self._cache.pop(key, None)
+        await self._call(self._delete, keys)
+
+    async def warm(self, patients: Iterable[dict]) -> int:
+        """Load patients as listed by Tasso (each with an `id`). Returns how many were usable."""
+        now = time.time()
+        entries = []
+        for patient in patients:
+            if not patient.get("id"):
+                continue
+            fp = fingerprint(patient)
+            entries.extend((key, patient["id"], fp, now) for key in identity_keys(patient))
+        if entries:
+            await self._call(self._save, entries, False)
+        return len({e[1] for e in entries})
+
+    async def count(self) -> int:
+        return await self._call(self._count)
+
+    # -------------------------------
+    # In-memory tier
+    # -------------------------------
+    def _get_cached(self, key: str) -> Optional[Tuple[str, str, float]]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry[2] > self.ttl:
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return entry
+
+    def _remember(self, key: str, patient_id: str, fp: str, updated_at: float) -> None:
+        self._cache[key] = (patient_id, fp, updated_at)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    # -------------------------------
+    # Persistent tier
+    # -------------------------------
+    def _load(self, keys: List[str]) -> List[Optional[Tuple[str, str, float]]]:
+        placeholders = ",".join("?" * len(keys))
+        rows = self._conn.execute(
+            f"SELECT key, patient_id, fingerprint, updated_at FROM patient_registry "
+            f"WHERE key IN ({placeholders}) AND updated_at > ?",
+            (*keys, time.time() - self.ttl),
+        ).fetchall()
+        found = {row[0]: row[1:] for row in rows}
+        return [found.get(key) for key in keys]
+
+    def _save(self, entries: list, replace: bool = True) -> None:
+        # Our own creates win; a warm-up never overwrites what we recorded
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.executemany(
+                f"{verb} INTO patient_registry (key, patient_id, fingerprint, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                entries,
+            )
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            self._conn.execute(
+                "DELETE FROM patient_registry WHERE updated_at <= ?",
+                (time.time() - self.ttl,),
+            )
+
+    def _delete(self, keys: List[str]) -> None:
+        self._conn.executemany("DELETE FROM patient_registry WHERE key = ?", [(k,) for k in keys])
+
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(DISTINCT patient_id) FROM patient_registry").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+async def warm_from_tasso(
+    registry: PatientRegistry,
+    fetch_page: Callable[[str, int], Awaitable[List[dict]]],
+    project_ids: Iterable[str],
+    page_size: int,
+) -> int:
+    """
+    Page through Tasso's patient list for each project and load it.
+    `fetch_page(project_id, page)` returns one page (pages start at 1); a
+    short page ends the project.
+    """
+    loaded = 0
+    for project_id in project_ids:
+        page = 1
+        while True:
+            patients = await fetch_page(project_id, page)
+            loaded += await registry.warm(
+                {**p, "projectId": p.get("projectId") or project_id} for p in patients
+            )
+            if len(patients) < page_size:
+                break
+            page += 1
+    return loaded
@@ -0,0 +1,144 @@
+"""
+In-memory cache of Tasso project metadata (name, order configurations).
+
+Projects are fetched once at startup and then revalidated in the background
+with `If-None-Match`, so an unchanged project costs Tasso a 304 and nothing
+else. Lookups (`get`, `configuration_ids`) never touch the network: they
+return whatever is cached, even if it is stale, and an entry older than the
+TTL schedules a revalidation (stale-while-revalidate). A failed refresh
+keeps serving the previous version.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from logs import get_logger
+from metrics import PROJECT_CACHE_REFRESHES
+
+log = get_logger(__name__)
+
+# fetch(project_id, etag) -> (status, etag, project); project is None on 304
+Fetch = Callable[[str, Optional[str]], Awaitable[Tuple[int, Optional[str], Optional[dict]]]]
+
+
+@dataclass
+class ProjectMetadata:
+    project_id: str
+    name: Optional[str]
+    # None when Tasso lists no configurations: nothing to check against
+    configuration_ids: Optional[frozenset]
+    etag: Optional[str]
+    fetched_at: float
+    raw: dict = field(repr=False)
+
+    @classmethod
+    def from_tasso(cls, project_id: str, project: dict, etag: Optional[str]) -> "ProjectMetadata":
+        configurations = project.get("orderConfigurations") or []
+        return cls(
+            project_id=project_id,
+            name=project.get("name"),
+            configuration_ids=frozenset(c["id"] for c in configurations if c.get("id")) or None,
+            etag=etag,
+            fetched_at=time.time(),
+            raw=project,
+        )
+
+
+class ProjectCache:
+
+    def __init__(self, fetch: Fetch, project_ids: Iterable[str], ttl: float = 300):
+        self.fetch = fetch
+        self.project_ids = [p for p in dict.fromkeys(project_ids) if p]
+        self.ttl = ttl
+        self._entries: Dict[str, ProjectMetadata] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self._loop_task: Optional[asyncio.Task] = None
+
+    # -------------------------------
+    # Lookups (no I/O)
+    # -------------------------------
+    def get(self, project_id: str) -> Optional[ProjectMetadata]:
+        entry = self._entries.get(project_id)
+        if entry is None or time.time() - entry.fetched_at > self.ttl:
+            self._revalidate(project_id)
+        return entry
+
+    def configuration_ids(self, project_id: str) -> Optional[frozenset]:
+        """
+        Allowed order configuration IDs, or None if the project isn't cached
+        yet or its metadata lists none.
+        """
+        entry = self.get(project_id)
+        return entry.configuration_ids if entry is not None else None
+
+    # -------------------------------
+    # Refresh
+    # -------------------------------
+    async def refresh(self, project_id: str) -> Optional[ProjectMetadata]:
+        current = self._entries.get(project_id)
+        try:
+            status, etag, project = await self.fetch(project_id, current.etag if current else None)
+        except Exception as e:
+            PROJECT_CACHE_REFRESHES.labels("error").inc()
+            log.warning("project metadata refresh failed", project_id=project_id, error=str(e))
+            return current
+
+        if status == 304 and current is not None:
+            PROJECT_CACHE_REFRESHES.labels("not_modified").inc()
+            current.fetched_at = time.time()
+            return current
+
+        PROJECT_CACHE_REFRESHES.labels("updated").inc()
+        entry = ProjectMetadata.from_tasso(project_id, project or {}, etag)
+        self._entries[project_id] = entry
+        return entry
+
+    def _revalidate(self, project_id: str) -> None:
+        if project_id in self._refreshing:
+            return
+        try:
+            task = asyncio.get_running_loop().create_task(self.refresh(project_id))
+        except RuntimeError:
+            return
+        self._refreshing[project_id] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(project_id, None))
+
+    def track(self, project_ids: Iterable[str]) -> None:
+        """Cache these projects too (e.g. after the routing table changed); new ones are fetched now."""
+        for project_id in project_ids:
+            if project_id and project_id not in self.project_ids:
+                self.project_ids.append(project_id)
+                self._revalidate(project_id)
+
+    async def prewarm(self) -> int:
+        """Fetch every configured project. Returns how many are cached."""
+        await asyncio.gather(*(self.refresh(p) for p in self.project_ids))
+        return sum(1 for p in self.project_ids if p in self._entries)
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.ttl)
+            await asyncio.gather(*(self.refresh(p) for p in self.project_ids))
+
+    def start(self) -> None:
+        self._loop_task = asyncio.create_task(self._refresh_loop())
+
+    async def close(self) -> None:
+        tasks = [t for t in (self._loop_task, *self._refreshing.values()) if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop_task = None
+
+    def snapshot(self) -> dict:
+        now = time.time()
+        return {
+            project_id: {
+                "name": entry.name,
+                "configurations": len(entry.configuration_ids or ()),
+                "age": round(now - entry.fetched_at, 1),
+                "etag": entry.etag,
+            }
+            for project_id, entry in self._entries.items()
+        }
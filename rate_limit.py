@@ -0,0 +1,121 @@
+"""
+Client-side token-bucket rate limiting for outbound Tasso traffic.
+
+Every call takes a token from its endpoint bucket (/authTokens, /patients,
+/orders) and then from the global bucket. Callers that find a bucket empty
+wait in FIFO order rather than failing. Calls in the bulk lane (see `lanes`)
+first take a token from the bulk bucket, which refills at `bulk_share` of
+the global rate, so bulk work can never spend the whole budget.
+"""
+import asyncio
+import time
+from typing import Callable, Optional
+
+from lanes import BULK, LIVE
+
+
+class TokenBucket:
+    """
+    `rate` tokens per second, holding at most `burst`. Waiters queue on a
+    lock, which asyncio hands out in arrival order.
+    """
+
+    def __init__(self, name: str, rate: float, burst: Optional[float] = None):
+        self.name = name
+        self.rate = rate
+        self.burst = burst or max(rate, 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.waiting = 0
+        self.acquired = 0
+        self.delayed = 0
+        self.wait_seconds = 0.0
+        self.max_wait = 0.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def tokens(self) -> float:
+        self._refill()
+        return self._tokens
+
+    async def acquire(self) -> float:
+        """Take one token, waiting if necessary. Returns the seconds waited."""
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            async with self._lock:
+                self._refill()
+                if self._tokens < 1:
+                    await asyncio.sleep((1 - self._tokens) / self.rate)
+                    self._refill()
+                self._tokens -= 1
+        finally:
+            self.waiting -= 1
+
+        waited = time.monotonic() - started
+        self.acquired += 1
+        if waited > 0.001:
+            self.delayed += 1
+        self.wait_seconds += waited
+        self.max_wait = max(self.max_wait, waited)
+        return waited
+
+    def snapshot(self) -> dict:
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "tokens": round(self.tokens, 3),
+            "waiting": self.waiting,
+            "acquired": self.acquired,
+            "delayed": self.delayed,
+            "avg_wait": round(self.wait_seconds / self.acquired, 4) if self.acquired else 0.0,
+            "max_wait": round(self.max_wait, 4),
+        }
+
+
+def endpoint_key(path: str) -> str:
+    """'/patients/123' -> '/patients'."""
+    return "/" + path.strip("/").split("/", 1)[0]
+
+
+class RateLimiter:
+    """A global bucket plus optional per-endpoint buckets. A rate of 0 disables a bucket."""
+
+    def __init__(self, global_rate: float, global_burst: Optional[float] = None,
+                 endpoints: Optional[dict] = None, bucket: Callable[..., TokenBucket] = TokenBucket,
+                 bulk_share: float = 1.0):
+        # `bucket(name, rate, burst)` builds each bucket; see shared_state.SharedTokenBucket
+        self.global_bucket = bucket("global", global_rate, global_burst) if global_rate > 0 else None
+        self.buckets = {
+            path: bucket(path, rate, burst)
+            for path, (rate, burst) in (endpoints or {}).items()
+            if rate > 0
+        }
+        self.bulk_bucket = None
+        if global_rate > 0 and bulk_share < 1:
+            bulk_burst = max((global_burst or global_rate) * bulk_share, 1.0)
+            self.bulk_bucket = bucket(BULK, global_rate * bulk_share, bulk_burst)
+
+    async def acquire(self, path: str, lane: str = LIVE) -> float:
+        waited = 0.0
+        if lane == BULK and self.bulk_bucket is not None:
+            waited += await self.bulk_bucket.acquire()
+        bucket = self.buckets.get(endpoint_key(path))
+        if bucket is not None:
+            waited += await bucket.acquire()
+        if self.global_bucket is not None:
+            waited += await self.global_bucket.acquire()
+        return waited
+
+    def snapshot(self) -> dict:
+        buckets = dict(self.buckets)
+        if self.bulk_bucket is not None:
+            buckets[BULK] = self.bulk_bucket
+        if self.global_bucket is not None:
+            buckets["global"] = self.global_bucket
+        return {name: bucket.snapshot() for name, bucket in buckets.items()}
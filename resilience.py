@@ -0,0 +1,220 @@
+"""
+Retry and circuit-breaker policy for Tasso calls.
+
+Errors are classified as retryable or not. Retryable ones are retried with
+capped exponential backoff and full jitter, honoring `Retry-After`. A
+circuit breaker counts consecutive upstream failures and, once open, fails
+calls immediately instead of letting each one wait out the HTTP timeout.
+
+Creates (POST /patients, POST /orders) are not idempotent on Tasso's side,
+so for them only failures where the request provably was not processed
+(connection never established, 429, 503) are retried. Ambiguous failures
+(read timeouts, 500/502/504) are only retried for idempotent calls.
+"""
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import httpx
+
+from logs import get_logger
+
+log = get_logger(__name__)
+
+
+# Statuses where Tasso refused the request without processing it
+REFUSED_STATUSES = {429, 503}
+# Statuses where the request may or may not have been processed
+AMBIGUOUS_STATUSES = {408, 500, 502, 504}
+# Transport errors raised before the request reached Tasso
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class TassoError(Exception):
+    """A failed Tasso call. `status_code` is None for transport errors."""
+
+    def __init__(
+        self,
+        message: str,
+        status_code: Optional[int] = None,
+        body: Optional[str] = None,
+        retryable: bool = False,
+        retry_after: Optional[float] = None,
+    ):
+        super().__init__(message)
+        self.status_code = status_code
+        self.body = body
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class TassoUnavailable(TassoError):
+    """Raised without calling Tasso while the circuit breaker is open."""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def error_from_response(response: httpx.Response, idempotent: bool) -> TassoError:
+    status = response.status_code
+    retryable = status in REFUSED_STATUSES or (idempotent and status in AMBIGUOUS_STATUSES)
+    return TassoError(
+        f"Tasso {response.request.method} {response.request.url.path} failed: "
+        f"{status} - {response.text}",
+        status_code=status,
+        body=response.text,
+        retryable=retryable,
+        retry_after=parse_retry_after(response.headers.get("Retry-After")),
+    )
+
+
+def error_from_exception(exc: httpx.HTTPError, idempotent: bool) -> TassoError:
+    retryable = isinstance(exc, NOT_SENT_ERRORS) or (
+        idempotent and isinstance(exc, httpx.TransportError)
+    )
+    return TassoError(f"Tasso request failed: {exc!r}", retryable=retryable)
+
+
+def counts_as_outage(error: TassoError) -> bool:
+    """Whether an error says something about Tasso's health (vs. our request)."""
+    return error.status_code is None or error.status_code >= 500 or error.status_code == 429
+
+
+# -------------------------------
+# Retry policy
+# -------------------------------
+class RetryPolicy:
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        max_retry_after: float = 30.0,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+    def backoff(self, attempt: int, error: TassoError) -> Optional[float]:
+        """
+        Delay before retrying after `attempt` (1-based) failed with `error`,
+        or None if the call should not be retried.
+        """
+        if not error.retryable or attempt >= self.max_attempts:
+            return None
+        if error.retry_after is not None:
+            # Asked to wait longer than we are willing to hold a request
+            if error.retry_after > self.max_retry_after:
+                return None
+            return error.retry_after
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+# -------------------------------
+# Circuit breaker
+# -------------------------------
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive outage failures and stays
+    open for `reset_timeout` seconds. After that a single probe call is let
+    through (half-open); its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._closed = asyncio.Event()
+        self._closed.set()
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            return HALF_OPEN
+        return self._state
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker lets a probe through."""
+        if self._state != OPEN:
+            return 0.0
+        return max(self.reset_timeout - (time.monotonic() - self._opened_at), 0.0)
+
+    def before_call(self) -> None:
+        """Raise TassoUnavailable unless a call may go through now."""
+        state = self.state
+        if state == CLOSED:
+            return
+        if state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return
+        raise TassoUnavailable(
+            "Tasso circuit breaker is open",
+            retryable=True,
+            retry_after=self.retry_after() or 1.0,
+        )
+
+    def abandon(self) -> None:
+        """The call that was let through was cancelled before it finished."""
+        self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._probe_in_flight = False
+        if self._state != CLOSED:
+            self._state = CLOSED
+            self._closed.set()
+            log.info("Tasso circuit breaker closed")
+
+    def record_failure(self, error: TassoError) -> None:
+        if not counts_as_outage(error):
+            # Tasso answered; the request itself was bad
+            self.record_success()
+            return
+        self._failures += 1
+        reopen = self._probe_in_flight
+        self._probe_in_flight = False
+        if reopen or self._failures >= self.failure_threshold:
+            if self._state == CLOSED:
+                log.warning("Tasso circuit breaker opened", failures=self._failures)
+            self._state = OPEN
+            self._opened_at = time.monotonic()
+            self._closed.clear()
+
+    async def wait_until_closed(self) -> None:
+        """Block while the breaker is open; returns once a probe may be sent."""
+        while self.state == OPEN:
+            try:
+                await asyncio.wait_for(self._closed.wait(), self.retry_after() or 0.1)
+            except asyncio.TimeoutError:
+                pass
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "retry_after": round(self.retry_after(), 3),
+        }
@@ -0,0 +1,304 @@
+"""
+State shared by the worker processes of one deployment.
+
+With WEB_CONCURRENCY > 1 every uvicorn worker is a separate process. The
+Tasso token and the outbound rate-limit buckets live in a SQLite (WAL) file
+in DATA_DIR so that the workers behave like one client: one token mint per
+expiry instead of one per worker, and one set of rate limits instead of N.
+A file lock serializes token minting across processes. (The idempotency
+store, patient registry and intake queue were already SQLite files and
+coordinate through their own tables.)
+"""
+import asyncio
+import os
+import socket
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+
+from config import SHARED_STATE, SHARED_STATE_DB_PATH
+from db import connect
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def owner_id() -> str:
+    """Identifies one store instance: host, process and a nonce."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def owner_is_gone(owner: Optional[str], me: str) -> bool:
+    """
+    Whether the instance that wrote `owner` certainly no longer exists: an
+    earlier instance in this process, or a process on this host that has
+    exited. Owners on other hosts are never presumed gone.
+    """
+    if not owner:
+        return True
+    try:
+        host, pid, nonce = owner.rsplit(":", 2)
+        pid = int(pid)
+    except ValueError:
+        return True
+    my_host, my_pid, _ = me.rsplit(":", 2)
+    if host != my_host:
+        return False
+    if pid == int(my_pid):
+        return owner != me
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except (PermissionError, OSError):
+        return False
+    return False
+
+
+class FileLock:
+    """
+    Exclusive lock on a file, held across processes.
+    `async with lock:` waits for it in a thread, so the event loop keeps running.
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._fd: Optional[int] = None
+
+    def _acquire(self, blocking: bool = True) -> bool:
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                while True:
+                    try:
+                        msvcrt.locking(fd, msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+                        break
+                    except OSError:
+                        if not blocking:
+                            raise
+        except OSError:
+            os.close(fd)
+            if blocking:
+                raise
+            return False
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+        return True
+
+    def acquire_nowait(self) -> bool:
+        """Take the lock if no other process holds it."""
+        return self._acquire(blocking=False)
+
+    def release(self) -> None:
+        fd, self._fd = self._fd, None
+        if fd is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(fd)
+
+    async def __aenter__(self):
+        await asyncio.to_thread(self._acquire)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+        return False
+
+
+@dataclass
+class SharedToken:
+    token: str
+    expires_at: float
+    refresh_at: float
+
+
+class SharedState:
+    """One SQLite file holding the shared token and rate-limit buckets."""
+
+    def __init__(self, path: str, lock_path: Optional[str] = None):
+        self._conn = connect(path)
+        self._lock = threading.Lock()
+        self.token_lock = FileLock(lock_path or path + ".token.lock")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tasso_token (
+                id         INTEGER PRIMARY KEY CHECK (id = 1),
+                token      TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                refresh_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS rate_buckets (
+                name    TEXT PRIMARY KEY,
+                tokens  REAL NOT NULL,
+                updated REAL NOT NULL
+            )
+            """
+        )
+
+    def _run(self, fn, *args):
+        with self._lock:
+            return fn(*args)
+
+    async def _call(self, fn, *args):
+        return await asyncio.to_thread(self._run, fn, *args)
+
+    # -------------------------------
+    # Token
+    # -------------------------------
+    async def load_token(self) -> Optional[SharedToken]:
+        return await self._call(self._load_token)
+
+    def _load_token(self) -> Optional[SharedToken]:
+        row = self._conn.execute(
+            "SELECT token, expires_at, refresh_at FROM tasso_token WHERE id = 1"
+        ).fetchone()
+        return SharedToken(*row) if row else None
+
+    async def save_token(self, token: str, expires_at: float, refresh_at: float) -> None:
+        await self._call(self._save_token, token, expires_at, refresh_at)
+
+    def _save_token(self, token: str, expires_at: float, refresh_at: float) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO tasso_token (id, token, expires_at, refresh_at) VALUES (1, ?, ?, ?)",
+            (token, expires_at, refresh_at),
+        )
+
+    # -------------------------------
+    # Rate-limit buckets
+    # -------------------------------
+    def reserve(self, name: str, rate: float, burst: float) -> float:
+        """
+        Take one token from the named bucket and return how long to wait
+        before using it. The bucket may go negative: each caller reserves
+        the next token in turn, so waiters across processes are served in
+        the order they arrived. Blocking; call from a thread.
+        """
+        with self._lock:
+            now = time.time()
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT tokens, updated FROM rate_buckets WHERE name = ?", (name,)
+                ).fetchone()
+                tokens = burst if row is None else min(burst, row[0] + max(now - row[1], 0) * rate)
+                tokens -= 1
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO rate_buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                    (name, tokens, now),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return -tokens / rate if tokens < 0 else 0.0
+
+    def peek(self, name: str, rate: float, burst: float) -> float:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT tokens, updated FROM rate_buckets WHERE name = ?", (name,)
+            ).fetchone()
+        if row is None:
+            return burst
+        return min(burst, row[0] + max(time.time() - row[1], 0) * rate)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class SharedTokenBucket:
+    """
+    `rate_limit.TokenBucket` backed by `SharedState`, so the rate is shared
+    by every process using the same file. Same interface; the counters in
+    `snapshot()` are this process's own.
+    """
+
+    def __init__(self, state: SharedState, name: str, rate: float, burst: Optional[float] = None):
+        self.state = state
+        self.name = name
+        self.rate = rate
+        self.burst = burst or max(rate, 1.0)
+        self.waiting = 0
+        self.acquired = 0
+        self.delayed = 0
+        self.wait_seconds = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def tokens(self) -> float:
+        return self.state.peek(self.name, self.rate, self.burst)
+
+    async def acquire(self) -> float:
+        """Take one token, waiting if necessary. Returns the seconds waited."""
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            delay = await asyncio.to_thread(self.state.reserve, self.name, self.rate, self.burst)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        finally:
+            self.waiting -= 1
+
+        waited = time.monotonic() - started
+        self.acquired += 1
+        if waited > 0.001:
+            self.delayed += 1
+        self.wait_seconds += waited
+        self.max_wait = max(self.max_wait, waited)
+        return waited
+
+    def snapshot(self) -> dict:
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "tokens": round(self.tokens, 3),
+            "waiting": self.waiting,
+            "acquired": self.acquired,
+            "delayed": self.delayed,
+            "avg_wait": round(self.wait_seconds / self.acquired, 4) if self.acquired else 0.0,
+            "max_wait": round(self.max_wait, 4),
+            "shared": True,
+        }
+
+
+# -------------------------------
+# Process-wide instance
+# -------------------------------
+_state: Optional[SharedState] = None
+
+
+def get_shared_state() -> Optional[SharedState]:
+    """The shared state file, or None when SHARED_STATE is off."""
+    global _state
+    if _state is None and SHARED_STATE:
+        _state = SharedState(SHARED_STATE_DB_PATH)
+    return _state
+
+
+def close_shared_state() -> None:
+    global _state
+    if _state is not None:
+        _state.close()
+        _state = None
@@ -0,0 +1,266 @@
+"""
+Async HTTP client for the Tasso API.
+
+One `httpx.AsyncClient` is shared by the whole process so that connections
+(and their TLS sessions) are kept alive and reused between webhook calls.
+`call()` adds the retry policy and circuit breaker from `resilience`,
+takes a token from the outbound rate limiter before every attempt and,
+for endpoints with one, a slot from the adaptive concurrency limiter
+(`concurrency_limit`), which learns from each attempt's latency and outcome.
+Both favor live calls over bulk ones (see `lanes`).
+"""
+import asyncio
+import time
+from functools import partial
+from typing import Dict, Optional
+
+import httpx
+
+from config import Settings, get_settings
+from concurrency_limit import AdaptiveLimiter
+from fast_json import dumps
+from lanes import BULK, LIVE, current_lane
+from logs import get_logger
+from metrics import (
+    TASSO_CONCURRENCY_WAIT_SECONDS,
+    TASSO_IN_FLIGHT,
+    TASSO_LANE_WAITING,
+    TASSO_LANE_WAIT_SECONDS,
+    TASSO_REQUESTS,
+    TASSO_REQUEST_SECONDS,
+    TASSO_RETRIES,
+    TASSO_RATE_LIMIT_WAIT_SECONDS,
+)
+from rate_limit import RateLimiter, TokenBucket, endpoint_key
+from shared_state import SharedTokenBucket, get_shared_state
+from resilience import (
+    CircuitBreaker,
+    RetryPolicy,
+    counts_as_outage,
+    error_from_exception,
+    error_from_response,
+)
+from tracing import span
+
+log = get_logger(__name__)
+
+
+class TassoClient:
+    """Thin wrapper around a pooled `httpx.AsyncClient` bound to the Tasso base URL."""
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        *,
+        settings: Optional[Settings] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        retry: Optional[RetryPolicy] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        limiter: Optional[RateLimiter] = None,
+        concurrency: Optional[Dict[str, AdaptiveLimiter]] = None,
+    ):
+        settings = settings or get_settings()
+        self.retry = retry or RetryPolicy(
+            max_attempts=settings.retry_max_attempts,
+            base_delay=settings.retry_base_delay,
+            max_delay=settings.retry_max_delay,
+            max_retry_after=settings.retry_after_max,
+        )
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=settings.breaker_failure_threshold,
+            reset_timeout=settings.breaker_reset_timeout,
+        )
+        self.limiter = limiter or default_rate_limiter(settings)
+        # Endpoint ('/patients') -> adaptive concurrency limiter
+        self.concurrency = default_concurrency_limits(settings) if concurrency is None else concurrency
+        self._http = httpx.AsyncClient(
+            base_url=base_url or settings.tasso_base_url,
+            limits=httpx.Limits(
+                max_connections=settings.http_max_connections,
+                max_keepalive_connections=settings.http_max_keepalive,
+                keepalive_expiry=settings.http_keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(settings.http_timeout, connect=settings.http_connect_timeout),
+            headers={"Content-Type": "application/json"},
+            transport=transport,
+        )
+
+    @property
+    def is_closed(self) -> bool:
+        return self._http.is_closed
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        *,
+        token: Optional[str] = None,
+        json: Optional[dict] = None,
+        params: Optional[dict] = None,
+        headers: Optional[dict] = None,
+    ) -> httpx.Response:
+        request_headers = dict(headers or {})
+        if token:
+            request_headers["Authorization"] = f"Bearer {token}"
+        # Encoded here (orjson when available) rather than by httpx's stdlib json
+        content = dumps(json) if json is not None else None
+        return await self._http.request(
+            method, path, content=content, params=params, headers=request_headers
+        )
+
+    async def call(
+        self,
+        method: str,
+        path: str,
+        *,
+        idempotent: Optional[bool] = None,
+        accept: tuple = (),
+        **kwargs,
+    ) -> httpx.Response:
+        """
+        Send a request through the circuit breaker, retrying retryable
+        failures. Returns the response on 2xx (or a status in `accept`, e.g.
+        304 for a conditional GET), raises TassoError otherwise.
+
+        `idempotent` defaults to True for GET; see `resilience` for why it
+        matters.
+        """
+        if idempotent is None:
+            idempotent = method.upper() == "GET"
+        endpoint = endpoint_key(path)
+        lane = current_lane()
+        concurrency = self.concurrency.get(endpoint)
+
+        attempt = 0
+        while True:
+            attempt += 1
+            self.breaker.before_call()
+            TASSO_LANE_WAITING.labels(lane).inc()
+            try:
+                waited = await self.limiter.acquire(path, lane)
+                TASSO_RATE_LIMIT_WAIT_SECONDS.labels(endpoint).observe(waited)
+                if concurrency is not None:
+                    slot_wait = await concurrency.acquire(lane)
+                    TASSO_CONCURRENCY_WAIT_SECONDS.labels(endpoint).observe(slot_wait)
+                    waited += slot_wait
+            except BaseException:
+                self.breaker.abandon()
+                raise
+            finally:
+                TASSO_LANE_WAITING.labels(lane).dec()
+            TASSO_LANE_WAIT_SECONDS.labels(lane).observe(waited)
+            started = time.monotonic()
+            try:
+                response = await self._timed_request(endpoint, method, path, **kwargs)
+            except httpx.HTTPError as e:
+                TASSO_REQUESTS.labels(endpoint, type(e).__name__).inc()
+                error = error_from_exception(e, idempotent)
+            except BaseException:
+                # Cancelled, or a non-HTTP error (e.g. an unserialisable body):
+                # no verdict on Tasso, but the probe and the slot are given back
+                self.breaker.abandon()
+                if concurrency is not None:
+                    concurrency.release(lane=lane)
+                raise
+            else:
+                TASSO_REQUESTS.labels(endpoint, response.status_code).inc()
+                if response.is_success or response.status_code in accept:
+                    if concurrency is not None:
+                        concurrency.release(started, lane=lane)
+                    self.breaker.record_success()
+                    return response
+                error = error_from_response(response, idempotent)
+
+            if concurrency is not None:
+                concurrency.release(started, dropped=counts_as_outage(error), lane=lane)
+            self.breaker.record_failure(error)
+            delay = self.retry.backoff(attempt, error)
+            if delay is None:
+                raise error
+            TASSO_RETRIES.labels(endpoint).inc()
+            log.warning(
+                "retrying Tasso call",
+                method=method,
+                path=path,
+                attempt=attempt,
+                delay=round(delay, 3),
+                status_code=error.status_code,
+                error=str(error),
+            )
+            await asyncio.sleep(delay)
+
+    async def _timed_request(self, endpoint: str, method: str, path: str, **kwargs) -> httpx.Response:
+        TASSO_IN_FLIGHT.inc()
+        try:
+            with span(f"tasso {method} {endpoint}", TASSO_REQUEST_SECONDS.labels(endpoint)) as s:
+                response = await self.request(method, path, **kwargs)
+                s.set("status", response.status_code)
+                return response
+        finally:
+            TASSO_IN_FLIGHT.dec()
+
+    async def get(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", path, **kwargs)
+
+    async def close(self) -> None:
+        await self._http.aclose()
+
+
+def default_rate_limiter(settings: Settings) -> RateLimiter:
+    # With several worker processes the limits are for all of them together
+    state = get_shared_state()
+    return RateLimiter(
+        settings.rate_limit,
+        settings.rate_burst,
+        endpoints={endpoint: (rate, burst) for endpoint, rate, burst in settings.endpoint_rate_limits},
+        bucket=partial(SharedTokenBucket, state) if state is not None else TokenBucket,
+        bulk_share=settings.bulk_rate_share,
+    )
+
+
+def default_concurrency_limits(settings: Settings) -> Dict[str, AdaptiveLimiter]:
+    if not settings.concurrency_adaptive:
+        return {}
+    return {
+        endpoint: AdaptiveLimiter(
+            endpoint,
+            initial=settings.concurrency_initial,
+            min_limit=settings.concurrency_min,
+            max_limit=settings.concurrency_max,
+            tolerance=settings.concurrency_latency_tolerance,
+            max_wait=settings.concurrency_max_wait or None,
+            bulk_share=settings.bulk_concurrency_share,
+            weights={LIVE: settings.lane_weight_live, BULK: settings.lane_weight_bulk},
+        )
+        for endpoint in ("/patients", "/orders")
+    }
+
+
+# -------------------------------
+# Process-wide client
+# -------------------------------
+_client: Optional[TassoClient] = None
+
+
+def get_client() -> TassoClient:
+    """Return the shared client, creating it on first use from the loaded settings."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = TassoClient(settings=get_settings())
+    return _client
+
+
+def set_client(client: TassoClient) -> None:
+    """Install a preconfigured client (e.g. one with a test transport)."""
+    global _client
+    _client = client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
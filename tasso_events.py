@@ -0,0 +1,160 @@
+"""
+Tasso's outbound event notifications (order shipped, specimen received,
+results ready), applied to the order mirror.
+
+Each delivery is checked against an HMAC-SHA256 signature of the raw body.
+Verified events go to an `EventBatcher`, which collects everything that
+arrives within a short window and applies it in one transaction (group
+commit): the webhook answers as soon as its batch is on disk, and a burst
+of events costs one disk sync per batch rather than one per event.
+
+Events are applied idempotently and in order of occurrence: a duplicate
+event ID is ignored, and an event older than what the mirror already has
+for the order is recorded but does not change it.
+"""
+import asyncio
+import hashlib
+import hmac
+from typing import Callable, List, Optional, Tuple
+
+from logs import get_logger
+from metrics import TASSO_EVENT_BATCH_SIZE
+
+log = get_logger(__name__)
+
+SIGNATURE_HEADER = "X-Tasso-Signature"
+
+# Order status recorded for each event type (an explicit `status` in the event wins)
+EVENT_STATUSES = {
+    "order.created": "created",
+    "order.shipped": "shipped",
+    "order.delivered": "delivered",
+    "order.cancelled": "cancelled",
+    "specimen.received": "specimen_received",
+    "results.ready": "results_ready",
+}
+
+
+def sign(secret: str, body: bytes) -> str:
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(secret: str, body: bytes, signature: Optional[str]) -> bool:
+    if not signature:
+        return False
+    if signature.startswith("sha256="):
+        signature = signature[len("sha256="):]
+    return hmac.compare_digest(sign(secret, body), signature.strip().lower())
+
+
+def parse_events(payload) -> List[dict]:
+    """
+    Accepts one event or {"events": [...]}. Raises ValueError unless every
+    event has an id, and a type, an occurredAt timestamp and an orderId
+    given as strings (`data`, when present, must be an object).
+    """
+    events = payload.get("events") if isinstance(payload, dict) and "events" in payload else [payload]
+    if not isinstance(events, list):
+        raise ValueError("events must be a list")
+    parsed = []
+    for event in events:
+        if not isinstance(event, dict):
+            raise ValueError("Each event must be an object")
+        data = event.get("data") or {}
+        if not isinstance(data, dict):
+            raise ValueError("Event data must be an object")
+        order_id = data.get("orderId") or event.get("orderId")
+        fields = (("type", event.get("type")), ("occurredAt", event.get("occurredAt")), ("orderId", order_id))
+        missing = [f for f, v in (("id", event.get("id")),) + fields if not v]
+        if missing:
+            raise ValueError(f"Event missing {', '.join(missing)}")
+        not_strings = [f for f, v in fields if not isinstance(v, str)]
+        if not_strings:
+            raise ValueError(f"Event {', '.join(not_strings)} must be a string")
+        parsed.append({
+            "id": str(event["id"]),
+            "type": event["type"],
+            "occurred_at": event["occurredAt"],
+            "order_id": order_id,
+            "status": data.get("status") or EVENT_STATUSES.get(event["type"]),
+            "data": data,
+        })
+    return parsed
+
+
+class EventBatcher:
+    """
+    Group commit for incoming events.
+
+    `submit()` queues events and waits until the batch containing them is
+    applied. The first event of a batch opens a `window`-second window;
+    everything queued until it closes (or until `max_batch` events) is
+    handed to `apply(events)` in one call, run in a thread. `apply` returns
+    per-event outcomes, which `submit()` returns to each caller.
+    """
+
+    def __init__(self, apply: Callable[[List[dict]], List[str]], window: float = 0.02,
+                 max_batch: int = 500):
+        self.apply = apply
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: List[Tuple[List[dict], asyncio.Future]] = []
+        self._size = 0
+        self._wakeup = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.batches = 0
+
+    async def submit(self, events: List[dict]) -> List[str]:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((events, future))
+        self._size += len(events)
+        self._wakeup.set()
+        if self._size >= self.max_batch:
+            self._full.set()
+        return await asyncio.shield(future)
+
+    async def _loop(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            try:
+                await asyncio.wait_for(self._full.wait(), self.window)
+            except asyncio.TimeoutError:
+                pass
+            # Shielded: a batch being applied still completes if we are closed meanwhile
+            await asyncio.shield(self._flush())
+
+    async def _flush(self) -> None:
+        batch, self._pending, self._size = self._pending, [], 0
+        self._wakeup.clear()
+        self._full.clear()
+        if not batch:
+            return
+        events = [event for events, _ in batch for event in events]
+        try:
+            outcomes = await asyncio.to_thread(self.apply, events)
+        except Exception as e:
+            log.error("tasso event batch failed", events=len(events), error=str(e))
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+                    future.exception()
+            return
+        self.batches += 1
+        TASSO_EVENT_BATCH_SIZE.observe(len(events))
+        start = 0
+        for submitted, future in batch:
+            if not future.done():
+                future.set_result(outcomes[start:start + len(submitted)])
+            start += len(submitted)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        # Whatever is still queued is applied, not dropped
+        await self._flush()
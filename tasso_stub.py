@@ -0,0 +1,258 @@
+"""
+Local fake of the Tasso API for offline load tests and integration tests.
+
+Implements /authTokens, /patients and /orders (create, and a paged list
+filtered by `updatedSince`) and /projects/{id} with configurable latency,
+error rate and 429 injection, and counts every call. Patients and orders
+are kept in memory; orders for unknown patients get a 404. Projects carry
+an ETag and answer If-None-Match with 304.
+
+    python tasso_stub.py --port 9100 --latency lognormal:40:0.5 --error-rate 0.01 --throttle-rate 0.02
+
+Latency specs (milliseconds):
+    fixed:MS                 always MS
+    uniform:MIN:MAX          uniformly distributed
+    lognormal:MEDIAN:SIGMA   long-tailed, like real APIs
+    exp:MEAN                 exponential
+
+Control endpoints: GET /_stub/stats, POST /_stub/reset, POST /_stub/config
+(same fields as StubConfig, e.g. {"error_rate": 0.5}), POST /_stub/orders/{id}
+(change an order, e.g. {"status": "shipped"}).
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import random
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+from typing import Callable
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """Return a function producing one latency sample in seconds."""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(":")] if args else []
+    if kind == "fixed":
+        return lambda: values[0] / 1000
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1]) / 1000
+    if kind == "lognormal":
+        mu = math.log(values[0])
+        return lambda: random.lognormvariate(mu, values[1]) / 1000
+    if kind == "exp":
+        return lambda: random.expovariate(1 / values[0]) / 1000
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+@dataclass
+class StubConfig:
+    latency: str = "fixed:0"
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    retry_after: int = 1
+    token_ttl: int = 3600
+
+
+def make_token(ttl: int) -> str:
+    def b64(obj: dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(obj).encode()).decode().rstrip("=")
+    return f"{b64({'alg': 'none'})}.{b64({'exp': int(time.time()) + ttl})}.stub"
+
+
+def timestamp() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def updated_page(records: list, updated_since: str, page: int, limit: int) -> list:
+    """Records updated at or after `updated_since`, oldest change first."""
+    matching = sorted(
+        (r for r in records if not updated_since or r.get("updatedAt", "") >= updated_since),
+        key=lambda r: (r.get("updatedAt", ""), r["id"]),
+    )
+    return matching[(page - 1) * limit: page * limit]
+
+
+def create_stub_app(config: StubConfig = None) -> FastAPI:
+    app = FastAPI(title="Tasso stub")
+    state = {"config": config or StubConfig()}
+    state["sample"] = parse_latency(state["config"].latency)
+    calls: Counter = Counter()
+    patients: dict = {}
+    orders: dict = {}
+    projects: dict = {}
+    app.state.calls = calls
+    app.state.patients = patients
+    app.state.orders = orders
+    app.state.projects = projects
+    app.state.stub = state
+
+    @app.middleware("http")
+    async def inject(request: Request, call_next):
+        path = request.url.path
+        if path.startswith("/_stub"):
+            return await call_next(request)
+
+        cfg = state["config"]
+        endpoint = f"{request.method} /" + path.strip("/").split("/", 1)[0]
+        await asyncio.sleep(state["sample"]())
+
+        roll = random.random()
+        if roll < cfg.throttle_rate:
+            calls[f"{endpoint} 429"] += 1
+            return JSONResponse(
+                {"message": "Too Many Requests"},
+                status_code=429,
+                headers={"Retry-After": str(cfg.retry_after)},
+            )
+        if roll < cfg.throttle_rate + cfg.error_rate:
+            calls[f"{endpoint} 503"] += 1
+            return JSONResponse({"message": "Service Unavailable"}, status_code=503)
+
+        response = await call_next(request)
+        calls[f"{endpoint} {response.status_code}"] += 1
+        return response
+
+    def unauthorized(request: Request):
+        if not request.headers.get("authorization", "").startswith("Bearer "):
+            return JSONResponse({"message": "Unauthorized"}, status_code=401)
+        return None
+
+    @app.post("/authTokens")
+    async def auth_tokens(request: Request):
+        body = await request.json()
+        if not body.get("username") or not body.get("secret"):
+            return JSONResponse({"message": "Invalid credentials"}, status_code=400)
+        return {"results": {"idToken": make_token(state["config"].token_ttl)}}
+
+    @app.post("/patients")
+    async def create_patient(request: Request):
+        denied = unauthorized(request)
+        if denied:
+            return denied
+        patient = await request.json()
+        if not patient.get("projectId") or not patient.get("firstName"):
+            return JSONResponse({"message": "Invalid patient"}, status_code=400)
+        now = timestamp()
+        created = {"id": str(uuid.uuid4()), **patient, "createdAt": now, "updatedAt": now}
+        patients[created["id"]] = created
+        return JSONResponse({"results": created}, status_code=201)
+
+    @app.get("/patients")
+    async def list_patients(request: Request, projectId: str = None, updatedSince: str = None,
+                            page: int = 1, limit: int = 100):
+        denied = unauthorized(request)
+        if denied:
+            return denied
+        matching = [p for p in patients.values() if projectId is None or p["projectId"] == projectId]
+        return {"results": updated_page(matching, updatedSince, page, limit)}
+
+    @app.post("/orders")
+    async def create_order(request: Request):
+        denied = unauthorized(request)
+        if denied:
+            return denied
+        order = await request.json()
+        if not order.get("patientId"):
+            return JSONResponse({"message": "patientId is required"}, status_code=400)
+        if order["patientId"] not in patients:
+            return JSONResponse({"message": "Patient not found"}, status_code=404)
+        now = timestamp()
+        created = {
+            "id": str(uuid.uuid4()),
+            "status": "created",
+            **order,
+            "projectId": patients[order["patientId"]]["projectId"],
+            "createdAt": now,
+            "updatedAt": now,
+        }
+        orders[created["id"]] = created
+        return JSONResponse({"results": created}, status_code=201)
+
+    @app.get("/orders")
+    async def list_orders(request: Request, updatedSince: str = None, page: int = 1, limit: int = 100):
+        denied = unauthorized(request)
+        if denied:
+            return denied
+        return {"results": updated_page(list(orders.values()), updatedSince, page, limit)}
+
+    @app.get("/projects/{project_id}")
+    async def get_project(project_id: str, request: Request):
+        denied = unauthorized(request)
+        if denied:
+            return denied
+        project = projects.setdefault(project_id, {
+            "id": project_id,
+            "name": f"Stub project {project_id[:8]}",
+            "orderConfigurations": [{"id": "stub-config", "name": "Default kit"}],
+        })
+        body = json.dumps({"results": project})
+        etag = '"' + hashlib.sha1(body.encode()).hexdigest() + '"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(body, media_type="application/json", headers={"ETag": etag})
+
+    # -------------------------------
+    # Control endpoints
+    # -------------------------------
+    @app.get("/_stub/stats")
+    async def stats():
+        return {"calls": dict(calls), "total": sum(calls.values())}
+
+    @app.post("/_stub/reset")
+    async def reset():
+        calls.clear()
+        patients.clear()
+        orders.clear()
+        return {"status": "ok"}
+
+    @app.post("/_stub/orders/{order_id}")
+    async def update_order(order_id: str, request: Request):
+        """Change an order as Tasso would (e.g. {"status": "shipped"})."""
+        if order_id not in orders:
+            return JSONResponse({"message": "Order not found"}, status_code=404)
+        orders[order_id].update(await request.json(), updatedAt=timestamp())
+        return orders[order_id]
+
+    @app.post("/_stub/config")
+    async def configure(request: Request):
+        updates = await request.json()
+        new_config = StubConfig(**{**asdict(state["config"]), **updates})
+        state["sample"] = parse_latency(new_config.latency)
+        state["config"] = new_config
+        return asdict(new_config)
+
+    return app
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run a local fake Tasso API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", default="fixed:0")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args()
+
+    config = StubConfig(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+    )
+    uvicorn.run(create_stub_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Offline tests for admission control on the webhook endpoints.
+"""
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+
+from admission import AdmissionControl, AdmissionLimit, AdmissionMiddleware, parse_limits
+from config import ConfigError
+
+
+def make_app(limit: AdmissionLimit):
+    release = asyncio.Event()
+    app = FastAPI()
+    control = AdmissionControl({"/hook": limit})
+    app.add_middleware(AdmissionMiddleware, control=control)
+
+    @app.post("/hook")
+    async def hook(request: Request):
+        form = await request.form()
+        if form.get("wait"):
+            await release.wait()
+        return {"ok": True}
+
+    @app.post("/other")
+    async def other(request: Request):
+        return {"size": len(await request.body())}
+
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+    return client, control, release
+
+
+def test_requests_past_the_high_water_mark_are_shed_with_retry_after():
+    async def run():
+        client, control, release = make_app(
+            AdmissionLimit(max_in_flight=1, max_queued=1, queue_timeout=0.05, retry_after=7)
+        )
+        holding = asyncio.create_task(client.post("/hook", data={"wait": "1"}))
+        await asyncio.sleep(0.01)
+        queued = asyncio.create_task(client.post("/hook", data={"a": "b"}))
+        await asyncio.sleep(0.01)
+        assert control.snapshot()["/hook"]["queued"] == 1
+
+        shed = await client.post("/hook", data={"a": "b"})
+        assert shed.status_code == 503 and shed.headers["retry-after"] == "7"
+        timed_out = await queued
+        assert timed_out.status_code == 503
+
+        # A waiter that gets the slot in time is served
+        waiting = asyncio.create_task(client.post("/hook", data={"a": "b"}))
+        await asyncio.sleep(0.01)
+        release.set()
+        assert (await holding).status_code == 200 and (await waiting).status_code == 200
+        assert control.snapshot()["/hook"]["in_flight"] == 0
+        await client.aclose()
+
+    asyncio.run(run())
+
+
+def test_oversized_bodies_are_refused_while_other_paths_are_not_limited():
+    async def chunks():
+        for _ in range(10):
+            yield b"x" * 100
+
+    async def run():
+        client, control, _ = make_app(AdmissionLimit(max_body=500))
+        assert (await client.post("/hook", content=b"x" * 501)).status_code == 413
+        # No Content-Length: cut off once the streamed body passes the limit
+        streamed = await client.post("/hook", content=chunks(),
+                                     headers={"content-type": "application/x-www-form-urlencoded"})
+        assert streamed.status_code == 413
+        assert (await client.post("/hook", data={"a": "b"})).status_code == 200
+        assert (await client.post("/other", content=chunks())).json() == {"size": 1000}
+        assert control.snapshot()["/hook"]["in_flight"] == 0
+        await client.aclose()
+
+    asyncio.run(run())
+
+
+def test_limits_are_tunable_per_path():
+    default = AdmissionLimit(max_in_flight=8)
+    limits = parse_limits(
+        '{"/events": {"max_in_flight": 2, "status": 429}, "/hook": null}', ["/hook", "/events"], default
+    )
+    assert limits == {"/events": AdmissionLimit(max_in_flight=2, status=429)}
+    with pytest.raises(ConfigError, match="ADMISSION_ROUTES"):
+        parse_limits('{"/hook": {"max_inflight": 2}}', ["/hook"], default)
+    with pytest.raises(ConfigError, match="status"):
+        parse_limits('{"/hook": {"status": 500}}', ["/hook"], default)
@@ -0,0 +1,68 @@
+"""
+Offline tests for the streaming backfill parsers and runner.
+"""
+import asyncio
+import json
+
+from backfill import parse_records, run_backfill
+
+
+async def chunked(data: bytes, size: int = 7):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+async def collect(aiter):
+    return [item async for item in aiter]
+
+
+def test_jsonl_accepts_wrapped_and_bare_records():
+    raw = {"event_id": "e1", "q3_name": {"first": "A"}}
+    data = "\n".join([
+        json.dumps({"rawRequest": json.dumps(raw)}),
+        "",
+        json.dumps(raw),
+        "not json",
+    ]).encode()
+    records = asyncio.run(collect(parse_records(chunked(data), "jsonl")))
+    assert [ref for ref, _ in records] == [1, 3, 4]
+    assert records[0][1] == raw and records[1][1] == raw
+    assert isinstance(records[2][1], ValueError)
+
+
+def test_csv_handles_quoted_multiline_cells():
+    data = (
+        'event_id,q3_name,q17_race\n'
+        'e1,"{""first"": ""A"", ""last"": ""B""}","line one\nline two"\n'
+    ).encode()
+    [(ref, submission)] = asyncio.run(collect(parse_records(chunked(data), "csv")))
+    assert ref == 1
+    assert submission == {
+        "event_id": "e1",
+        "q3_name": {"first": "A", "last": "B"},
+        "q17_race": "line one\nline two",
+    }
+
+
+def test_run_backfill_bounds_concurrency():
+    in_flight = 0
+    peak = 0
+
+    async def process(submission):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        if submission["event_id"] == "bad":
+            raise RuntimeError("Tasso 500")
+        return {"status": "success"}
+
+    async def records():
+        for i in range(10):
+            yield i + 1, {"event_id": "bad" if i == 3 else str(i)}
+
+    results = asyncio.run(collect(run_backfill(records(), process, concurrency=3)))
+    assert peak == 3
+    assert len(results) == 10
+    assert [r["record"] for r in results if r["status"] == "error"] == [4]
@@ -0,0 +1,58 @@
+"""
+Offline tests for webhook capture and the replay helpers.
+"""
+import glob
+import json
+import os
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from benchmarks.common import jotform_body
+from benchmarks.replay import fresh_event_ids, load
+from capture import CaptureMiddleware, CaptureWriter, read_capture, record_body
+
+
+def test_webhook_bodies_are_captured_to_rotating_segments(tmp_path):
+    writer = CaptureWriter(str(tmp_path), segment_bytes=1)
+    app = FastAPI()
+    app.add_middleware(CaptureMiddleware, writer=writer, paths=["/hook"])
+
+    @app.post("/hook")
+    async def hook(request: Request):
+        return {"fields": len(await request.form())}
+
+    @app.post("/other")
+    async def other(request: Request):
+        return {"fields": len(await request.form())}
+
+    writer.start()
+    with TestClient(app) as client:
+        for i in range(3):
+            client.post("/hook", data={"rawRequest": json.dumps({"event_id": f"e{i}"})})
+        client.post("/other", data={"rawRequest": "{}"})
+    writer.stop()
+
+    segments = sorted(glob.glob(os.path.join(tmp_path, "capture-*.jsonl.gz")))
+    records = list(read_capture(segments))
+    assert [r["path"] for r in records] == ["/hook"] * 3
+    assert records[0]["t"] <= records[1]["t"] <= records[2]["t"]
+    assert b"e2" in record_body(records[2])
+    assert records[0]["content_type"] == "application/x-www-form-urlencoded"
+
+
+def test_replay_can_give_submissions_fresh_event_ids(tmp_path):
+    body, content_type = jotform_body({"event_id": "5912_abc", "path": "/submit/1"})
+    assert b'"event_id": "5912_abc-r1"' in fresh_event_ids(body, content_type, "-r1")
+
+    writer = CaptureWriter(str(tmp_path))
+    writer.start()
+    for i in range(2):
+        writer.submit({"t": 100.0 + i, "method": "POST", "path": "/hook",
+                       "content_type": "application/x-www-form-urlencoded",
+                       "body": "rawRequest=%7B%22event_id%22%3A+%22e1%22%7D"})
+    writer.stop()
+
+    requests = load(glob.glob(os.path.join(tmp_path, "*.gz")), fresh_ids=True)
+    assert [offset for offset, *_ in requests] == [0.0, 1.0]
+    assert requests[0][3] != requests[1][3]
@@ -0,0 +1,145 @@
+"""
+Offline tests for the adaptive concurrency limit on Tasso calls.
+"""
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from concurrency_limit import AdaptiveLimiter
+from resilience import RetryPolicy, TassoError, TassoUnavailable
+from tasso_client import TassoClient
+
+
+def test_limit_grows_while_in_use_and_backs_off_once_per_slowdown():
+    async def run():
+        limiter = AdaptiveLimiter("/orders", initial=4, max_limit=8, window=1000)
+        for _ in range(40):
+            for _ in range(4):
+                await limiter.acquire()
+            started = time.monotonic() - 0.01
+            for _ in range(4):
+                limiter.release(started)
+        assert limiter.limit > 6
+
+        # Four calls fail together: one decrease, not four
+        grown = limiter.limit
+        starts = []
+        for _ in range(4):
+            await limiter.acquire()
+            starts.append(time.monotonic())
+        for started in starts:
+            limiter.release(started, dropped=True)
+        assert limiter.limit == pytest.approx(grown * 0.9)
+
+        # Latency well above the baseline counts as overload too
+        for _ in range(3):
+            await limiter.acquire()
+            started = time.monotonic()
+            await asyncio.sleep(0.06)
+            limiter.release(started)
+        assert limiter.limit < grown * 0.85
+
+    asyncio.run(run())
+
+
+def test_calls_over_the_limit_wait_in_order_or_give_up():
+    async def run():
+        limiter = AdaptiveLimiter("/patients", initial=1, max_limit=1, max_wait=0.05)
+        await limiter.acquire()
+        with pytest.raises(TassoUnavailable) as e:
+            await limiter.acquire()
+        assert e.value.retryable
+
+        limiter.max_wait = None
+        order = []
+
+        async def waiter(n):
+            await limiter.acquire()
+            order.append(n)
+            limiter.release()
+
+        tasks = [asyncio.create_task(waiter(n)) for n in range(3)]
+        await asyncio.sleep(0)
+        assert limiter.snapshot()["waiting"] == {"live": 3, "bulk": 0}
+        limiter.release()
+        await asyncio.gather(*tasks)
+        assert order == [0, 1, 2] and limiter.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_tasso_overload_lowers_the_client_limit():
+    def handler(request):
+        return httpx.Response(503)
+
+    async def run():
+        limiter = AdaptiveLimiter("/orders", initial=10)
+        client = TassoClient(
+            "http://tasso.test",
+            transport=httpx.MockTransport(handler),
+            retry=RetryPolicy(max_attempts=1),
+            concurrency={"/orders": limiter},
+        )
+        with pytest.raises(TassoError):
+            await client.call("POST", "/orders", json={})
+        await client.close()
+        return limiter
+
+    limiter = asyncio.run(run())
+    assert limiter.limit == pytest.approx(9) and limiter.in_flight == 0
+
+
+def test_a_non_http_error_gives_the_slot_back():
+    def handler(request):
+        raise RuntimeError("transport bug")
+
+    async def run():
+        limiter = AdaptiveLimiter("/orders", initial=1)
+        client = TassoClient(
+            "http://tasso.test",
+            transport=httpx.MockTransport(handler),
+            retry=RetryPolicy(max_attempts=1),
+            concurrency={"/orders": limiter},
+        )
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await client.call("POST", "/orders", json={})
+        await client.close()
+        return limiter
+
+    limiter = asyncio.run(run())
+    assert limiter.in_flight == 0 and limiter.limit == 1
+
+
+def test_live_calls_keep_capacity_while_bulk_work_queues():
+    async def run():
+        limiter = AdaptiveLimiter("/orders", initial=4, max_limit=4, bulk_share=0.5)
+        # Bulk holds at most half the slots, whatever is queued
+        await limiter.acquire("bulk")
+        await limiter.acquire("bulk")
+        extra_bulk = asyncio.create_task(limiter.acquire("bulk"))
+        await asyncio.sleep(0)
+        assert limiter.snapshot()["waiting"]["bulk"] == 1
+        assert await limiter.acquire("live") == 0.0
+        assert await limiter.acquire("live") == 0.0
+        extra_bulk.cancel()
+
+        # Both lanes waiting: freed slots go two live for one bulk
+        limiter = AdaptiveLimiter("/orders", initial=1, max_limit=1, bulk_share=1.0, weights={"live": 2, "bulk": 1})
+        await limiter.acquire()
+        granted = []
+
+        async def waiter(lane):
+            await limiter.acquire(lane)
+            granted.append(lane)
+            limiter.release(lane=lane)
+
+        tasks = [asyncio.create_task(waiter(lane)) for lane in ("bulk", "bulk", "live", "live", "live")]
+        await asyncio.sleep(0)
+        limiter.release()
+        await asyncio.gather(*tasks)
+        assert granted == ["live", "live", "bulk", "live", "bulk"]
+
+    asyncio.run(run())
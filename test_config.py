@@ -0,0 +1,47 @@
+"""
+Tests for configuration validation at startup.
+"""
+import pytest
+
+import config
+from tasso_client import TassoClient
+
+
+def test_settings_are_validated_and_immutable(monkeypatch):
+    monkeypatch.setenv("TASSO_BASE_URL", "https://tasso.example/")
+    monkeypatch.setenv("TASSO_USERNAME", "user")
+    monkeypatch.setenv("TASSO_SECRET", "secret")
+    monkeypatch.setenv("TASSO_RATE_LIMIT_ORDERS", "2")
+    monkeypatch.setattr(config, "GLP1_PROJECT_ID", "glp1")
+    monkeypatch.setattr(config, "TESTOSTRONE_PROJECT_ID", "trt")
+    monkeypatch.setattr(config, "_settings", None)
+    settings = config.load_settings()
+
+    assert settings.tasso_base_url == "https://tasso.example"
+    assert config.get_settings() is settings
+    # Components are built from these values, not from module globals
+    client = TassoClient(settings=settings)
+    assert str(client._http.base_url) == "https://tasso.example"
+    assert client.limiter.snapshot()["/orders"]["rate"] == 2
+    assert settings.project_ids[:2] == ("glp1", "trt")
+    assert "secret" not in repr(settings) and "secret" not in str(settings.summary())
+    with pytest.raises(AttributeError):
+        settings.intake_mode = "queue"
+
+
+def test_every_problem_is_reported(monkeypatch):
+    monkeypatch.setenv("TASSO_SECRET", "")
+    monkeypatch.setattr(config, "INTAKE_MODE", "later")
+    monkeypatch.setenv("TASSO_HTTP_MAX_CONNECTIONS", "10")
+    monkeypatch.setenv("TASSO_HTTP_MAX_KEEPALIVE", "11")
+
+    with pytest.raises(config.ConfigError) as e:
+        config.load_settings()
+    for problem in ("TASSO_SECRET is required", "INTAKE_MODE", "TASSO_HTTP_MAX_KEEPALIVE"):
+        assert problem in str(e.value)
+
+
+def test_unparseable_numbers_name_the_variable(monkeypatch):
+    monkeypatch.setenv("INTAKE_WORKERS", "four")
+    with pytest.raises(config.ConfigError, match="INTAKE_WORKERS"):
+        config.env_int("INTAKE_WORKERS", "4")
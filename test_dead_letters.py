@@ -0,0 +1,60 @@
+"""
+Offline tests for the dead-letter store.
+"""
+import asyncio
+import os
+import tempfile
+
+from dead_letters import DISCARDED, OPEN, RESOLVED, DeadLetterStore
+
+
+def test_repeated_failures_update_one_entry():
+    path = os.path.join(tempfile.mkdtemp(), "dead_letters.db")
+
+    async def run():
+        store = DeadLetterStore(path)
+        raw = {"event_id": "e1", "q4_email": "kim@example.com"}
+        first = await store.record(raw, "order", "Bad Request", status_code=400, patient_id="p1")
+        # A later failure at another stage keeps the patient created earlier
+        again = await store.record(raw, "auth", "timed out")
+        assert again == first
+
+        letter = await store.get(first)
+        assert (letter.stage, letter.attempts, letter.patient_id) == ("auth", 2, "p1")
+        assert "raw" not in letter.summary()
+
+        anonymous = await store.record({"q4_email": "x@example.com"}, "normalize", "bad email")
+        assert anonymous != first
+        await store.resolve(first, {"status": "success"})
+        assert await store.resolve_event("e1", {}) is False
+        assert await store.discard(anonymous)
+
+        assert await store.list() == []
+        assert [d.id for d in await store.list(state=None, stage="auth")] == [first]
+        assert await store.counts() == {RESOLVED: {"auth": 1}, DISCARDED: {"normalize": 1}}
+
+        # Failing again reopens it
+        await store.record(raw, "order", "Bad Request", key=letter.key)
+        assert (await store.get(first)).state == OPEN
+        store.close()
+
+    asyncio.run(run())
+
+
+def test_list_filters_and_pages_newest_first():
+    path = os.path.join(tempfile.mkdtemp(), "dead_letters.db")
+
+    async def run():
+        store = DeadLetterStore(path)
+        ids = [await store.record({"event_id": f"e{i}"}, "patient", f"HTTP {400 + i % 2}",
+                                  status_code=400 + i % 2) for i in range(5)]
+        first_page = await store.list(limit=2)
+        assert [d.id for d in first_page] == ids[:-3:-1]
+        rest = await store.list(before_id=first_page[-1].id)
+        assert [d.id for d in rest] == ids[2::-1]
+        assert [d.id for d in await store.list(status_code=401)] == [ids[3], ids[1]]
+        assert [d.id for d in await store.list(error="HTTP 401")] == [ids[3], ids[1]]
+        assert [d.id for d in await store.list(ids=[ids[0], ids[4]])] == [ids[4], ids[0]]
+        store.close()
+
+    asyncio.run(run())
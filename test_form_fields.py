@@ -0,0 +1,61 @@
+"""
+Offline tests for reading rawRequest without the full form parser.
+"""
+import asyncio
+import json
+from urllib.parse import urlencode
+
+import pytest
+from starlette.requests import Request
+
+from benchmarks.common import encode_multipart, jotform_body
+from fast_json import dumps, loads
+from form_fields import extract_field
+from test_normalizer import SUBMISSION
+
+
+def parse_form(body: bytes, content_type: str) -> dict:
+    """What Starlette's form parser makes of the same body."""
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def run():
+        request = Request({"type": "http", "method": "POST", "headers": [(b"content-type", content_type.encode())]},
+                          receive)
+        return dict(await request.form())
+
+    return asyncio.run(run())
+
+
+def test_fields_match_the_form_parser():
+    raw = json.dumps(dict(SUBMISSION, note="Ünïcode & a=b\r\n--not-a-boundary"), ensure_ascii=False)
+    bodies = [
+        jotform_body(SUBMISSION),
+        encode_multipart([("formID", "1"), ("q1", 'name="rawRequest"'), ("rawRequest", raw)]),
+        (urlencode({"formID": "1", "xrawRequest": "no", "rawRequest": raw}).encode(),
+         "application/x-www-form-urlencoded"),
+    ]
+    for body, content_type in bodies:
+        assert extract_field(body, content_type, "rawRequest") == parse_form(body, content_type)["rawRequest"]
+
+    body, content_type = encode_multipart([("formID", "1")])
+    assert extract_field(body, content_type, "rawRequest") is None
+    assert extract_field(b"formID=1", "application/x-www-form-urlencoded", "rawRequest") is None
+
+
+def test_unusual_bodies_are_left_to_the_form_parser():
+    body, content_type = jotform_body(SUBMISSION)
+    with pytest.raises(ValueError):
+        extract_field(body[:-40], content_type, "rawRequest")
+    with pytest.raises(ValueError):
+        extract_field(body, "application/json", "rawRequest")
+    upload = body.replace(b'name="rawRequest"', b'name="rawRequest"; filename="raw.json"')
+    with pytest.raises(ValueError):
+        extract_field(upload, content_type, "rawRequest")
+
+
+def test_json_round_trips_through_either_backend():
+    payload = {"name": "Zoë", "n": 3, "nested": {"ok": True, "none": None}}
+    assert loads(dumps(payload)) == payload == json.loads(dumps(payload))
+    with pytest.raises(ValueError):
+        loads("{not json")
@@ -0,0 +1,89 @@
+"""
+Offline tests for the form routing table and its hot reload.
+"""
+import asyncio
+import json
+import os
+import tempfile
+
+import pytest
+
+import normalizer
+from config import ConfigError
+from form_routes import RouteReloader, load_table
+from metrics import FORM_ROUTES
+from normalizer import FIELD_MAPS, build_order_payload, normalize, resolve_route
+from test_normalizer import SUBMISSION
+
+
+def write_routes(path: str, spec: dict) -> None:
+    # Written aside and renamed in, as a deploy tool would
+    with open(path + ".tmp", "w") as f:
+        json.dump(spec, f)
+    os.replace(path + ".tmp", path)
+
+
+@pytest.fixture
+def routes_file(monkeypatch):
+    monkeypatch.setattr(normalizer, "_routing", normalizer.routing_table())
+    monkeypatch.setenv("KIT_PROJECT", "proj-kit")
+    return os.path.join(tempfile.mkdtemp(), "routes.json")
+
+
+def test_routes_file_picks_project_configuration_and_profile(routes_file):
+    short_form = dict(FIELD_MAPS["default"], name="q1_fullName")
+    write_routes(routes_file, {
+        "forms": {
+            "242115439242147": {"project": "${KIT_PROJECT}", "configuration": "cfg-1"},
+            "251000000000001": {"project": "proj-short", "profile": "short_form"},
+        },
+        "profiles": {"short_form": short_form},
+    })
+    RouteReloader(routes_file).load()
+
+    route = resolve_route(SUBMISSION)
+    assert (route.project_id, route.configuration_id) == ("proj-kit", "cfg-1")
+    assert build_order_payload("p1", SUBMISSION, route)["orderConfiguration"] == {"configurationId": "cfg-1"}
+
+    short = {k: v for k, v in SUBMISSION.items() if k != "q3_name"}
+    short.update(path="/submit/251000000000001", q1_fullName={"first": "A", "last": "B"})
+    assert normalize(short)["projectId"] == "proj-short"
+    assert normalize(short)["firstName"] == "A"
+
+    # No fallback: an unknown form is rejected, not sent to some project
+    misses = FORM_ROUTES.labels("miss").value
+    with pytest.raises(ValueError, match="No route for form 999"):
+        normalize(dict(SUBMISSION, path="/submit/999"))
+    assert FORM_ROUTES.labels("miss").value == misses + 1
+
+
+def test_bad_routes_are_rejected_at_load(routes_file):
+    write_routes(routes_file, {"forms": {"1": {"project": "p", "profile": "nope"}}})
+    with pytest.raises(ConfigError, match="unknown profile"):
+        load_table(routes_file)
+
+
+def test_reload_swaps_tables_and_keeps_the_last_good_one(routes_file):
+    write_routes(routes_file, {"forms": {"242115439242147": {"project": "first"}}})
+    changed = []
+
+    async def run():
+        reloader = RouteReloader(routes_file, on_change=lambda table: changed.append(table.project_ids()))
+        reloader.load()
+        in_flight = resolve_route(SUBMISSION)
+
+        write_routes(routes_file, {"forms": {"242115439242147": {"project": "second"}}, "fallback": {"project": "fb"}})
+        assert await reloader.check()
+        assert resolve_route(SUBMISSION).project_id == "second"
+        assert resolve_route({"path": "/submit/other"}).project_id == "fb"
+        # A submission that resolved before the swap keeps its route
+        assert in_flight.project_id == "first"
+
+        with open(routes_file, "w") as f:
+            f.write("{not json")
+        assert not await reloader.check()
+        assert reloader.last_error and resolve_route(SUBMISSION).project_id == "second"
+        assert not await reloader.check()  # same broken file: not retried
+
+    asyncio.run(run())
+    assert changed == [["first"], ["second", "fb"]]
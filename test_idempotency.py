@@ -0,0 +1,84 @@
+"""
+Offline tests for the submission idempotency store.
+"""
+import asyncio
+import os
+import sqlite3
+import tempfile
+
+from idempotency import IdempotencyStore
+
+
+def test_concurrent_duplicates_run_once_and_persist():
+    path = os.path.join(tempfile.mkdtemp(), "idempotency.db")
+    calls = 0
+
+    async def create():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"status": "success", "tasso_patient_id": "p-1"}
+
+    async def run():
+        store = IdempotencyStore(path)
+        results = await asyncio.gather(*[store.run("AUTO-1", create) for _ in range(10)])
+        assert [replayed for _, replayed in results].count(False) == 1
+        assert all(result["tasso_patient_id"] == "p-1" for result, _ in results)
+        store.close()
+
+        # A fresh process reads it back from the table
+        store = IdempotencyStore(path, max_entries=1)
+        result, replayed = await store.run("AUTO-1", create)
+        assert replayed and result["tasso_patient_id"] == "p-1"
+        store.close()
+
+    asyncio.run(run())
+    assert calls == 1
+
+
+def test_failures_are_not_stored():
+    path = os.path.join(tempfile.mkdtemp(), "idempotency.db")
+
+    async def fail():
+        raise RuntimeError("Tasso 503")
+
+    async def ok():
+        return {"status": "success"}
+
+    async def run():
+        store = IdempotencyStore(path)
+        try:
+            await store.run("AUTO-2", fail)
+        except RuntimeError:
+            pass
+        assert await store.run("AUTO-2", ok) == ({"status": "success"}, False)
+        store.close()
+
+    asyncio.run(run())
+
+
+def test_result_is_returned_when_it_cannot_be_stored():
+    path = os.path.join(tempfile.mkdtemp(), "idempotency.db")
+    calls = 0
+
+    async def create():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"status": "success", "tasso_patient_id": "p-1"}
+
+    def disk_full(*args):
+        raise sqlite3.OperationalError("database or disk is full")
+
+    async def run():
+        store = IdempotencyStore(path, claim_lease=30)
+        store._save = disk_full
+        results = await asyncio.gather(store.run("AUTO-3", create), store.run("AUTO-3", create))
+        assert [result for result, _ in results] == [{"status": "success", "tasso_patient_id": "p-1"}] * 2
+        # Still known in memory, and the claim doesn't hold up a replay elsewhere
+        assert await store.run("AUTO-3", create) == ({"status": "success", "tasso_patient_id": "p-1"}, True)
+        assert store._conn.execute("SELECT COUNT(*) FROM idempotency_claims").fetchone()[0] == 0
+        store.close()
+
+    asyncio.run(run())
+    assert calls == 1
@@ -0,0 +1,50 @@
+"""
+Offline tests for the durable intake queue.
+"""
+import asyncio
+import os
+import tempfile
+
+from intake_queue import IntakeQueue, DONE, FAILED, PENDING, RUNNING
+
+
+def test_jobs_survive_restart_and_track_attempts():
+    path = os.path.join(tempfile.mkdtemp(), "intake.db")
+
+    async def run():
+        queue = IntakeQueue(path)
+        job_id = await queue.enqueue('{"event_id": "1"}')
+        job = await queue.claim()
+        assert job.id == job_id and job.state == RUNNING and job.attempts == 1
+        assert await queue.claim() is None
+        # Simulate a crash while the job is running
+        queue.close()
+
+        queue = IntakeQueue(path)
+        assert await queue.recover() == 1
+        job = await queue.claim()
+        assert job.attempts == 2
+        await queue.complete(job.id, {"status": "success"})
+        assert (await queue.get(job_id)).state == DONE
+        queue.close()
+
+    asyncio.run(run())
+
+
+def test_failed_job_is_retried_then_given_up():
+    path = os.path.join(tempfile.mkdtemp(), "intake.db")
+
+    async def run():
+        queue = IntakeQueue(path)
+        job_id = await queue.enqueue("{}")
+        job = await queue.claim()
+        await queue.fail(job.id, "Tasso 503", retry_in=60)
+        job = await queue.get(job_id)
+        assert job.state == PENDING and job.last_error == "Tasso 503"
+        # Not yet due
+        assert await queue.claim() is None
+        await queue.fail(job_id, "bad input", retry_in=None)
+        assert (await queue.counts()) == {FAILED: 1}
+        queue.close()
+
+    asyncio.run(run())
@@ -0,0 +1,87 @@
+import io
+import json
+import logging
+import queue
+
+from logs import (
+    ContextFilter,
+    JsonFormatter,
+    NonBlockingQueueHandler,
+    configure_logging,
+    correlation_scope,
+    get_logger,
+    shutdown_logging,
+)
+
+
+def make_record(level=logging.INFO, msg="hello", **fields):
+    record = logging.LogRecord("test", level, __file__, 1, msg, (), None)
+    record.fields = fields
+    return record
+
+
+def test_phi_fields_are_redacted_or_hashed():
+    formatter = JsonFormatter(hash_key="k")
+    payload = {
+        "subjectId": "AUTO-5913",
+        "firstName": "Terry",
+        "contactInformation": {"email": "terry@example.com", "phoneNumber": "15551234567"},
+        "shippingAddress": {"address1": "1 Main St"},
+        "dateOfBirth": "1990-01-02",
+    }
+    line = formatter.format(make_record(payload=payload))
+    entry = json.loads(line)
+
+    assert "Terry" not in line and "terry@example.com" not in line and "Main St" not in line
+    logged = entry["payload"]
+    assert logged["subjectId"] == "AUTO-5913"
+    assert logged["firstName"] == "[REDACTED]"
+    assert logged["shippingAddress"] == "[REDACTED]"
+    # Hashes are stable, so the same patient can be followed across lines
+    email_hash = logged["contactInformation"]["email"]
+    assert email_hash.startswith("sha256:")
+    assert json.loads(formatter.format(make_record(email="terry@example.com")))["email"] == email_hash
+
+
+def test_debug_sampling_is_per_correlation_id():
+    none, every = ContextFilter(0.0), ContextFilter(1.0)
+    half = ContextFilter(0.5)
+    kept = 0
+    for i in range(200):
+        with correlation_scope(f"req-{i}"):
+            assert not none.filter(make_record(logging.DEBUG))
+            assert every.filter(make_record(logging.DEBUG))
+            assert half.filter(make_record(logging.INFO))
+            first = half.filter(make_record(logging.DEBUG))
+            assert half.filter(make_record(logging.DEBUG)) == first
+            kept += first
+    assert 60 < kept < 140
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    handler.handle(make_record())
+    handler.handle(make_record())
+    assert handler.dropped == 1
+
+
+def test_records_carry_correlation_id():
+    stream = io.StringIO()
+    configure_logging("INFO", stream=stream)
+    try:
+        log = get_logger("test_logs")
+        with correlation_scope("abc123"):
+            log.info("patient created", patient_id="p1")
+        log.debug("not emitted")
+    finally:
+        shutdown_logging()
+
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert lines == [{
+        "ts": lines[0]["ts"],
+        "level": "INFO",
+        "logger": "test_logs",
+        "msg": "patient created",
+        "correlation_id": "abc123",
+        "patient_id": "p1",
+    }]
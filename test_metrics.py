@@ -0,0 +1,40 @@
+from metrics import Counter, Gauge, Histogram, Registry
+
+
+def test_prometheus_text_format():
+    registry = Registry()
+    requests = registry.register(Counter("tasso_requests_total", "Calls", ("endpoint", "status")))
+    in_flight = registry.register(Gauge("in_flight", "Busy"))
+    latency = registry.register(Histogram("stage_seconds", "Latency", ("stage",), buckets=(0.1, 1.0)))
+
+    requests.labels("/patients", 201).inc()
+    requests.labels("/patients", 201).inc()
+    in_flight.inc()
+    stage = latency.labels("normalize")
+    for value in (0.05, 0.1, 0.5, 3.0):
+        stage.observe(value)
+
+    text = registry.render()
+    assert '# TYPE tasso_requests_total counter' in text
+    assert 'tasso_requests_total{endpoint="/patients",status="201"} 2' in text
+    assert "in_flight 1" in text
+    # Buckets are cumulative and inclusive of the bound
+    assert 'stage_seconds_bucket{stage="normalize",le="0.1"} 2' in text
+    assert 'stage_seconds_bucket{stage="normalize",le="1"} 3' in text
+    assert 'stage_seconds_bucket{stage="normalize",le="+Inf"} 4' in text
+    assert 'stage_seconds_count{stage="normalize"} 4' in text
+    assert 'stage_seconds_sum{stage="normalize"} 3.65' in text
+
+
+def test_timer_and_collectors():
+    registry = Registry()
+    latency = registry.register(Histogram("work_seconds", "Latency"))
+    depth = registry.register(Gauge("queue_depth", "Waiting", ("queue",)))
+    registry.add_collector(lambda: depth.labels("intake").set(7))
+
+    with latency.time():
+        pass
+
+    text = registry.render()
+    assert "work_seconds_count 1" in text
+    assert 'queue_depth{queue="intake"} 7' in text
@@ -0,0 +1,79 @@
+"""
+Offline tests for the Jotform -> Tasso normalizer.
+"""
+import pytest
+
+from normalizer import compile_field_map, normalize, normalize_many, PROJECT_ROUTES, DEFAULT_PROJECT_ID
+
+
+SUBMISSION = {
+    "event_id": "5912_abc",
+    "path": "/submit/242115439242147",
+    "q3_name": {"first": "Terry", "last": "Taso"},
+    "q4_email": "terry@example.com",
+    "q5_shippingAddress": {
+        "addr_line1": "1631 15th Ave W",
+        "addr_line2": "",
+        "city": "Seattle",
+        "state": "Washington",
+        "postal": "98119",
+    },
+    "q6_phoneNumber": {"area": "(212)", "phone": "456-7890"},
+    "q15_gender": "Female",
+    "q16_dateOf": {"year": "1988", "month": "1", "day": "5"},
+    "q17_race": "Asian",
+}
+
+
+def test_normalize_builds_tasso_patient():
+    assert normalize(SUBMISSION) == {
+        "projectId": PROJECT_ROUTES["/submit/242115439242147"],
+        "subjectId": "AUTO-5912-abc",
+        "firstName": "Terry",
+        "lastName": "Taso",
+        "shippingAddress": {
+            "address1": "1631 15th Ave W",
+            "address2": "Unknown",
+            "city": "Seattle",
+            "district1": "WA",
+            "postalCode": "98119",
+            "country": "US",
+        },
+        "contactInformation": {"email": "terry@example.com", "phoneNumber": "12124567890"},
+        "dateOfBirth": "1988-01-05",
+        "gender": "cisFemale",
+        "assignedSex": "female",
+        "race": "Asian",
+        "smsConsent": False,
+    }
+
+
+def test_defaults_for_sparse_submission():
+    payload = normalize({
+        "path": "/submit/somewhere-else",
+        "q3_name": {"first": "A", "last": "B"},
+        "q6_phoneNumber": {"phone": "123"},
+        "q16_dateOf": {"year": "1990", "month": "12", "day": "31"},
+    })
+    assert payload["projectId"] == DEFAULT_PROJECT_ID
+    assert payload["contactInformation"] == {"email": None}
+    assert payload["shippingAddress"]["district1"] == "Unknown"
+    assert payload["gender"] == "unspecified" and payload["assignedSex"] == "unknown"
+
+
+def test_normalize_many_keeps_errors_aligned():
+    incomplete_dob = dict(SUBMISSION, q16_dateOf={"year": "1988"})
+    no_last_name = dict(SUBMISSION, q3_name={"first": "Terry"})
+    results = normalize_many([SUBMISSION, incomplete_dob, no_last_name])
+    assert results[0] == normalize(SUBMISSION)
+    assert isinstance(results[1], ValueError) and "Date of Birth" in str(results[1])
+    assert isinstance(results[2], ValueError) and "name" in str(results[2])
+
+    # A field of the wrong shape fails that submission only
+    results = normalize_many([dict(SUBMISSION, q3_name="Terry Doe"), SUBMISSION])
+    assert isinstance(results[0], Exception) and results[1] == normalize(SUBMISSION)
+
+
+def test_field_map_is_validated_when_compiled():
+    with pytest.raises(ValueError):
+        compile_field_map({"name": "q3_name"})
@@ -0,0 +1,98 @@
+"""
+Offline tests for the local order mirror and its incremental sync.
+"""
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+from order_mirror import OrderMirror, OrderSync
+
+
+def order(i: int, patient_id: str = "p-1", updated: str = None) -> dict:
+    created = f"2024-01-01T00:00:{i:02d}Z"
+    return {"id": f"o-{i:02d}", "patientId": patient_id, "status": "created",
+            "createdAt": created, "updatedAt": updated or created}
+
+
+def test_keyset_pagination_walks_every_order_once():
+    path = os.path.join(tempfile.mkdtemp(), "orders.db")
+
+    async def run():
+        mirror = OrderMirror(path)
+        await mirror.upsert_patients([{"id": "p-1", "subjectId": "AUTO-1",
+                                       "contactInformation": {"email": "Kim@Example.com"}}])
+        await mirror.upsert_orders([order(i) for i in range(7)] + [order(9, patient_id="p-2")])
+
+        seen, cursor = [], None
+        while True:
+            page, cursor = await mirror.orders(email="kim@example.com ", limit=3, cursor=cursor)
+            seen += [o["id"] for o in page]
+            if cursor is None:
+                break
+        assert seen == [f"o-{i:02d}" for i in reversed(range(7))]
+
+        recent, _ = await mirror.orders(subject_id="AUTO-1", created_after="2024-01-01T00:00:05Z")
+        assert [o["id"] for o in recent] == ["o-06", "o-05"]
+        with pytest.raises(ValueError):
+            await mirror.orders(cursor="not-a-cursor")
+        mirror.close()
+
+    asyncio.run(run())
+
+
+def test_sync_fetches_only_changes_since_the_watermark():
+    path = os.path.join(tempfile.mkdtemp(), "orders.db")
+    tasso = {"patients": [], "orders": [order(i) for i in range(5)]}
+    requests = []
+
+    async def fetch_page(resource, since, page):
+        requests.append((resource, since, page))
+        changed = sorted((r for r in tasso[resource] if not since or r["updatedAt"] >= since),
+                         key=lambda r: r["updatedAt"])
+        return changed[(page - 1) * 2: page * 2]
+
+    async def run():
+        mirror = OrderMirror(path)
+        sync = OrderSync(mirror, fetch_page, page_size=2)
+        assert await sync.sync_once() == {"patients": 0, "orders": 5}
+
+        tasso["orders"][1] = dict(order(1), status="shipped", updatedAt="2024-01-02T00:00:00Z")
+        requests.clear()
+        # Only the boundary record and the change come back
+        assert await sync.sync_once() == {"patients": 0, "orders": 2}
+        assert ("orders", "2024-01-01T00:00:04Z", 1) in requests
+        assert (await mirror.order("o-01"))["status"] == "shipped"
+        assert (await mirror.counts())["orders"] == 5
+        mirror.close()
+
+    asyncio.run(run())
+
+
+def test_an_interrupted_pass_does_not_skip_unsorted_pages():
+    path = os.path.join(tempfile.mkdtemp(), "orders.db")
+    # Newest first: the first page alone would move the watermark past page 2
+    listing = [order(i) for i in reversed(range(4))]
+    fail = {"page": 2}
+
+    async def fetch_page(resource, since, page):
+        if resource == "orders" and page == fail["page"]:
+            raise RuntimeError("Tasso unavailable")
+        records = listing if resource == "orders" else []
+        changed = [r for r in records if not since or r["updatedAt"] >= since]
+        return changed[(page - 1) * 2: page * 2]
+
+    async def run():
+        mirror = OrderMirror(path)
+        sync = OrderSync(mirror, fetch_page, page_size=2)
+        with pytest.raises(RuntimeError):
+            await sync.sync_once()
+        assert "orders" not in (await mirror.counts())["watermarks"]
+
+        fail["page"] = None
+        assert await sync.sync_once() == {"patients": 0, "orders": 4}
+        assert (await mirror.counts())["watermarks"]["orders"] == "2024-01-01T00:00:03Z"
+        mirror.close()
+
+    asyncio.run(run())
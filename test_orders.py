@@ -12,24 +12,20 @@ Usage examples:
 
 import os
 import json
+import asyncio
 from dotenv import load_dotenv
 
 load_dotenv()
 
 # Import your helpers from main.py
+from config import load_settings
 from main import get_tasso_token, create_tasso_patient
+from tasso_client import get_client, close_client
 
-def get_project_details(token: str) -> dict:
-    import requests
-    from config import TASSO_BASE_URL
-
-    url = f"{TASSO_BASE_URL}/projects/ac4d054b-a9c3-442d-9ce7-0ac19526bcbb"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
-
-    response = requests.get(url, headers=headers, timeout=10)
+async def get_project_details(token: str) -> dict:
+    response = await get_client().get(
+        "/projects/ac4d054b-a9c3-442d-9ce7-0ac19526bcbb", token=token
+    )
 
     if response.status_code != 200:
         raise Exception(f"Failed to fetch project: {response.status_code} - {response.text}")
@@ -84,7 +80,7 @@ def build_order_payload(
     return payload
 
 
-def maybe_create_test_patient(token: str) -> str:
+async def maybe_create_test_patient(token: str) -> str:
     """
     Only used when CREATE_PATIENT_FIRST=true or when PATIENT_ID is not provided.
     """
@@ -113,7 +109,7 @@ def maybe_create_test_patient(token: str) -> str:
     }
 
     print("Creating a test patient...")
-    result = create_tasso_patient(token, patient_payload)
+    result = await create_tasso_patient(token, patient_payload)
 
     patient_id = None
     if isinstance(result, dict):
@@ -127,13 +123,24 @@ def maybe_create_test_patient(token: str) -> str:
 
 
 def test_create_order():
+    asyncio.run(_run(_create_order()))
+
+
+async def _run(coro):
+    try:
+        return await coro
+    finally:
+        await close_client()
+
+
+async def _create_order():
     print("Authenticating with Tasso...")
-    token = get_tasso_token()
+    token = await get_tasso_token(load_settings())
     print("Authentication successful.")
 
     # Create a patient first to ensure valid patientId
     print("Creating a test patient to get a valid ID...")
-    patient_id = maybe_create_test_patient(token)
+    patient_id = await maybe_create_test_patient(token)
     print(f"Using created patientId: {patient_id}")
 
     # Hardcoded payload as requested, but with valid patientId
@@ -167,25 +174,18 @@ def test_create_order():
     # Ensure create_tasso_order is available or mocked if not in main
     try:
         from main import create_tasso_order
-        result = create_tasso_order(token, order_payload)
+        result = await create_tasso_order(token, order_payload)
     except ImportError:
         # Fallback if create_tasso_order is not in main.py yet
         print("create_tasso_order not found in main.py, defining locally...")
-        import requests
-        from config import TASSO_BASE_URL
         
-        def local_create_tasso_order(token: str, order: dict) -> dict:
-            url = f"{TASSO_BASE_URL}/orders"
-            headers = {
-                "Authorization": f"Bearer {token}",
-                "Content-Type": "application/json"
-            }
-            response = requests.post(url, json=order, headers=headers, timeout=10)
+        async def local_create_tasso_order(token: str, order: dict) -> dict:
+            response = await get_client().post("/orders", token=token, json=order)
             if response.status_code not in (200, 201):
                 raise Exception(f"Order creation failed: {response}")
             return response.json()
             
-        result = local_create_tasso_order(token, order_payload)
+        result = await local_create_tasso_order(token, order_payload)
 
     print("Order created successfully.")
     print("\nRESPONSE:")
@@ -199,8 +199,12 @@ def test_create_order():
         print(f"\norderId={order_id}")
 
 
-if __name__ == "__main__":
-    token = get_tasso_token()
-    project = get_project_details(token)
+async def _main():
+    token = await get_tasso_token(load_settings())
+    project = await get_project_details(token)
     print(project)
-    test_create_order()
+    await _create_order()
+
+
+if __name__ == "__main__":
+    asyncio.run(_run(_main()))
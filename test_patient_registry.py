@@ -0,0 +1,69 @@
+import asyncio
+
+from patient_registry import PatientRegistry, identity_keys, warm_from_tasso
+
+PATIENT = {
+    "projectId": "proj-1",
+    "subjectId": "AUTO-5912-abc",
+    "firstName": "Terry",
+    "lastName": "Taso",
+    "dateOfBirth": "1988-01-05",
+    "contactInformation": {"email": "Terry@Example.com", "phoneNumber": "12124567890"},
+    "shippingAddress": {"address1": "1631 15th Ave W", "city": "Seattle", "postalCode": "98119"},
+}
+
+
+def test_keys_are_hashed_and_match_on_email_and_dob(tmp_path):
+    async def scenario():
+        registry = PatientRegistry(str(tmp_path / "patients.db"))
+        await registry.remember(PATIENT, "pat-1")
+
+        reorder = dict(PATIENT, subjectId="AUTO-6001-abc",
+                       contactInformation={"email": "terry@example.com", "phoneNumber": "12124567890"})
+        other_project = dict(reorder, projectId="proj-2")
+        moved = dict(reorder, shippingAddress={"address1": "2 Oak St"})
+        results = [await registry.lookup(p) for p in (reorder, other_project, moved)]
+        registry.close()
+        return results
+
+    assert asyncio.run(scenario()) == ["pat-1", None, None]
+    assert all("terry" not in key.lower() for key in identity_keys(PATIENT))
+
+
+def test_entries_survive_restart_and_can_be_forgotten(tmp_path):
+    path = str(tmp_path / "patients.db")
+
+    async def scenario():
+        registry = PatientRegistry(path)
+        await registry.remember(PATIENT, "pat-1")
+        registry.close()
+
+        registry = PatientRegistry(path)
+        found = await registry.lookup(PATIENT)
+        await registry.forget(PATIENT)
+        gone = await registry.lookup(PATIENT)
+        registry.close()
+        return found, gone
+
+    assert asyncio.run(scenario()) == ("pat-1", None)
+
+
+def test_warm_up_pages_until_a_short_page(tmp_path):
+    listed = [dict(PATIENT, id=f"pat-{i}", subjectId=f"S-{i}",
+                   contactInformation={"email": f"p{i}@example.com"}) for i in range(5)]
+    pages = []
+
+    async def fetch_page(project_id, page):
+        pages.append((project_id, page))
+        return listed[(page - 1) * 2: page * 2]
+
+    async def scenario():
+        registry = PatientRegistry(str(tmp_path / "patients.db"))
+        loaded = await warm_from_tasso(registry, fetch_page, ["proj-1"], page_size=2)
+        found = await registry.lookup(dict(listed[3], subjectId="AUTO-new"))
+        count = await registry.count()
+        registry.close()
+        return loaded, found, count
+
+    assert asyncio.run(scenario()) == (5, "pat-3", 5)
+    assert pages == [("proj-1", 1), ("proj-1", 2), ("proj-1", 3)]
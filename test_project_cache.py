@@ -0,0 +1,86 @@
+import asyncio
+
+from project_cache import ProjectCache
+
+PROJECT = {"id": "proj-1", "name": "GLP1", "orderConfigurations": [{"id": "kit-a"}, {"id": "kit-b"}]}
+
+
+class FakeTasso:
+    def __init__(self):
+        self.project = PROJECT
+        self.etag = '"v1"'
+        self.requests = []
+        self.down = False
+
+    async def fetch(self, project_id, etag):
+        self.requests.append((project_id, etag))
+        if self.down:
+            raise ConnectionError("Tasso is down")
+        if etag == self.etag:
+            return 304, etag, None
+        return 200, self.etag, self.project
+
+
+def test_prewarm_then_lookups_are_local():
+    tasso = FakeTasso()
+
+    async def scenario():
+        cache = ProjectCache(tasso.fetch, ["proj-1", None, "proj-1"], ttl=300)
+        cached = await cache.prewarm()
+        ids = [cache.configuration_ids("proj-1") for _ in range(100)]
+        return cached, ids, cache.configuration_ids("unknown")
+
+    cached, ids, unknown = asyncio.run(scenario())
+    assert cached == 1 and tasso.requests[0] == ("proj-1", None)
+    assert ids[-1] == {"kit-a", "kit-b"}
+    # Unknown projects are fetched in the background, not waited for
+    assert unknown is None and tasso.requests[1:] == [("unknown", None)]
+
+
+def test_projects_without_configurations_are_not_checked():
+    async def scenario(project):
+        tasso = FakeTasso()
+        tasso.project = project
+        cache = ProjectCache(tasso.fetch, ["proj-1"])
+        await cache.prewarm()
+        return cache.configuration_ids("proj-1"), cache.snapshot()["proj-1"]["configurations"]
+
+    for project in ({"id": "proj-1", "name": "GLP1"}, dict(PROJECT, orderConfigurations=[])):
+        # None means "unknown", not "nothing allowed"
+        assert asyncio.run(scenario(project)) == (None, 0)
+
+
+async def settle(cache):
+    while cache._refreshing:
+        await asyncio.sleep(0)
+
+
+def test_stale_entries_are_served_while_revalidating():
+    tasso = FakeTasso()
+
+    async def scenario():
+        cache = ProjectCache(tasso.fetch, ["proj-1"], ttl=0)
+        await cache.prewarm()
+        # Unchanged: a 304 just renews the entry
+        stale = cache.get("proj-1")
+        await settle(cache)
+        assert cache._entries["proj-1"] is stale
+
+        # Changed upstream: stale version is served until the refresh lands
+        tasso.project = dict(PROJECT, orderConfigurations=[{"id": "kit-c"}])
+        tasso.etag = '"v2"'
+        before = cache.configuration_ids("proj-1")
+        await settle(cache)
+        after = cache._entries["proj-1"].configuration_ids
+
+        # Tasso down: keep serving the last good version
+        tasso.down = True
+        await cache.refresh("proj-1")
+        kept = cache._entries["proj-1"].configuration_ids
+        await cache.close()
+        return before, after, kept
+
+    before, after, kept = asyncio.run(scenario())
+    assert before == {"kit-a", "kit-b"}
+    assert after == kept == {"kit-c"}
+    assert [etag for _, etag in tasso.requests[:3]] == [None, '"v1"', '"v1"']
@@ -0,0 +1,58 @@
+"""
+Offline tests for the outbound Tasso rate limiter.
+"""
+import asyncio
+import time
+
+from rate_limit import RateLimiter, TokenBucket, endpoint_key
+
+
+def test_endpoint_key():
+    assert endpoint_key("/patients/123") == "/patients"
+    assert endpoint_key("orders") == "/orders"
+
+
+def test_bucket_spaces_requests_in_fifo_order():
+    order = []
+
+    async def run():
+        bucket = TokenBucket("test", rate=100, burst=1)
+
+        async def take(i):
+            await bucket.acquire()
+            order.append(i)
+
+        started = time.monotonic()
+        await asyncio.gather(*[take(i) for i in range(5)])
+        return time.monotonic() - started, bucket.snapshot()
+
+    elapsed, stats = asyncio.run(run())
+    assert order == [0, 1, 2, 3, 4]
+    # One token up front, then 4 more at 100/s
+    assert elapsed >= 0.035
+    assert stats["acquired"] == 5 and stats["delayed"] == 4
+
+
+def test_limiter_uses_endpoint_and_global_buckets():
+    async def run():
+        limiter = RateLimiter(1000, 1000, endpoints={"/orders": (50, 1), "/authTokens": (0, 0)})
+        await limiter.acquire("/orders")
+        await limiter.acquire("/patients")
+        return limiter.snapshot()
+
+    stats = asyncio.run(run())
+    assert set(stats) == {"/orders", "global"}
+    assert stats["/orders"]["acquired"] == 1
+    assert stats["global"]["acquired"] == 2
+
+
+def test_bulk_lane_gets_a_share_of_the_rate():
+    async def run():
+        limiter = RateLimiter(global_rate=20, global_burst=4, bulk_share=0.25)
+        # The bulk bucket holds one token (4 * 0.25) and refills at 5/s
+        assert await limiter.acquire("/patients", "bulk") < 0.01
+        assert await limiter.acquire("/patients", "bulk") >= 0.15
+        # Live calls only wait on the global bucket
+        assert await limiter.acquire("/patients") < 0.01
+
+    asyncio.run(run())
@@ -0,0 +1,89 @@
+"""
+Offline tests for Tasso retry classification and the circuit breaker.
+"""
+import asyncio
+
+import httpx
+
+from resilience import CircuitBreaker, RetryPolicy, TassoError, TassoUnavailable, parse_retry_after
+from tasso_client import TassoClient
+
+
+def make_client(handler, **kwargs):
+    return TassoClient(
+        "http://tasso.test",
+        transport=httpx.MockTransport(handler),
+        retry=RetryPolicy(max_attempts=3, base_delay=0, max_delay=0),
+        **kwargs,
+    )
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("2") == 2.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
+
+
+def test_429_is_retried_honoring_retry_after():
+    attempts = []
+
+    def handler(request):
+        attempts.append(request)
+        if len(attempts) < 3:
+            return httpx.Response(429, headers={"Retry-After": "0"})
+        return httpx.Response(201, json={"results": {"id": "p-1"}})
+
+    async def run():
+        client = make_client(handler)
+        response = await client.call("POST", "/patients", json={})
+        await client.close()
+        return response
+
+    assert asyncio.run(run()).json()["results"]["id"] == "p-1"
+    assert len(attempts) == 3
+
+
+def test_ambiguous_failure_not_retried_for_creates():
+    attempts = []
+
+    def handler(request):
+        attempts.append(request)
+        return httpx.Response(502)
+
+    async def run():
+        client = make_client(handler)
+        try:
+            await client.call("POST", "/orders", json={})
+        except TassoError as e:
+            assert e.status_code == 502 and not e.retryable
+        await client.close()
+
+    asyncio.run(run())
+    assert len(attempts) == 1
+
+
+def test_breaker_opens_and_fails_fast():
+    attempts = []
+
+    def handler(request):
+        attempts.append(request)
+        return httpx.Response(503)
+
+    async def run():
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        client = make_client(handler, breaker=breaker)
+        try:
+            await client.call("POST", "/patients", json={})
+        except TassoUnavailable:
+            pass
+        assert breaker.state == "open"
+        try:
+            await client.call("POST", "/patients", json={})
+            assert False, "expected fail-fast"
+        except TassoUnavailable as e:
+            assert e.retry_after > 0
+        await client.close()
+
+    asyncio.run(run())
+    # Two real failures opened the breaker; later calls never reached Tasso
+    assert len(attempts) == 2
@@ -0,0 +1,134 @@
+"""
+Offline tests for state shared between worker processes. Each process is
+simulated by its own store instance on the same SQLite file.
+"""
+import asyncio
+import os
+import socket
+import tempfile
+import time
+
+from idempotency import IdempotencyStore
+from intake_queue import IntakeQueue, PENDING
+from shared_state import SharedState, SharedTokenBucket
+from test_token_manager import make_jwt
+from token_manager import TokenManager
+
+
+def test_workers_share_one_token():
+    path = os.path.join(tempfile.mkdtemp(), "shared.db")
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        return make_jwt(time.time() + 3600)
+
+    async def run():
+        first = TokenManager(fetch, store=SharedState(path))
+        second = TokenManager(fetch, store=SharedState(path))
+        token = await first.get_token()
+        assert await second.get_token() == token
+        assert calls == 1
+
+        # A token rejected with a 401 is not adopted again from the store
+        second.invalidate(token)
+        replacement = await second.get_token()
+        assert calls == 2 and replacement != token
+        first.invalidate(token)
+        assert await first.get_token() == replacement
+        assert calls == 2
+        await first.close()
+        await second.close()
+
+    asyncio.run(run())
+
+
+def test_rate_limit_is_shared_between_workers():
+    path = os.path.join(tempfile.mkdtemp(), "shared.db")
+
+    async def run():
+        first = SharedTokenBucket(SharedState(path), "global", rate=10, burst=2)
+        second = SharedTokenBucket(SharedState(path), "global", rate=10, burst=2)
+        assert await first.acquire() < 0.01
+        assert await second.acquire() < 0.01
+        # The burst is spent by the two workers together
+        assert await first.acquire() >= 0.08
+
+    asyncio.run(run())
+
+
+def test_duplicate_at_another_worker_waits_for_the_result():
+    path = os.path.join(tempfile.mkdtemp(), "idempotency.db")
+    calls = 0
+
+    async def create():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.2)
+        return {"status": "success"}
+
+    async def run():
+        first = IdempotencyStore(path, claim_lease=30, claim_poll=0.01)
+        second = IdempotencyStore(path, claim_lease=30, claim_poll=0.01)
+        # Pretend the first store lives in another process that is still running
+        first.owner = f"{socket.gethostname()}:{os.getppid()}:other"
+        results = await asyncio.gather(first.run("k", create), second.run("k", create))
+        assert calls == 1
+        # Whichever claimed first ran it; the other replayed its result
+        assert sorted(replayed for _, replayed in results) == [False, True]
+        assert all(result == {"status": "success"} for result, _ in results)
+        first.close()
+        second.close()
+
+    asyncio.run(run())
+
+
+def test_claim_is_renewed_while_a_slow_execution_runs():
+    path = os.path.join(tempfile.mkdtemp(), "idempotency.db")
+    calls = 0
+
+    async def create():
+        nonlocal calls
+        calls += 1
+        # Several leases long, like a call stuck behind rate limits and Retry-After
+        await asyncio.sleep(0.5)
+        return {"status": "success"}
+
+    async def run():
+        first = IdempotencyStore(path, claim_lease=0.15, claim_poll=0.01)
+        second = IdempotencyStore(path, claim_lease=0.15, claim_poll=0.01)
+        first.owner = f"{socket.gethostname()}:{os.getppid()}:other"
+        running = asyncio.create_task(first.run("k", create))
+        await asyncio.sleep(0.05)
+        result, replayed = await second.run("k", create)
+        assert replayed and result == {"status": "success"}
+        assert await running == ({"status": "success"}, False)
+        first.close()
+        second.close()
+
+    asyncio.run(run())
+    assert calls == 1
+
+
+def test_recover_leaves_jobs_of_live_workers_alone():
+    path = os.path.join(tempfile.mkdtemp(), "intake.db")
+
+    async def run():
+        worker = IntakeQueue(path, lease=300)
+        worker.owner = f"{socket.gethostname()}:{os.getppid()}:other"
+        job_id = await worker.enqueue("{}")
+        await worker.claim()
+
+        starting = IntakeQueue(path)
+        assert await starting.recover() == 0
+
+        # Once the lease runs out the job is taken over
+        worker.lease = -1
+        await worker.renew(job_id)
+        assert await starting.recover() == 1
+        assert (await starting.get(job_id)).state == PENDING
+        worker.close()
+        starting.close()
+
+    asyncio.run(run())
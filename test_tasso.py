@@ -2,16 +2,23 @@
 Test script to verify Tasso patient creation
 """
 import os
+import asyncio
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
+from config import load_settings
 from main import get_tasso_token, create_tasso_patient
+from tasso_client import close_client
 
 
 def test_create_patient():
     """Test creating a patient in Tasso"""
+    asyncio.run(_create_patient())
+
+
+async def _create_patient():
     
     # Sample patient data matching Tasso API format
     patient_payload = {
@@ -40,12 +47,12 @@ def test_create_patient():
     
     try:
         print("🔐 Authenticating with Tasso...")
-        token = get_tasso_token()
+        token = await get_tasso_token(load_settings())
         print("✅ Authentication successful!")
         print(f"Tokcen: {token[:20]}...")  # Print first 20 chars only
         
         print("\n👤 Creating patient in Tasso...")
-        result = create_tasso_patient(token, patient_payload)
+        result = await create_tasso_patient(token, patient_payload)
         print("✅ Patient created successfully!")
         print(f"\n📋 Response:")
         print(result)
@@ -56,6 +63,8 @@ def test_create_patient():
     except Exception as e:
         print(f"❌ Error: {e}")
         raise
+    finally:
+        await close_client()
 
 
 if __name__ == "__main__":
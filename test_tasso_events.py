@@ -0,0 +1,77 @@
+"""
+Offline tests for Tasso status events: signatures, group commit and
+ordering against the order mirror.
+"""
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+from order_mirror import OrderMirror
+from tasso_events import EventBatcher, parse_events, sign, verify_signature
+
+
+def event(event_id: str, type: str, occurred_at: str, order_id: str = "o-1") -> dict:
+    return {"id": event_id, "type": type, "occurredAt": occurred_at, "data": {"orderId": order_id}}
+
+
+def test_signature_must_match_the_body():
+    body = b'{"id": "e-1"}'
+    assert verify_signature("secret", body, sign("secret", body))
+    assert verify_signature("secret", body, "sha256=" + sign("secret", body))
+    assert not verify_signature("secret", body + b" ", sign("secret", body))
+    assert not verify_signature("secret", body, None)
+
+
+def test_events_need_an_order_and_a_timestamp():
+    with pytest.raises(ValueError, match="occurredAt"):
+        parse_events({"id": "e-1", "type": "order.shipped", "data": {"orderId": "o-1"}})
+    parsed = parse_events({"events": [event("e-1", "order.shipped", "2024-01-02T00:00:00Z")]})
+    assert parsed[0]["status"] == "shipped" and parsed[0]["order_id"] == "o-1"
+
+
+def test_one_malformed_event_rejects_the_batch():
+    valid = [event("e-1", "order.shipped", "2024-01-02T00:00:00Z"),
+             event("e-3", "results.ready", "2024-01-04T00:00:00Z")]
+    malformed = [
+        (dict(event("e-2", "order.shipped", "2024-01-03T00:00:00Z"), data=["o-1"]), "data"),
+        (event("e-2", "order.shipped", 1704240000), "occurredAt"),
+        (dict(event("e-2", "order.shipped", "2024-01-03T00:00:00Z"), type={"name": "shipped"}), "type"),
+        (event("e-2", "order.shipped", "2024-01-03T00:00:00Z", order_id=42), "orderId"),
+    ]
+    for bad, field in malformed:
+        with pytest.raises(ValueError, match=field):
+            parse_events({"events": [valid[0], bad, valid[1]]})
+    assert len(parse_events({"events": valid})) == 2
+
+
+def test_batches_apply_in_order_of_occurrence_once():
+    path = os.path.join(tempfile.mkdtemp(), "orders.db")
+
+    async def run():
+        mirror = OrderMirror(path)
+        await mirror.upsert_orders([{"id": "o-1", "status": "created", "createdAt": "2024-01-01T00:00:00Z"}])
+        batcher = EventBatcher(mirror.apply_events, window=0.05)
+        batcher.start()
+
+        shipped = event("e-2", "order.shipped", "2024-01-02T00:00:00Z")
+        received = event("e-3", "specimen.received", "2024-01-05T00:00:00Z")
+        late = event("e-1", "order.created", "2024-01-01T12:00:00Z")
+        other = event("e-4", "order.shipped", "2024-01-02T00:00:00Z", order_id="o-2")
+        results = await asyncio.gather(
+            batcher.submit(parse_events(shipped)),
+            batcher.submit(parse_events({"events": [received, late]})),
+            batcher.submit(parse_events(shipped)),
+            batcher.submit(parse_events(other)),
+        )
+        assert batcher.batches == 1
+        assert results == [["applied"], ["applied", "stale"], ["duplicate"], ["applied"]]
+
+        assert (await mirror.order("o-1"))["status"] == "specimen_received"
+        # Unknown orders are started from the event and filled in by the next sync
+        assert (await mirror.order("o-2"))["status"] == "shipped"
+        await batcher.close()
+        mirror.close()
+
+    asyncio.run(run())
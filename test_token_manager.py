@@ -0,0 +1,61 @@
+"""
+Offline tests for the cached Tasso auth token.
+"""
+import asyncio
+import base64
+import json
+import time
+
+from token_manager import TokenManager, jwt_expiry
+
+
+def make_jwt(exp: float) -> str:
+    claims = base64.urlsafe_b64encode(json.dumps({"exp": exp}).encode()).decode().rstrip("=")
+    return f"header.{claims}.signature"
+
+
+def test_jwt_expiry_reads_exp_claim():
+    assert jwt_expiry(make_jwt(1700000000)) == 1700000000
+    assert jwt_expiry("not-a-jwt") is None
+
+
+def test_token_is_cached_and_refresh_is_single_flight():
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return make_jwt(time.time() + 3600)
+
+    async def run():
+        manager = TokenManager(fetch, refresh_margin=60)
+        tokens = await asyncio.gather(*[manager.get_token() for _ in range(20)])
+        assert len(set(tokens)) == 1
+        assert await manager.get_token() == tokens[0]
+        await manager.close()
+
+    asyncio.run(run())
+    assert calls == 1
+
+
+def test_token_inside_margin_is_served_while_refreshing():
+    issued = []
+
+    async def fetch():
+        token = make_jwt(time.time() + 3600 + len(issued))
+        issued.append(token)
+        return token
+
+    async def run():
+        manager = TokenManager(fetch, refresh_margin=60)
+        first = await manager.get_token()
+        manager._refresh_at = time.time() - 1
+        # Within the margin the old token is returned and a refresh starts
+        assert await manager.get_token() == first
+        await asyncio.sleep(0.01)
+        assert await manager.get_token() == issued[-1]
+        await manager.close()
+
+    asyncio.run(run())
+    assert len(issued) == 2
@@ -0,0 +1,48 @@
+import asyncio
+
+from metrics import Histogram
+from tracing import SampledProfiler, Trace, TraceBuffer, span
+
+
+def test_slowest_traces_are_kept_past_the_ring_buffer():
+    buffer = TraceBuffer(size=3, slowest=2)
+    for i, duration in enumerate([0.5, 0.1, 0.9, 0.2, 0.3, 0.1]):
+        trace = Trace(f"t{i}", str(i))
+        trace.duration = duration
+        buffer.add(trace)
+
+    assert [t.name for t in buffer.latest(10)] == ["t5", "t4", "t3"]
+    assert [t.name for t in buffer.slowest(10)] == ["t2", "t0"]
+
+
+def test_spans_nest_and_feed_histograms():
+    buffer = TraceBuffer()
+    latency = Histogram("stage_seconds", "Latency")
+
+    async def job():
+        with span("outer", latency):
+            with span("inner") as s:
+                s.set("status", 201)
+                await asyncio.sleep(0)
+
+    with buffer.trace("request"):
+        asyncio.run(job())
+    with span("no trace", latency):
+        pass
+
+    spans = buffer.latest(1)[0].to_dict()["spans"]
+    assert [(s["name"], s["parent"]) for s in spans] == [("outer", None), ("inner", 0)]
+    assert spans[1]["status"] == 201
+    assert sum(latency._default.counts) == 2
+
+
+def test_profiler_samples_one_in_n():
+    profiler = SampledProfiler(every=2)
+    for _ in range(4):
+        profile = profiler.start()
+        if profile is not None:
+            sum(range(1000))
+            profiler.stop(profile)
+
+    assert profiler.profiled == 2
+    assert "2 sampled request(s)" in profiler.report(limit=5)
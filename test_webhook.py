@@ -0,0 +1,287 @@
+"""
+Offline end-to-end tests for the Jotform webhook, with Tasso replaced by
+the in-repo stub (tasso_stub.py).
+"""
+import json
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import tasso_client
+from project_cache import ProjectCache
+from tasso_stub import StubConfig, create_stub_app, timestamp
+from tasso_events import SIGNATURE_HEADER, sign
+from test_normalizer import SUBMISSION
+
+
+@pytest.fixture
+def stub(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "IDEMPOTENCY_DB_PATH", str(tmp_path / "idempotency.db"))
+    monkeypatch.setattr(main, "INTAKE_DB_PATH", str(tmp_path / "intake.db"))
+    monkeypatch.setattr(main, "PATIENT_REGISTRY_DB_PATH", str(tmp_path / "patients.db"))
+    monkeypatch.setattr(main, "ORDER_MIRROR_DB_PATH", str(tmp_path / "orders.db"))
+    monkeypatch.setattr(main, "DEAD_LETTER_DB_PATH", str(tmp_path / "dead_letters.db"))
+    cache = main.project_cache
+    monkeypatch.setattr(main, "project_cache", ProjectCache(cache.fetch, cache.project_ids, cache.ttl))
+    stub_app = create_stub_app(StubConfig())
+    tasso_client.set_client(tasso_client.TassoClient(
+        "http://tasso.stub", transport=httpx.ASGITransport(app=stub_app)
+    ))
+    yield stub_app
+    tasso_client._client = None
+
+
+def post_submission(client, submission):
+    return client.post("/webhooks/jotform/tasso", data={"rawRequest": json.dumps(submission)})
+
+
+def test_webhook_creates_patient_and_order(stub):
+    with TestClient(main.app) as client:
+        first = post_submission(client, SUBMISSION)
+        second = post_submission(client, dict(SUBMISSION, event_id="5913_abc", q4_email="kim@example.com"))
+
+    assert first.status_code == 200 and second.status_code == 200
+    assert first.json()["status"] == "success"
+    assert first.json()["tasso_patient_id"] != second.json()["tasso_patient_id"]
+    # One token for both submissions
+    posts = {call: n for call, n in stub.state.calls.items() if call.startswith("POST")}
+    assert posts == {
+        "POST /authTokens 200": 1,
+        "POST /patients 201": 2,
+        "POST /orders 201": 2,
+    }
+
+
+def test_retried_submission_is_not_recreated(stub):
+    with TestClient(main.app) as client:
+        first = post_submission(client, SUBMISSION)
+        retry = post_submission(client, SUBMISSION)
+
+    assert retry.json() == first.json()
+    assert stub.state.calls["POST /patients 201"] == 1
+
+
+def test_invalid_submission_is_rejected(stub):
+    with TestClient(main.app) as client:
+        response = post_submission(client, dict(SUBMISSION, q3_name={"first": "Terry"}))
+
+    assert response.status_code == 500
+    assert "Missing patient name" in response.json()["detail"]
+    assert "POST /patients 201" not in stub.state.calls
+
+
+def test_metrics_cover_webhook_stages(stub):
+    with TestClient(main.app) as client:
+        post_submission(client, SUBMISSION)
+        text = client.get("/metrics").text
+
+    for stage in ("form_parse", "json_decode", "normalize", "get_tasso_token",
+                  "create_tasso_patient", "create_tasso_order"):
+        assert f'webhook_stage_duration_seconds_count{{stage="{stage}"}}' in text
+    assert 'tasso_requests_total{endpoint="/patients",status="201"}' in text
+    assert 'http_requests_total{method="POST",route="/webhooks/jotform/tasso",status="200"}' in text
+
+
+def test_slowest_traces_show_webhook_spans(stub, monkeypatch):
+    monkeypatch.setattr(main, "ADMIN_API_KEY", "secret")
+    main.traces.reset()
+    with TestClient(main.app) as client:
+        post_submission(client, SUBMISSION)
+        response = client.get("/admin/traces", headers={"X-Admin-Key": "secret"})
+
+    trace = response.json()["traces"][0]
+    assert trace["name"] == "POST /webhooks/jotform/tasso" and trace["status"] == 200
+    names = [s["name"] for s in trace["spans"]]
+    for expected in ("form_parse", "normalize", "create_tasso_patient", "tasso POST /patients",
+                     "create_tasso_order", "tasso POST /orders"):
+        assert expected in names
+    patient_call = trace["spans"][names.index("tasso POST /patients")]
+    assert patient_call["status"] == 201
+    assert trace["spans"][patient_call["parent"]]["name"] == "create_tasso_patient"
+
+
+def test_returning_patient_skips_create(stub):
+    with TestClient(main.app) as client:
+        first = post_submission(client, SUBMISSION).json()
+        reorder = post_submission(client, dict(SUBMISSION, event_id="6001_abc")).json()
+        moved = post_submission(client, dict(
+            SUBMISSION, event_id="6002_abc",
+            q5_shippingAddress=dict(SUBMISSION["q5_shippingAddress"], addr_line1="2 Oak St"),
+        )).json()
+
+    assert reorder["tasso_patient_reused"] and reorder["tasso_patient_id"] == first["tasso_patient_id"]
+    # Changed details are sent to Tasso with a fresh create
+    assert not moved["tasso_patient_reused"]
+    assert stub.state.calls["POST /patients 201"] == 2
+    assert stub.state.calls["POST /orders 201"] == 3
+
+
+def test_stale_registry_entry_recreates_patient(stub):
+    with TestClient(main.app) as client:
+        first = post_submission(client, SUBMISSION).json()
+        stub.state.patients.clear()
+        again = post_submission(client, dict(SUBMISSION, event_id="6001_abc")).json()
+
+    assert again["status"] == "success" and not again["tasso_patient_reused"]
+    assert again["tasso_patient_id"] != first["tasso_patient_id"]
+    assert stub.state.calls["POST /orders 404"] == 1
+
+
+def test_registry_warm_up_pages_through_tasso(stub, monkeypatch):
+    monkeypatch.setattr(main, "ADMIN_API_KEY", "secret")
+    monkeypatch.setattr(main, "PATIENT_REGISTRY_WARM_PAGE_SIZE", 2)
+    project = main.normalize(SUBMISSION)["projectId"]
+    for i in range(5):
+        stub.state.patients[f"p{i}"] = {
+            "id": f"p{i}",
+            "projectId": project,
+            "subjectId": f"LEGACY-{i}",
+            "contactInformation": {"email": f"patient{i}@example.com"},
+            "dateOfBirth": "1980-01-01",
+        }
+
+    with TestClient(main.app) as client:
+        response = client.post("/admin/patients/registry/warm", headers={"X-Admin-Key": "secret"})
+
+    assert response.json()["loaded"] == 5
+    assert stub.state.calls["GET /patients 200"] >= 3
+
+
+def test_order_configuration_is_checked_against_cached_project(stub):
+    with TestClient(main.app) as client:
+        unknown = post_submission(client, dict(SUBMISSION, configurationId="no-such-kit"))
+        known = post_submission(client, dict(SUBMISSION, event_id="6001_abc", configurationId="stub-config"))
+
+    assert unknown.status_code == 500 and "no-such-kit" in unknown.json()["detail"]
+    assert known.status_code == 200
+    # Prewarmed once at startup; the webhooks themselves made no project calls
+    assert stub.state.calls["GET /projects 200"] == 2
+    assert stub.state.calls["POST /patients 201"] == 1
+
+
+def test_order_status_is_served_from_the_mirror(stub, monkeypatch):
+    monkeypatch.setattr(main, "ADMIN_API_KEY", "admin")
+    admin = {"X-Admin-Key": "admin"}
+    with TestClient(main.app) as client:
+        order_id = post_submission(client, SUBMISSION).json()["tasso_order_id"]
+        # Tasso ships the kit
+        stub.state.orders[order_id].update(status="shipped", updatedAt=timestamp())
+        assert client.post("/admin/mirror/sync", headers=admin).json()["synced"]["orders"] >= 1
+
+        gets = sum(n for call, n in stub.state.calls.items() if call.startswith("GET /orders"))
+        found = client.get("/admin/orders", params={"email": SUBMISSION["q4_email"].upper()}, headers=admin)
+        assert sum(n for call, n in stub.state.calls.items() if call.startswith("GET /orders")) == gets
+
+    orders = found.json()["orders"]
+    assert [o["id"] for o in orders] == [order_id]
+    assert orders[0]["status"] == "shipped"
+    assert orders[0]["subjectId"].startswith("AUTO-")
+
+
+def test_signed_tasso_events_update_the_mirror(stub, monkeypatch):
+    monkeypatch.setattr(main, "TASSO_EVENTS_SECRET", "events")
+    monkeypatch.setattr(main, "ADMIN_API_KEY", "admin")
+    with TestClient(main.app) as client:
+        order_id = post_submission(client, SUBMISSION).json()["tasso_order_id"]
+        body = json.dumps({
+            "id": "evt-1",
+            "type": "order.shipped",
+            "occurredAt": "2999-01-01T00:00:00Z",
+            "data": {"orderId": order_id, "trackingNumber": "1Z999"},
+        }).encode()
+
+        forged = client.post("/webhooks/tasso/events", content=body, headers={SIGNATURE_HEADER: "0" * 64})
+        signed = {SIGNATURE_HEADER: sign("events", body), "Content-Type": "application/json"}
+        first = client.post("/webhooks/tasso/events", content=body, headers=signed)
+        again = client.post("/webhooks/tasso/events", content=body, headers=signed)
+        order = client.get(f"/admin/orders/{order_id}", headers={"X-Admin-Key": "admin"}).json()
+
+    assert forged.status_code == 401
+    assert first.json() == {"received": 1, "applied": 1}
+    assert again.json() == {"received": 1, "applied": 0}
+    assert order["status"] == "shipped" and order["trackingNumber"] == "1Z999"
+
+
+def test_failed_order_is_reprocessed_without_recreating_the_patient(stub, monkeypatch):
+    monkeypatch.setattr(main, "ADMIN_API_KEY", "admin")
+    admin = {"X-Admin-Key": "admin"}
+    build = main.build_order_payload
+    # The first order is rejected by Tasso (400: no patientId)
+    monkeypatch.setattr(main, "build_order_payload", lambda patient_id, data, route: build(None, data, route))
+    with TestClient(main.app) as client:
+        failed = post_submission(client, SUBMISSION)
+        listed = client.get("/admin/dead-letters", params={"stage": "order"}, headers=admin).json()
+        monkeypatch.setattr(main, "build_order_payload", build)
+        reprocessed = client.post("/admin/dead-letters/reprocess", params={"stage": "order"}, headers=admin)
+        remaining = client.get("/admin/dead-letters", headers=admin).json()
+
+    assert failed.status_code == 500
+    [letter] = listed["dead_letters"]
+    assert letter["event_id"] == SUBMISSION["event_id"] and letter["status_code"] == 400
+    assert "raw" not in letter
+    [result] = [json.loads(line) for line in reprocessed.text.splitlines()]
+    assert result["status"] == "success" and result["resumed_at"] == "order"
+    assert result["result"]["tasso_patient_id"] == letter["patient_id"]
+    assert remaining["dead_letters"] == []
+    assert stub.state.calls["POST /patients 201"] == 1
+    assert stub.state.calls["POST /orders 201"] == 1
+
+
+def test_auth_failure_after_the_patient_resumes_at_the_order(stub, monkeypatch):
+    monkeypatch.setattr(main, "ADMIN_API_KEY", "admin")
+    # Without the registry, only the dead letter's patient_id prevents a second patient
+    monkeypatch.setattr(main, "PATIENT_REGISTRY_ENABLED", False)
+    admin = {"X-Admin-Key": "admin"}
+    get_token, create_tasso_patient = main._token, main.create_tasso_patient
+    patient_created = False
+
+    async def create_patient_once(token, patient):
+        nonlocal patient_created
+        result = await create_tasso_patient(token, patient)
+        patient_created = True
+        return result
+
+    async def token_fails_after_the_patient():
+        nonlocal patient_created
+        if patient_created:
+            patient_created = False
+            error = main.TassoError("Tasso auth unavailable", retryable=True)
+            main.mark_failed_stage(error, "auth")
+            raise error
+        return await get_token()
+
+    monkeypatch.setattr(main, "create_tasso_patient", create_patient_once)
+    monkeypatch.setattr(main, "_token", token_fails_after_the_patient)
+    with TestClient(main.app) as client:
+        failed = post_submission(client, SUBMISSION)
+        [letter] = client.get("/admin/dead-letters", headers=admin).json()["dead_letters"]
+        reprocessed = client.post("/admin/dead-letters/reprocess", params={"stage": "auth"}, headers=admin)
+
+    assert failed.status_code == 503
+    assert letter["stage"] == "auth" and letter["patient_id"]
+    [result] = [json.loads(line) for line in reprocessed.text.splitlines()]
+    assert result["status"] == "success" and result["resumed_at"] == "order"
+    assert result["result"]["tasso_patient_id"] == letter["patient_id"]
+    assert stub.state.calls["POST /patients 201"] == 1
+
+
+def test_ready_once_token_and_projects_are_warm(stub):
+    with TestClient(main.app) as client:
+        # Warmed during startup, before the first request
+        assert stub.state.calls["POST /authTokens 200"] == 1
+        assert stub.state.calls["GET /projects 200"] == 2
+        ready = client.get("/ready")
+
+    assert ready.status_code == 200 and ready.json() == {"ready": True}
+
+
+def test_not_ready_while_tasso_is_unreachable(stub, monkeypatch):
+    monkeypatch.setattr(main, "STARTUP_PREWARM_TIMEOUT", 0.05)
+    stub.state.stub["config"] = StubConfig(error_rate=1.0)
+    with TestClient(main.app) as client:
+        ready = client.get("/ready")
+
+    assert ready.status_code == 503
+    assert ready.json()["ready"] is False
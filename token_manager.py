@@ -0,0 +1,168 @@
+"""
+In-memory cache for the Tasso auth token.
+
+The idToken returned by /authTokens is a JWT, so its expiry is read from the
+`exp` claim. The token is refreshed in the background shortly before it
+expires, and concurrent callers that find it stale share a single refresh.
+With a `shared_state.SharedState`, worker processes share one token: the
+first to refresh mints it under a file lock and the others adopt it.
+"""
+import asyncio
+import base64
+import json
+import time
+from typing import Awaitable, Callable, Optional
+
+from config import Settings
+from logs import get_logger
+from shared_state import SharedState
+
+log = get_logger(__name__)
+
+
+def jwt_expiry(token: str) -> Optional[float]:
+    """Return the `exp` claim of a JWT as a unix timestamp, or None."""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+        return float(claims["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+class TokenManager:
+    """
+    Keeps one Tasso idToken per process.
+
+    `fetch` is an async callable that mints a new token. Tokens are served
+    from memory until `refresh_margin` seconds before expiry, at which point
+    a background refresh is started while the current token is still handed
+    out. Only once the token has actually expired do callers wait, and they
+    all wait on the same refresh.
+
+    With `store`, a refresh first looks at the token other processes have
+    stored and only mints one if that is missing, due for refresh, or the
+    token this process last invalidated.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[], Awaitable[str]],
+        refresh_margin: float = 300,
+        default_ttl: float = 3600,
+        store: Optional[SharedState] = None,
+    ):
+        self._fetch = fetch
+        self._store = store
+        self._rejected: Optional[str] = None
+        self._refresh_margin = refresh_margin
+        self._default_ttl = default_ttl
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._refresh_at = 0.0
+        self._inflight: Optional[asyncio.Task] = None
+        self._timer: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_settings(cls, fetch: Callable[[], Awaitable[str]], settings: Settings,
+                      store: Optional[SharedState] = None) -> "TokenManager":
+        return cls(
+            fetch,
+            refresh_margin=settings.token_refresh_margin,
+            default_ttl=settings.token_default_ttl,
+            store=store,
+        )
+
+    @property
+    def expires_at(self) -> float:
+        return self._expires_at
+
+    async def get_token(self) -> str:
+        now = time.time()
+        if self._token and now < self._refresh_at:
+            return self._token
+
+        if self._token and now < self._expires_at:
+            # Still valid: refresh ahead of time without blocking the caller
+            self._start_refresh()
+            return self._token
+
+        return await self.refresh()
+
+    async def refresh(self) -> str:
+        """Mint a new token, joining any refresh already in flight."""
+        task = self._start_refresh()
+        return await asyncio.shield(task)
+
+    def invalidate(self, token: Optional[str] = None) -> None:
+        """Drop the cached token (e.g. after a 401). Ignored if it was already replaced."""
+        if token is None or token == self._token:
+            self._rejected = self._token
+            self._token = None
+            self._expires_at = 0.0
+            self._refresh_at = 0.0
+
+    async def close(self) -> None:
+        for task in (self._timer, self._inflight):
+            if task and not task.done():
+                task.cancel()
+        self._timer = None
+        self._inflight = None
+
+    def _start_refresh(self) -> asyncio.Task:
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._do_refresh())
+            self._inflight.add_done_callback(self._report_failure)
+        return self._inflight
+
+    async def _do_refresh(self) -> str:
+        if self._store is None:
+            token = await self._fetch()
+            self._set_token(token)
+            return token
+
+        async with self._store.token_lock:
+            shared = await self._store.load_token()
+            if shared and shared.token != self._rejected and time.time() < shared.refresh_at:
+                self._set_token(shared.token, shared.expires_at, shared.refresh_at)
+                return shared.token
+            token = await self._fetch()
+            self._set_token(token)
+            await self._store.save_token(token, self._expires_at, self._refresh_at)
+            return token
+
+    def _set_token(self, token: str, expires_at: Optional[float] = None,
+                   refresh_at: Optional[float] = None) -> None:
+        now = time.time()
+        if expires_at is None:
+            expires_at = jwt_expiry(token) or (now + self._default_ttl)
+        if refresh_at is None:
+            # Short-lived tokens refresh at half-life rather than in a tight loop
+            remaining = max(expires_at - now, 0)
+            refresh_at = now + remaining - min(self._refresh_margin, remaining / 2)
+        self._token = token
+        self._expires_at = expires_at
+        self._refresh_at = refresh_at
+        self._rejected = None
+        self._schedule_timer()
+
+    def _schedule_timer(self) -> None:
+        if self._timer and not self._timer.done():
+            self._timer.cancel()
+        delay = max(self._refresh_at - time.time(), 0)
+        self._timer = asyncio.ensure_future(self._refresh_after(delay))
+
+    async def _refresh_after(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        # Detach first so the refresh can schedule the next timer
+        self._timer = None
+        self._start_refresh()
+
+    @staticmethod
+    def _report_failure(task: asyncio.Task) -> None:
+        if task.cancelled() or task.exception() is None:
+            return
+        # Callers waiting on the refresh get the exception; background
+        # refreshes just log it and the next caller retries once expired.
+        log.warning("Tasso token refresh failed", error=str(task.exception()))
@@ -0,0 +1,245 @@
+"""
+Per-request traces and a sampled profiler, both kept in memory.
+
+`TracingMiddleware` opens a trace for each HTTP request; code inside it
+wraps phases in `span()`. Finished traces go into a bounded ring buffer
+(recent traces) and a heap of the slowest ones seen since the last reset,
+both served by /admin/traces. Outside a trace, `span()` only feeds its
+histogram, so the same call sites work in background workers.
+
+`SampledProfiler` runs cProfile over 1 in N requests and aggregates the
+results; /admin/profiler turns it on or off and dumps the stats at
+runtime. cProfile profiles the whole thread, so a sampled request's stats
+also include whatever other requests ran on the event loop meanwhile.
+"""
+import contextlib
+import contextvars
+import cProfile
+import heapq
+import io
+import itertools
+import pstats
+import time
+from collections import deque
+from typing import List, Optional
+
+from logs import correlation_id, new_correlation_id
+
+MAX_SPANS_PER_TRACE = 256
+
+
+class Span:
+    __slots__ = ("name", "parent", "start", "duration", "attrs")
+
+    def __init__(self, name: str, parent: Optional[int], start: float, attrs: dict):
+        self.name = name
+        self.parent = parent
+        self.start = start
+        self.duration: Optional[float] = None
+        self.attrs = attrs
+
+    def set(self, key: str, value) -> None:
+        self.attrs[key] = value
+
+
+class Trace:
+    def __init__(self, name: str, trace_id: str):
+        self.name = name
+        self.trace_id = trace_id
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.spans: List[Span] = []
+        self.dropped_spans = 0
+        self.attrs: dict = {}
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": round((self.duration or 0) * 1000, 3),
+            **self.attrs,
+            "dropped_spans": self.dropped_spans,
+            "spans": [
+                {
+                    "id": i,
+                    "parent": s.parent,
+                    "name": s.name,
+                    "offset_ms": round((s.start - self.start) * 1000, 3),
+                    "duration_ms": round(s.duration * 1000, 3) if s.duration is not None else None,
+                    **s.attrs,
+                }
+                for i, s in enumerate(self.spans)
+            ],
+        }
+
+
+_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+_parent: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("span_parent", default=None)
+
+
+class span:
+    """
+    `with span("create_tasso_patient", STAGE_HISTOGRAM) as s: ...`
+
+    Records a span on the current trace (if any) and the duration into
+    `histogram` (if given). `s.set()` adds attributes; it is a no-op when no
+    trace is active.
+    """
+
+    __slots__ = ("name", "histogram", "attrs", "_span", "_token", "_started")
+
+    def __init__(self, name: str, histogram=None, **attrs):
+        self.name = name
+        self.histogram = histogram
+        self.attrs = attrs
+        self._span = None
+        self._token = None
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        trace = _trace.get()
+        if trace is not None:
+            if len(trace.spans) < MAX_SPANS_PER_TRACE:
+                self._span = Span(self.name, _parent.get(), self._started, self.attrs)
+                trace.spans.append(self._span)
+                self._token = _parent.set(len(trace.spans) - 1)
+            else:
+                trace.dropped_spans += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._started
+        if self.histogram is not None:
+            self.histogram.observe(duration)
+        if self._span is not None:
+            self._span.duration = duration
+            if exc_type is not None:
+                self._span.attrs["error"] = exc_type.__name__
+            _parent.reset(self._token)
+        return False
+
+    def set(self, key: str, value) -> None:
+        if self._span is not None:
+            self._span.attrs[key] = value
+
+
+class TraceBuffer:
+    """The last `size` traces plus the `slowest` slowest since the last reset."""
+
+    def __init__(self, size: int = 1000, slowest: int = 50):
+        self.recent: deque = deque(maxlen=size)
+        self.slowest_size = slowest
+        self._slowest: list = []
+        self._seq = itertools.count()
+
+    def add(self, trace: Trace) -> None:
+        self.recent.append(trace)
+        entry = (trace.duration, next(self._seq), trace)
+        if len(self._slowest) < self.slowest_size:
+            heapq.heappush(self._slowest, entry)
+        elif entry[0] > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, entry)
+
+    def slowest(self, limit: int) -> List[Trace]:
+        return [t for _, _, t in heapq.nlargest(limit, self._slowest)]
+
+    def latest(self, limit: int) -> List[Trace]:
+        return list(itertools.islice(reversed(self.recent), limit))
+
+    def reset(self) -> None:
+        self.recent.clear()
+        self._slowest.clear()
+
+    @contextlib.contextmanager
+    def trace(self, name: str, trace_id: Optional[str] = None):
+        """Trace the enclosed block (e.g. one intake job) and keep it on exit."""
+        trace = Trace(name, trace_id or correlation_id.get() or new_correlation_id())
+        token = _trace.set(trace)
+        try:
+            yield trace
+        except BaseException as e:
+            trace.attrs["error"] = type(e).__name__
+            raise
+        finally:
+            _trace.reset(token)
+            trace.duration = time.perf_counter() - trace.start
+            self.add(trace)
+
+
+class SampledProfiler:
+    """cProfile over every `every`-th request (0 disables), aggregated until reset."""
+
+    def __init__(self, every: int = 0):
+        self.every = every
+        self.profiled = 0
+        self._count = itertools.count(1)
+        self._active = False
+        self._stats: Optional[pstats.Stats] = None
+
+    def start(self) -> Optional[cProfile.Profile]:
+        # One profiler per thread at a time; overlapping samples are skipped
+        if self.every <= 0 or self._active or next(self._count) % self.every:
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            return None
+        self._active = True
+        return profile
+
+    def stop(self, profile: cProfile.Profile) -> None:
+        profile.disable()
+        self._active = False
+        self.profiled += 1
+        if self._stats is None:
+            self._stats = pstats.Stats(profile)
+        else:
+            self._stats.add(profile)
+
+    def report(self, sort: str = "cumulative", limit: int = 50) -> str:
+        if self._stats is None:
+            return "No samples yet\n"
+        out = io.StringIO()
+        self._stats.stream = out
+        self._stats.sort_stats(sort).print_stats(limit)
+        return f"{self.profiled} sampled request(s)\n" + out.getvalue()
+
+    def reset(self) -> None:
+        self._stats = None
+        self.profiled = 0
+
+
+# -------------------------------
+# ASGI middleware
+# -------------------------------
+class TracingMiddleware:
+    """Trace every HTTP request outside `exclude` and feed the profiler."""
+
+    def __init__(self, app, buffer: TraceBuffer, profiler: SampledProfiler,
+                 exclude: tuple = ("/metrics", "/admin/traces", "/admin/profiler")):
+        self.app = app
+        self.buffer = buffer
+        self.profiler = profiler
+        self.exclude = exclude
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exclude):
+            return await self.app(scope, receive, send)
+
+        with self.buffer.trace(f"{scope['method']} {scope['path']}") as trace:
+
+            async def send_with_status(message):
+                if message["type"] == "http.response.start":
+                    trace.attrs["status"] = message["status"]
+                await send(message)
+
+            profile = self.profiler.start()
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                if profile is not None:
+                    self.profiler.stop(profile)
+                    trace.attrs["profiled"] = True
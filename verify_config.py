@@ -1,5 +1,26 @@
-from config import TASSO_BASE_URL, TASSO_CLIENT_ID, TASSO_CLIENT_SECRET
+"""
+Check the configuration the service would start with (.env plus the
+environment) and print it without secrets. Exits non-zero if it is invalid.
 
-print(f"URL: {TASSO_BASE_URL}/authTokens")
-print(f"Username: {TASSO_CLIENT_ID}")
-print(f"Secret: {TASSO_CLIENT_SECRET}")
+    python verify_config.py
+"""
+import sys
+
+
+def main() -> int:
+    try:
+        # ConfigError is a ValueError, whether raised on import or by load_settings
+        from config import load_settings
+        settings = load_settings()
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    for name, value in settings.summary().items():
+        print(f"{name}: {value}")
+    print(f"auth URL: {settings.tasso_base_url}/authTokens")
+    print("configuration OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())